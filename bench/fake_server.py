@@ -0,0 +1,61 @@
+"""Configurable stdio MCP server used by the benchmarks
+
+Behaviour is set with environment variables so the proxy passes it
+through to the spawned process:
+- BENCH_LATENCY: seconds each `work` call takes (default: 0)
+- BENCH_PAYLOAD_SIZE: size in bytes of the text returned by `work` (default: 64)
+- BENCH_NOTIFY_RATE: log notifications per second sent while a `work` call runs (default: 0)
+- BENCH_TOOLS: number of extra tools advertised by tools/list (default: 10)
+"""
+import os
+import asyncio
+from mcp.server.fastmcp import FastMCP, Context
+
+LATENCY = float(os.getenv("BENCH_LATENCY", "0"))
+PAYLOAD_SIZE = int(os.getenv("BENCH_PAYLOAD_SIZE", "64"))
+NOTIFY_RATE = float(os.getenv("BENCH_NOTIFY_RATE", "0"))
+TOOLS = int(os.getenv("BENCH_TOOLS", "10"))
+
+PAYLOAD = "x" * PAYLOAD_SIZE
+
+mcp = FastMCP("bench")
+
+
+@mcp.tool()
+async def work(ctx: Context) -> str:
+    """Sleep for the configured latency and return the configured payload"""
+    if NOTIFY_RATE > 0 and LATENCY > 0:
+        interval = 1 / NOTIFY_RATE
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + LATENCY
+        while loop.time() < deadline:
+            await ctx.info("progress")
+            await asyncio.sleep(min(interval, max(deadline - loop.time(), 0)))
+    elif LATENCY > 0:
+        await asyncio.sleep(LATENCY)
+    return PAYLOAD
+
+
+@mcp.tool()
+async def echo(text: str) -> str:
+    """Return text unchanged"""
+    return text
+
+
+def _add_filler_tool(index: int):
+    async def filler(value: str = "") -> str:
+        return value
+    mcp.add_tool(filler, name=f"filler_{index}", description=f"Filler tool {index} to size tools/list")
+
+
+for i in range(TOOLS):
+    _add_filler_tool(i)
+
+
+@mcp.resource("bench://payload")
+def payload() -> str:
+    return PAYLOAD
+
+
+if __name__ == "__main__":
+    mcp.run()
@@ -0,0 +1,210 @@
+"""Open-loop load generator for the proxy
+
+Opens N SSE sessions and sends JSON-RPC requests at a fixed total rate
+spread round-robin over the sessions. Latency is measured from sending
+the POST until the response arrives on the session's SSE stream, so it
+covers both synchronous and async dispatch.
+"""
+import math
+import time
+import json
+import asyncio
+import argparse
+import itertools
+from typing import Dict, List, Optional
+
+import httpx
+
+
+def percentile(values: List[float], p: float) -> Optional[float]:
+    """Nearest-rank percentile of values"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, min(len(ordered), math.ceil(p / 100 * len(ordered))) - 1)
+    return ordered[index]
+
+
+class BenchSession:
+    """One SSE session, matching responses on the stream to pending requests by id"""
+
+    def __init__(self, client: httpx.AsyncClient, base_url: str, auth_key: str = ""):
+        self.client = client
+        self.base_url = base_url.rstrip("/")
+        self.auth_key = auth_key
+        self.endpoint: Optional[str] = None
+        self.pending: Dict[int, asyncio.Future] = {}
+        self.notifications = 0
+        self._ready = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    async def open(self, timeout: float = 30.0):
+        self._task = asyncio.create_task(self._read())
+        await asyncio.wait_for(self._ready.wait(), timeout)
+        if self.endpoint is None:
+            raise RuntimeError("SSE stream closed before the endpoint event")
+
+    async def _read(self):
+        params = {"auth_key": self.auth_key} if self.auth_key else None
+        try:
+            async with self.client.stream("GET", self.base_url + "/sse", params=params, timeout=None) as response:
+                response.raise_for_status()
+                event = None
+                async for line in response.aiter_lines():
+                    if line.startswith("event:"):
+                        event = line[6:].strip()
+                    elif line.startswith("data:"):
+                        self._on_event(event, line[5:].strip())
+                    elif not line:
+                        event = None
+        finally:
+            self._ready.set()
+            for future in self.pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("SSE stream closed"))
+
+    def _on_event(self, event: Optional[str], data: str):
+        if event == "endpoint":
+            self.endpoint = data
+            self._ready.set()
+            return
+        message = json.loads(data)
+        future = self.pending.pop(message.get("id"), None) if "id" in message else None
+        if future is None:
+            self.notifications += 1
+        elif not future.done():
+            future.set_result(message)
+
+    async def request(self, id: int, method: str, params: dict, timeout: float) -> dict:
+        future = asyncio.get_running_loop().create_future()
+        self.pending[id] = future
+        try:
+            response = await self.client.post(
+                self.base_url + self.endpoint,
+                json={"jsonrpc": "2.0", "id": id, "method": method, "params": params},
+                timeout=timeout
+            )
+            body = response.json() if response.content else {}
+            if response.status_code >= 400 or "error" in body:
+                return body
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            self.pending.pop(id, None)
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+
+async def run_load(
+    base_url: str,
+    sessions: int = 10,
+    rate: float = 100.0,
+    duration: float = 10.0,
+    warmup: float = 1.0,
+    list_ratio: float = 0.0,
+    timeout: float = 30.0,
+    auth_key: str = ""
+) -> dict:
+    """Drive the proxy and return latency and throughput figures"""
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    async with httpx.AsyncClient(limits=limits, timeout=timeout) as client:
+        started = time.perf_counter()
+        bench_sessions = [BenchSession(client, base_url, auth_key) for _ in range(sessions)]
+        await asyncio.gather(*(session.open(timeout) for session in bench_sessions))
+        connect_time = time.perf_counter() - started
+
+        ids = itertools.count(1)
+        latencies: List[float] = []
+        errors: Dict[str, int] = {}
+        tasks = set()
+        list_every = round(1 / list_ratio) if list_ratio > 0 else 0
+
+        async def one(session: BenchSession, id: int, record: bool):
+            method, params = "tools/call", {"name": "work", "arguments": {}}
+            if list_every and id % list_every == 0:
+                method, params = "tools/list", {}
+            sent = time.perf_counter()
+            try:
+                message = await session.request(id, method, params, timeout)
+                error = message.get("error")
+                kind = str(error.get("code")) if error else None
+            except asyncio.TimeoutError:
+                kind = "timeout"
+            except Exception as e:
+                kind = type(e).__name__
+            if not record:
+                return
+            if kind is None:
+                latencies.append(time.perf_counter() - sent)
+            else:
+                errors[kind] = errors.get(kind, 0) + 1
+
+        interval = 1 / rate
+        begin = time.perf_counter()
+        measure_from = begin + warmup
+        end = measure_from + duration
+        sent_count = 0
+        for n in itertools.count():
+            at = begin + n * interval
+            if at >= end:
+                break
+            delay = at - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            record = at >= measure_from
+            sent_count += record
+            task = asyncio.create_task(one(bench_sessions[n % sessions], next(ids), record))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.wait(tasks)
+        elapsed = time.perf_counter() - measure_from
+
+        notifications = sum(session.notifications for session in bench_sessions)
+        await asyncio.gather(*(session.close() for session in bench_sessions))
+
+    return {
+        "sessions": sessions,
+        "target_rate": rate,
+        "connect_seconds": round(connect_time, 4),
+        "requests": sent_count,
+        "completed": len(latencies),
+        "errors": errors,
+        "notifications": notifications,
+        "throughput": round(len(latencies) / elapsed, 2) if elapsed > 0 else 0.0,
+        "latency_ms": {
+            "mean": round(sum(latencies) / len(latencies) * 1000, 3) if latencies else None,
+            "p50": _ms(percentile(latencies, 50)),
+            "p90": _ms(percentile(latencies, 90)),
+            "p99": _ms(percentile(latencies, 99)),
+            "max": _ms(max(latencies) if latencies else None),
+        },
+    }
+
+
+def _ms(value: Optional[float]) -> Optional[float]:
+    return round(value * 1000, 3) if value is not None else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive a running proxy and print results as JSON")
+    parser.add_argument("url", help="Proxy base URL, e.g. http://127.0.0.1:8000")
+    parser.add_argument("--sessions", type=int, default=10, help="SSE sessions to open")
+    parser.add_argument("--rate", type=float, default=100.0, help="Total requests per second")
+    parser.add_argument("--duration", type=float, default=10.0, help="Measured seconds")
+    parser.add_argument("--warmup", type=float, default=1.0, help="Seconds of unmeasured load first")
+    parser.add_argument("--list-ratio", type=float, default=0.0, help="Fraction of requests that are tools/list")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Per-request timeout in seconds")
+    parser.add_argument("--auth-key", default="", help="auth_key query parameter for /sse")
+    args = parser.parse_args()
+    result = asyncio.run(run_load(
+        args.url, args.sessions, args.rate, args.duration, args.warmup,
+        args.list_ratio, args.timeout, args.auth_key
+    ))
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
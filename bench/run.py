@@ -0,0 +1,176 @@
+"""Benchmark the proxy against the fake stdio server in each session mode
+
+Starts the proxy with uvicorn for every mode, drives it with the load
+generator while sampling the proxy's CPU time and RSS from /proc, and
+prints the results as JSON (or writes them to --output).
+
+    python bench/run.py --sessions 20 --rate 200 --duration 10 --latency 0.01
+"""
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import subprocess
+from typing import Dict, List, Optional
+
+import httpx
+
+from loadgen import run_load
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.join(os.path.dirname(BENCH_DIR), "src")
+MODES = {"shared": "true", "dedicated": "false"}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def read_usage(pid: int) -> Optional[Dict[str, float]]:
+    """CPU seconds and RSS bytes of a process, None where /proc is unavailable"""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+    except OSError:
+        return None
+    ticks = os.sysconf("SC_CLK_TCK")
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    # fields start at state (field 3 in proc(5))
+    return {
+        "cpu": (int(fields[11]) + int(fields[12])) / ticks,
+        "rss": int(fields[21]) * page_size,
+    }
+
+
+async def sample_usage(pid: int, samples: List[Dict[str, float]], interval: float = 0.5):
+    while True:
+        usage = read_usage(pid)
+        if usage is not None:
+            samples.append(usage)
+        await asyncio.sleep(interval)
+
+
+async def wait_ready(url: str, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                await client.get(url + "/stats", timeout=1.0)
+                return
+            except httpx.HTTPError:
+                await asyncio.sleep(0.2)
+    raise RuntimeError(f"Proxy at {url} did not start within {timeout}s")
+
+
+def start_proxy(port: int, mode: str, args, extra_env: Dict[str, str]) -> subprocess.Popen:
+    env = dict(os.environ)
+    env.update({
+        "MCP_SERVER_CONFIG": f"{sys.executable} {os.path.join(BENCH_DIR, 'fake_server.py')}",
+        "SHARED_SESSION": MODES[mode],
+        "BENCH_LATENCY": str(args.latency),
+        "BENCH_PAYLOAD_SIZE": str(args.payload_size),
+        "BENCH_NOTIFY_RATE": str(args.notify_rate),
+    })
+    env.update(extra_env)
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=SRC_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL if not args.verbose else None
+    )
+
+
+async def bench_mode(mode: str, args, extra_env: Dict[str, str]) -> dict:
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    proxy = start_proxy(port, mode, args, extra_env)
+    samples: List[Dict[str, float]] = []
+    try:
+        await wait_ready(url)
+        sampler = asyncio.create_task(sample_usage(proxy.pid, samples))
+        started = time.perf_counter()
+        result = await run_load(
+            url, args.sessions, args.rate, args.duration, args.warmup,
+            args.list_ratio, args.timeout
+        )
+        wall = time.perf_counter() - started
+        sampler.cancel()
+        usage = read_usage(proxy.pid)
+        if usage is not None:
+            samples.append(usage)
+    finally:
+        proxy.terminate()
+        try:
+            proxy.wait(10)
+        except subprocess.TimeoutExpired:
+            proxy.kill()
+
+    result = {"mode": mode, **result}
+    if samples:
+        cpu = samples[-1]["cpu"] - samples[0]["cpu"]
+        result["proxy"] = {
+            "cpu_seconds": round(cpu, 3),
+            "cpu_percent": round(cpu / wall * 100, 1) if wall > 0 else None,
+            "rss_max_mb": round(max(s["rss"] for s in samples) / 1024 / 1024, 1),
+        }
+    else:
+        result["proxy"] = None
+    return result
+
+
+async def run(args) -> dict:
+    extra_env = dict(item.split("=", 1) for item in args.env)
+    results = []
+    for mode in args.modes.split(","):
+        if mode not in MODES:
+            raise SystemExit(f"Unknown mode: {mode}")
+        print(f"Running {mode} mode...", file=sys.stderr)
+        results.append(await bench_mode(mode, args, extra_env))
+    return {
+        "config": {
+            "sessions": args.sessions,
+            "rate": args.rate,
+            "duration": args.duration,
+            "latency": args.latency,
+            "payload_size": args.payload_size,
+            "notify_rate": args.notify_rate,
+            "list_ratio": args.list_ratio,
+            "env": extra_env,
+        },
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the proxy with a fake stdio MCP server")
+    parser.add_argument("--modes", default="shared,dedicated", help="Comma separated session modes to run")
+    parser.add_argument("--sessions", type=int, default=10, help="SSE sessions to open")
+    parser.add_argument("--rate", type=float, default=100.0, help="Total requests per second")
+    parser.add_argument("--duration", type=float, default=10.0, help="Measured seconds per mode")
+    parser.add_argument("--warmup", type=float, default=1.0, help="Seconds of unmeasured load first")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds each tool call takes in the fake server")
+    parser.add_argument("--payload-size", type=int, default=64, help="Bytes returned by each tool call")
+    parser.add_argument("--notify-rate", type=float, default=0.0, help="Log notifications per second during a tool call")
+    parser.add_argument("--list-ratio", type=float, default=0.0, help="Fraction of requests that are tools/list")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Per-request timeout in seconds")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="Extra proxy environment variable")
+    parser.add_argument("--output", help="Write the JSON results to this file instead of stdout")
+    parser.add_argument("--verbose", action="store_true", help="Show the proxy's log output")
+    args = parser.parse_args()
+
+    report = json.dumps(asyncio.run(run(args)), indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report + "\n")
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
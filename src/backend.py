@@ -0,0 +1,740 @@
+import logging
+import asyncio
+import hashlib
+import json
+import time
+import uuid
+import zlib
+from collections import deque
+from contextvars import ContextVar
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Set
+
+from mcp import ClientSession, stdio_client, types
+from mcp import StdioServerParameters
+
+from metrics import BACKEND_PROCESSES, BACKEND_SPAWN_DURATION, POOL_HITS, POOL_MISSES
+
+logger = logging.getLogger(__name__)
+
+MessageHandler = Callable[[object], Awaitable[None]]
+BackendFactory = Callable[[StdioServerParameters], "Backend"]
+
+# Environment variable tagging each spawned process with its id
+PROCESS_MARKER = "MCPPROXY_PROCESS_ID"
+
+# Ids of the requests sent upstream by the Backend.call running in this task
+_sent_requests: ContextVar[Optional[List]] = ContextVar("sent_requests", default=None)
+
+
+def same_params(a: StdioServerParameters, b: StdioServerParameters) -> bool:
+    """Check whether two server parameter sets would spawn identical processes"""
+    return a.command == b.command and list(a.args) == list(b.args) and dict(a.env or {}) == dict(b.env or {})
+
+
+def fingerprint(params: StdioServerParameters) -> str:
+    """Hash the effective command, args and env of a backend"""
+    payload = json.dumps(
+        [params.command, list(params.args), sorted((params.env or {}).items())],
+        separators=(",", ":")
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class _RequestRecorder:
+    """Write stream wrapper noting the id of each request a call sends
+
+    The session assigns request ids as it sends, so this is the one place
+    that knows which upstream request belongs to which call.
+    """
+
+    def __init__(self, stream):
+        self._stream = stream
+
+    async def send(self, message):
+        await self._stream.send(message)
+        sent = _sent_requests.get()
+        if sent is not None and isinstance(message.root, types.JSONRPCRequest):
+            sent.append(message.root.id)
+
+    async def __aenter__(self):
+        await self._stream.__aenter__()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return await self._stream.__aexit__(*exc_info)
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+class _Process:
+    """One spawned server process with its initialized client session
+
+    The stdio_client and ClientSession contexts are entered and exited inside
+    a dedicated runner task, so a process can be started by one request and
+    closed by another without crossing anyio cancel scopes.
+    """
+
+    def __init__(self, params: StdioServerParameters, handler: MessageHandler, mark: bool = False):
+        self.id = uuid.uuid4().hex
+        self.params = params
+        if mark:
+            # Mark the child's environment so its pid can be found in /proc
+            self.params = params.model_copy(update={"env": {**(params.env or {}), PROCESS_MARKER: self.id}})
+        self.handler = handler
+        self.session: Optional[ClientSession] = None
+        self.initialize_result: Optional[types.InitializeResult] = None
+        self.pid: Optional[int] = None
+        self.started_at = time.monotonic()
+        self.spawn_duration = 0.0
+        self.exited = False
+        # Set when the process is failed over, its unanswered requests fail
+        self.failed = False
+        self.outstanding = 0
+        self.requests = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._task: Optional[asyncio.Task] = None
+        self._ready: Optional[asyncio.Future] = None
+        self._stop = asyncio.Event()
+        self._read_stream = None
+
+    async def start(self):
+        self._ready = asyncio.get_running_loop().create_future()
+        self._task = asyncio.create_task(self._run())
+        try:
+            await self._ready
+        except BaseException:
+            await self.close()
+            raise
+
+    async def _run(self):
+        try:
+            async with stdio_client(self.params) as streams:
+                self._read_stream = streams[0]
+                async with ClientSession(
+                    streams[0],
+                    _RequestRecorder(streams[1]),
+                    message_handler=self.handler
+                ) as session:
+                    self.initialize_result = await session.initialize()
+                    self.session = session
+                    self.spawn_duration = time.monotonic() - self.started_at
+                    BACKEND_SPAWN_DURATION.observe(self.spawn_duration)
+                    BACKEND_PROCESSES.inc()
+                    self._ready.set_result(None)
+                    try:
+                        await self._stop.wait()
+                    finally:
+                        BACKEND_PROCESSES.dec()
+        except Exception as e:
+            if not self._ready.done():
+                self._ready.set_exception(e)
+            else:
+                logger.error(f"Backend exited with error: {e}")
+        finally:
+            self.session = None
+            self.exited = True
+            if not self._ready.done():
+                self._ready.set_exception(RuntimeError("Backend stopped before it was ready"))
+
+    @property
+    def alive(self) -> bool:
+        """Whether the process is up, its stdout is closed as soon as it exits"""
+        if self.exited or self.session is None:
+            return False
+        try:
+            return self._read_stream.statistics().open_send_streams > 0
+        except Exception:
+            return False
+
+    async def ping(self, timeout: float):
+        """Send an MCP ping, raises when there is no answer within timeout"""
+        session = self.session
+        if session is None:
+            raise RuntimeError("MCP session not initialized")
+        await asyncio.wait_for(session.send_ping(), timeout)
+
+    def begin_call(self):
+        self.outstanding += 1
+        self.requests += 1
+        self._idle.clear()
+
+    def end_call(self):
+        self.outstanding -= 1
+        if self.outstanding == 0:
+            self._idle.set()
+
+    async def drain(self):
+        """Wait for outstanding requests, then stop the process"""
+        await self._idle.wait()
+        await self.close()
+
+    async def close(self):
+        """Stop the process and wait for the runner task to finish"""
+        self._stop.set()
+        if self._task is not None and self._task is not asyncio.current_task():
+            if not self._ready.done():
+                self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            except Exception as e:
+                logger.error(f"Error during backend cleanup: {e}")
+
+
+class Backend:
+    """An MCP server process behind a stable handle
+
+    The process can be recycled in place: a fresh one is started and takes
+    new requests, while requests already sent to the old one finish before
+    it is stopped. A dead or hung process is failed over instead, stopping
+    it at once and retrying the idempotent requests it left unanswered on
+    its replacement. Sessions, registries and replica sets keep their handle.
+    """
+
+    def __init__(self, params: StdioServerParameters, forward_cancel: bool = False, mark_process: bool = False):
+        self.params = params
+        self.fingerprint = fingerprint(params)
+        self.forward_cancel = forward_cancel
+        # Put PROCESS_MARKER in the child's environment
+        self.mark_process = mark_process
+        # Normalized initialize result served to clients, filled in by the proxy
+        self.initialize_response: Optional[dict] = None
+        self.listeners: Set[MessageHandler] = set()
+        self.created_at = time.monotonic()
+        self.process: Optional[_Process] = None
+        self.outstanding = 0
+        self.requests = 0
+        self.errors = 0
+        self.recycles = 0
+        self.recycling = False
+        self.failovers = 0
+        self.retries = 0
+        # Spare initialized process taken by recycle and failover
+        self.standby: Optional[_Process] = None
+        # How long retryable calls on a dead process wait for its replacement
+        self.failover_wait = 0.0
+        self._swapped = asyncio.Event()
+        self._closed = False
+        self._draining: Set[asyncio.Task] = set()
+        self._cancel_tasks: Set[asyncio.Task] = set()
+
+    @property
+    def client_session(self) -> Optional[ClientSession]:
+        return self.process.session if self.process else None
+
+    @property
+    def initialize_result(self) -> Optional[types.InitializeResult]:
+        return self.process.initialize_result if self.process else None
+
+    @property
+    def spawn_duration(self) -> float:
+        return self.process.spawn_duration if self.process else 0.0
+
+    @property
+    def closed(self) -> bool:
+        return self._closed or (self.process is not None and self.process.exited)
+
+    @property
+    def retired(self) -> bool:
+        """Closed on purpose, as opposed to a process that died"""
+        return self._closed
+
+    @property
+    def healthy(self) -> bool:
+        return not self._closed and self.process is not None and self.process.alive
+
+    def _new_process(self) -> _Process:
+        async def handler(message):
+            # A standby stays silent until it is swapped in
+            if process is not self.standby:
+                await self._handle_message(message)
+
+        process = _Process(self.params, handler, mark=self.mark_process)
+        return process
+
+    async def start(self):
+        """Spawn the process and run the MCP handshake"""
+        self.process = self._new_process()
+        try:
+            await self.process.start()
+        except BaseException:
+            self._closed = True
+            raise
+
+    async def recycle(self):
+        """Replace the process with a fresh one without failing in-flight requests"""
+        if self._closed or self.recycling:
+            return
+        self.recycling = True
+        try:
+            replacement = await self._replacement()
+            if self._closed:
+                await replacement.close()
+                return
+            old = self._swap(replacement)
+            self.recycles += 1
+            if old is not None:
+                self._background(old.drain())
+        finally:
+            self.recycling = False
+
+    async def failover(self):
+        """Replace a dead or unresponsive process, stopping it without waiting for its requests"""
+        if self._closed or self.recycling:
+            return
+        self.recycling = True
+        try:
+            replacement = await self._replacement()
+            if self._closed:
+                await replacement.close()
+                return
+            old = self._swap(replacement)
+            self.failovers += 1
+            if old is not None:
+                # Requests still waiting on it fail and retryable ones move to the replacement
+                old.failed = True
+                self._background(old.close())
+        finally:
+            self.recycling = False
+
+    async def prepare_standby(self):
+        """Start a spare process unless a live one is ready"""
+        if self._closed or (self.standby is not None and self.standby.alive):
+            return
+        if self.standby is not None:
+            await self.standby.close()
+            self.standby = None
+        standby = self._new_process()
+        self.standby = standby
+        try:
+            await standby.start()
+        except BaseException:
+            if self.standby is standby:
+                self.standby = None
+            raise
+        if self._closed:
+            await standby.close()
+
+    async def _replacement(self) -> _Process:
+        """Take the standby when it is alive, otherwise start a new process"""
+        standby = self.standby
+        if standby is not None and standby.alive:
+            return standby
+        process = self._new_process()
+        await process.start()
+        return process
+
+    def _swap(self, replacement: _Process) -> Optional[_Process]:
+        if self.standby is replacement:
+            self.standby = None
+        old, self.process = self.process, replacement
+        self.initialize_response = None
+        swapped, self._swapped = self._swapped, asyncio.Event()
+        swapped.set()
+        return old
+
+    def _background(self, coro):
+        task = asyncio.create_task(coro)
+        self._draining.add(task)
+        task.add_done_callback(self._draining.discard)
+
+    async def _replaced(self, process: _Process, swapped: asyncio.Event) -> bool:
+        """Whether process was swapped out, waiting up to failover_wait when it is dead"""
+        if self.process is not process:
+            return True
+        if self._closed or process.alive or self.failover_wait <= 0:
+            return False
+        try:
+            await asyncio.wait_for(swapped.wait(), self.failover_wait)
+        except asyncio.TimeoutError:
+            return False
+        return self.process is not process
+
+    async def _handle_message(self, message):
+        for listener in list(self.listeners):
+            await listener(message)
+
+    async def call(
+        self,
+        fn: Callable[[ClientSession], Awaitable],
+        retry: bool = False,
+        forward_cancel: Optional[Callable[[], bool]] = None
+    ):
+        """Run fn against the client session, tracking outstanding requests
+
+        With retry, fn is run once more on the replacement when its process
+        fails over, so it must be safe to repeat. When the call is cancelled,
+        forward_cancel decides whether the server is told to stop as well.
+        """
+        while True:
+            process = self.process
+            swapped = self._swapped
+            if process is None or not process.alive:
+                if retry and process is not None and await self._replaced(process, swapped):
+                    retry = False
+                    continue
+                raise RuntimeError("MCP server is not running")
+            session = process.session
+            # Filled in with the ids of the requests fn sends, used to cancel them upstream
+            sent: List = []
+            token = _sent_requests.set(sent)
+            process.begin_call()
+            self.outstanding += 1
+            self.requests += 1
+            try:
+                return await fn(session)
+            except asyncio.CancelledError:
+                if self.forward_cancel and sent and (forward_cancel is None or forward_cancel()):
+                    self._forward_cancel(session, sent[-1])
+                raise
+            except Exception:
+                if retry and await self._replaced(process, swapped):
+                    retry = False
+                    self.retries += 1
+                    continue
+                self.errors += 1
+                if process.failed:
+                    raise RuntimeError("MCP server process failed before answering the request")
+                raise
+            finally:
+                _sent_requests.reset(token)
+                self.outstanding -= 1
+                process.end_call()
+
+    def _forward_cancel(self, session: ClientSession, request_id: types.RequestId):
+        """Tell the server to stop working on a request nobody waits for any more"""
+        async def send():
+            try:
+                await session.send_notification(types.ClientNotification(types.CancelledNotification(
+                    method="notifications/cancelled",
+                    params=types.CancelledNotificationParams(requestId=request_id, reason="Cancelled by proxy")
+                )))
+            except Exception as e:
+                logger.debug("Failed to forward cancellation: %s", e)
+
+        task = asyncio.create_task(send())
+        self._cancel_tasks.add(task)
+        task.add_done_callback(self._cancel_tasks.discard)
+
+    def stats(self) -> dict:
+        return {
+            "healthy": self.healthy,
+            "pid": self.process.pid if self.process else None,
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "errors": self.errors,
+            "recycles": self.recycles,
+            "failovers": self.failovers,
+            "retries": self.retries,
+            "standby": self.standby is not None and self.standby.alive,
+            "spawn_duration": round(self.spawn_duration, 3),
+            "uptime": round(time.monotonic() - self.created_at, 1),
+        }
+
+    async def close(self):
+        """Stop the process, including any still draining after a recycle"""
+        self._closed = True
+        for task in list(self._draining):
+            task.cancel()
+        if self.standby is not None:
+            standby, self.standby = self.standby, None
+            await standby.close()
+        if self.process is not None:
+            await self.process.close()
+        await asyncio.gather(*self._draining, return_exceptions=True)
+
+
+class ReplicaSet:
+    """N identical backends serving shared-session mode
+
+    Requests go to the healthy replica with the fewest outstanding
+    requests. Stateful calls pass a sticky key and always land on the
+    same replica, so e.g. subscribe and unsubscribe for a URI match up.
+    """
+
+    def __init__(self, params: StdioServerParameters, size: int = 1, factory: Optional[BackendFactory] = None):
+        self.params = params
+        self.fingerprint = fingerprint(params)
+        self.size = max(size, 1)
+        self.factory = factory or Backend
+        self.replicas: List[Backend] = []
+
+    async def start(self):
+        """Spawn all replicas concurrently"""
+        replicas = [self.factory(self.params) for _ in range(self.size)]
+        results = await asyncio.gather(*(r.start() for r in replicas), return_exceptions=True)
+        errors = [r for r in results if isinstance(r, BaseException)]
+        if errors:
+            await asyncio.gather(*(r.close() for r in replicas), return_exceptions=True)
+            raise errors[0]
+        self.replicas = replicas
+
+    def pick(self, sticky_key: Optional[str] = None) -> Optional[Backend]:
+        """Select a replica by sticky key or least outstanding requests"""
+        if sticky_key is not None and self.replicas:
+            replica = self.replicas[zlib.crc32(sticky_key.encode()) % len(self.replicas)]
+            if replica.healthy:
+                return replica
+        healthy = [r for r in self.replicas if r.healthy]
+        if not healthy:
+            # Calls on a replica being failed over wait for or fail on their own
+            healthy = [r for r in self.replicas if not r.retired]
+        if not healthy:
+            return None
+        return min(healthy, key=lambda r: r.outstanding)
+
+    async def close(self):
+        replicas, self.replicas = self.replicas, []
+        for replica in replicas:
+            await replica.close()
+
+    def stats(self) -> List[dict]:
+        return [dict(index=i, **r.stats()) for i, r in enumerate(self.replicas)]
+
+
+class _SharedEntry:
+    def __init__(self, key: str):
+        self.key = key
+        self.backend: Optional[Backend] = None
+        self.starting: Optional[asyncio.Future] = None
+        self.refs = 0
+        self.linger_handle: Optional[asyncio.TimerHandle] = None
+
+
+class BackendRegistry:
+    """Ref-counted backends keyed by the fingerprint of their parameters
+
+    Sessions with the same effective command, args and env share one
+    backend. When the last session releases it, the backend lingers for
+    linger seconds so a reconnecting client reattaches instead of spawning.
+    """
+
+    def __init__(self, spawn: Callable[[StdioServerParameters], Awaitable[Backend]], linger: float = 60.0):
+        self.spawn = spawn
+        self.linger = linger
+        self.entries: Dict[str, _SharedEntry] = {}
+        self.reuses = 0
+        self.spawns = 0
+        self._close_tasks = set()
+
+    async def acquire(self, params: StdioServerParameters) -> Backend:
+        """Get the backend for params, spawning it if no live one exists"""
+        key = fingerprint(params)
+        entry = self.entries.get(key)
+        if entry is None:
+            entry = self.entries[key] = _SharedEntry(key)
+        entry.refs += 1
+        if entry.linger_handle is not None:
+            entry.linger_handle.cancel()
+            entry.linger_handle = None
+
+        try:
+            if entry.backend is not None and not entry.backend.closed:
+                self.reuses += 1
+                return entry.backend
+            if entry.starting is not None:
+                self.reuses += 1
+                return await asyncio.shield(entry.starting)
+
+            entry.starting = asyncio.get_running_loop().create_future()
+            try:
+                backend = await self.spawn(params)
+            except BaseException as e:
+                entry.starting.set_exception(e if isinstance(e, Exception) else RuntimeError("Backend start cancelled"))
+                # Mark the exception as retrieved when nobody else is waiting
+                entry.starting.exception()
+                raise
+            finally:
+                starting, entry.starting = entry.starting, None
+            self.spawns += 1
+            entry.backend = backend
+            starting.set_result(backend)
+            return backend
+        except BaseException:
+            entry.refs -= 1
+            self._maybe_linger(entry)
+            raise
+
+    async def release(self, backend: Backend):
+        """Drop one reference, the backend is closed after the linger period"""
+        entry = self.entries.get(backend.fingerprint)
+        if entry is None or entry.backend is not backend:
+            await backend.close()
+            return
+        entry.refs -= 1
+        self._maybe_linger(entry)
+
+    def _maybe_linger(self, entry: _SharedEntry):
+        if entry.refs > 0 or entry.starting is not None:
+            return
+        if entry.backend is None or entry.backend.closed or self.linger <= 0:
+            self._expire(entry)
+            return
+        entry.linger_handle = asyncio.get_running_loop().call_later(self.linger, self._expire, entry)
+
+    def _expire(self, entry: _SharedEntry):
+        entry.linger_handle = None
+        if entry.refs > 0 or self.entries.get(entry.key) is not entry:
+            return
+        del self.entries[entry.key]
+        if entry.backend is not None:
+            task = asyncio.create_task(entry.backend.close())
+            self._close_tasks.add(task)
+            task.add_done_callback(self._close_tasks.discard)
+
+    async def close(self):
+        """Close every backend regardless of references"""
+        entries = list(self.entries.values())
+        self.entries.clear()
+        for entry in entries:
+            if entry.linger_handle is not None:
+                entry.linger_handle.cancel()
+            if entry.backend is not None:
+                await entry.backend.close()
+        await asyncio.gather(*self._close_tasks, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "backends": len(self.entries),
+            "referenced": sum(1 for e in self.entries.values() if e.refs > 0),
+            "lingering": sum(1 for e in self.entries.values() if e.linger_handle is not None),
+            "reuses": self.reuses,
+            "spawns": self.spawns,
+        }
+
+
+class BackendPool:
+    """Warm pool of pre-spawned, initialized backends
+
+    Keeps at least min_size idle backends ready. A miss raises the target by
+    one (up to max_size) so the pool follows connection bursts, and idle
+    backends above min_size are retired after idle_timeout seconds.
+    """
+
+    def __init__(
+        self,
+        params: StdioServerParameters,
+        min_size: int = 1,
+        max_size: int = 4,
+        spawn_concurrency: int = 2,
+        idle_timeout: float = 300.0,
+        factory: Optional[BackendFactory] = None
+    ):
+        self.params = params
+        self.factory = factory or Backend
+        self.min_size = min_size
+        self.max_size = max(max_size, min_size)
+        self.idle_timeout = idle_timeout
+        self.target = min_size
+        self.idle: Deque[Backend] = deque()
+        self.spawning = 0
+        self.hits = 0
+        self.misses = 0
+        self.spawned = 0
+        self.spawn_failures = 0
+        self.closed = False
+        self._spawn_semaphore = asyncio.Semaphore(max(spawn_concurrency, 1))
+        self._refill_event = asyncio.Event()
+        self._refill_task: Optional[asyncio.Task] = None
+        self._spawn_tasks = set()
+
+    def matches(self, params: StdioServerParameters) -> bool:
+        """Whether backends from this pool can serve the given parameters"""
+        return same_params(self.params, params)
+
+    async def start(self):
+        """Start the background refill loop"""
+        self._refill_task = asyncio.create_task(self._refill_loop())
+        self._refill_event.set()
+
+    async def acquire(self) -> Backend:
+        """Take a ready backend, spawning one directly on a miss"""
+        while self.idle:
+            backend = self.idle.popleft()
+            if backend.closed:
+                continue
+            self.hits += 1
+            POOL_HITS.inc()
+            self._refill_event.set()
+            return backend
+
+        self.misses += 1
+        POOL_MISSES.inc()
+        self.target = min(self.target + 1, self.max_size)
+        self._refill_event.set()
+        return await self._spawn()
+
+    async def _spawn(self) -> Backend:
+        async with self._spawn_semaphore:
+            backend = self.factory(self.params)
+            try:
+                await backend.start()
+            except Exception:
+                self.spawn_failures += 1
+                raise
+            self.spawned += 1
+            return backend
+
+    async def _spawn_idle(self):
+        try:
+            backend = await self._spawn()
+        except Exception as e:
+            logger.error(f"Failed to spawn pooled backend: {e}")
+            await asyncio.sleep(1)
+            return
+        finally:
+            self.spawning -= 1
+            self._refill_event.set()
+        if self.closed:
+            await backend.close()
+        else:
+            self.idle.append(backend)
+
+    def _retire_idle(self):
+        now = time.monotonic()
+        while len(self.idle) > self.min_size and now - self.idle[0].created_at > self.idle_timeout:
+            backend = self.idle.popleft()
+            self.target = max(self.target - 1, self.min_size)
+            task = asyncio.create_task(backend.close())
+            self._spawn_tasks.add(task)
+            task.add_done_callback(self._spawn_tasks.discard)
+
+    async def _refill_loop(self):
+        while not self.closed:
+            try:
+                await asyncio.wait_for(self._refill_event.wait(), timeout=max(self.idle_timeout / 2, 1))
+            except asyncio.TimeoutError:
+                pass
+            self._refill_event.clear()
+            self._retire_idle()
+            while not self.closed and len(self.idle) + self.spawning < self.target:
+                self.spawning += 1
+                task = asyncio.create_task(self._spawn_idle())
+                self._spawn_tasks.add(task)
+                task.add_done_callback(self._spawn_tasks.discard)
+
+    async def close(self):
+        """Stop refilling and close all idle backends"""
+        self.closed = True
+        if self._refill_task:
+            self._refill_task.cancel()
+            await asyncio.gather(self._refill_task, return_exceptions=True)
+        await asyncio.gather(*self._spawn_tasks, return_exceptions=True)
+        while self.idle:
+            await self.idle.popleft().close()
+
+    def stats(self) -> dict:
+        return {
+            "idle": len(self.idle),
+            "spawning": self.spawning,
+            "target": self.target,
+            "min_size": self.min_size,
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "spawned": self.spawned,
+            "spawn_failures": self.spawn_failures,
+        }
@@ -0,0 +1,188 @@
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Set, Tuple
+
+from mcp import types
+
+from serialization import RawJSON, encoded_size
+
+# Notification method -> cached methods it invalidates
+LIST_CHANGED_INVALIDATES = {
+    "notifications/tools/list_changed": ("tools/list",),
+    "notifications/prompts/list_changed": ("prompts/list",),
+    "notifications/resources/list_changed": ("resources/list", "resources/templates/list"),
+}
+
+CacheKey = Tuple[str, str, str]
+
+
+def canonical_params(params: Any) -> str:
+    """Stable JSON form of request params used in cache keys"""
+    return json.dumps(params or {}, sort_keys=True, separators=(",", ":"), default=str)
+
+
+class ResponseCache:
+    """TTL + LRU cache of backend responses
+
+    Entries are keyed on (scope, method, canonical params), where scope
+    identifies the backend configuration. Per-scope generations guard
+    against storing a response fetched before an invalidation.
+    """
+
+    def __init__(self, ttls: Dict[str, float], max_entries: int = 1024):
+        self.ttls = ttls
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[CacheKey, Tuple[float, Any]]" = OrderedDict()
+        self.generations: Dict[str, int] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def cacheable(self, method: str) -> bool:
+        return method in self.ttls
+
+    def key(self, scope: str, method: str, params: Any) -> CacheKey:
+        return (scope, method, canonical_params(params))
+
+    def generation(self, scope: str) -> int:
+        return self.generations.get(scope, 0)
+
+    def get(self, key: CacheKey) -> Optional[Any]:
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self.entries[key]
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: CacheKey, value: Any, generation: int):
+        """Store value unless its scope was invalidated since generation was read"""
+        if self.generation(key[0]) != generation:
+            return
+        self.entries[key] = (time.monotonic() + self.ttls[key[1]], value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, scope: str, methods=None, uri: Optional[str] = None):
+        """Drop entries of a scope, optionally limited to methods or a resource URI"""
+        self.generations[scope] = self.generation(scope) + 1
+        for key in [k for k in self.entries if k[0] == scope]:
+            if methods is not None and key[1] not in methods:
+                continue
+            if uri is not None and json.loads(key[2]).get("uri") != uri:
+                continue
+            del self.entries[key]
+            self.invalidations += 1
+
+    def handle_notification(self, scope: str, message):
+        """Invalidate entries affected by a backend notification"""
+        if not isinstance(message, types.ServerNotification):
+            return
+        method = getattr(message.root, "method", None)
+        if method in LIST_CHANGED_INVALIDATES:
+            self.invalidate(scope, LIST_CHANGED_INVALIDATES[method])
+        elif method == "notifications/resources/updated":
+            self.invalidate(scope, ("resources/read",), str(message.root.params.uri))
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+class ToolResultCache:
+    """Memoization of tools/call results for an allow-list of idempotent tools
+
+    Bounded by total encoded size with LRU eviction. Keys carry the
+    backend fingerprint plus, unless shared, the session id, so results
+    are only reused between sessions with the same effective env.
+    """
+
+    def __init__(self, tools: Set[str], ttl: float = 300.0, max_bytes: int = 64 * 1024 * 1024, shared: bool = False):
+        self.tools = tools
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.shared = shared
+        self.entries: "OrderedDict[Tuple[str, str, str, str], Tuple[float, int, Any]]" = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def cacheable(self, params: dict) -> bool:
+        return params.get("name") in self.tools
+
+    def key(self, scope: str, session_id: str, params: dict) -> Tuple[str, str, str, str]:
+        return (scope, "" if self.shared else session_id, params.get("name"), canonical_params(params.get("arguments")))
+
+    def get(self, key) -> Optional[Any]:
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, size, value = entry
+        if expires_at < time.monotonic():
+            self._remove(key)
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value: Any):
+        """Store a successful result, evicting least recently used entries over max_bytes"""
+        if isinstance(value, dict) and value.get("isError") or isinstance(value, RawJSON) and value.is_error:
+            return
+        size = encoded_size(value)
+        if size > self.max_bytes:
+            return
+        if key in self.entries:
+            self._remove(key)
+        self.entries[key] = (time.monotonic() + self.ttl, size, value)
+        self.bytes += size
+        while self.bytes > self.max_bytes:
+            oldest = next(iter(self.entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _remove(self, key):
+        _, size, _ = self.entries.pop(key)
+        self.bytes -= size
+
+    def drop_session(self, session_id: str):
+        """Drop the private results of a closed session"""
+        if self.shared:
+            return
+        for key in [k for k in self.entries if k[1] == session_id]:
+            self._remove(key)
+
+    def handle_notification(self, scope: str, message):
+        """Drop results of a backend whose tool list changed"""
+        if not isinstance(message, types.ServerNotification):
+            return
+        if getattr(message.root, "method", None) == "notifications/tools/list_changed":
+            for key in [k for k in self.entries if k[0] == scope]:
+                self._remove(key)
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self.entries),
+            "bytes": self.bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,65 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Set
+
+
+class _Flight:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Coalesce identical concurrent backend requests into one upstream call
+
+    The upstream call runs as its own task, so a waiter going away does not
+    fail the others; it is cancelled only when every waiter has left.
+    tools/call is coalesced only for tools listed as idempotent.
+    """
+
+    def __init__(self, methods: Set[str], idempotent_tools: Set[str]):
+        self.methods = methods
+        self.idempotent_tools = idempotent_tools
+        self.flights: Dict[Hashable, _Flight] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    def coalescable(self, method: str, params: dict) -> bool:
+        if method not in self.methods:
+            return False
+        if method == "tools/call":
+            return params.get("name") in self.idempotent_tools
+        return True
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Await the in-flight call for key, starting it with fn if there is none"""
+        flight = self.flights.get(key)
+        if flight is None:
+            flight = self.flights[key] = _Flight(asyncio.ensure_future(fn()))
+            flight.task.add_done_callback(lambda task: self._finish(key, flight))
+            self.leaders += 1
+        else:
+            self.coalesced += 1
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                if self.flights.get(key) is flight:
+                    del self.flights[key]
+                flight.task.cancel()
+
+    def _finish(self, key: Hashable, flight: _Flight):
+        if self.flights.get(key) is flight:
+            del self.flights[key]
+        if not flight.task.cancelled():
+            # Mark the exception as retrieved when no waiter is left to see it
+            flight.task.exception()
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self.flights),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+        }
@@ -1,4 +1,6 @@
 import os
+import re
+import json
 import shlex
 import logging
 from typing import List, Dict, NamedTuple, Optional
@@ -13,6 +15,195 @@ AUTH_KEY: Optional[str] = os.getenv('AUTH_KEY')
 if AUTH_KEY is None:
     logger.warning("AUTH_KEY environment variable is not set")
 
+# 异步分发模式：POST /messages 校验后立即返回 202，结果通过 SSE 推送
+ASYNC_DISPATCH: bool = os.getenv('ASYNC_DISPATCH', 'false').lower() == 'true'
+
+# 每个会话允许同时在途的请求数上限（仅异步分发模式生效）
+MAX_INFLIGHT_PER_SESSION: int = int(os.getenv('MAX_INFLIGHT_PER_SESSION', '128'))
+
+# 独立会话模式下的预热进程池：常驻的空闲进程数，0 表示关闭
+WARM_POOL_SIZE: int = int(os.getenv('WARM_POOL_SIZE', '0'))
+# 预热进程池在突发连接下可扩展到的最大空闲进程数
+WARM_POOL_MAX_SIZE: int = int(os.getenv('WARM_POOL_MAX_SIZE', str(max(WARM_POOL_SIZE, 4))))
+# 同时启动的进程数上限
+WARM_POOL_SPAWN_CONCURRENCY: int = int(os.getenv('WARM_POOL_SPAWN_CONCURRENCY', '2'))
+# 超出 WARM_POOL_SIZE 的空闲进程在该时间（秒）后回收
+WARM_POOL_IDLE_TIMEOUT: float = float(os.getenv('WARM_POOL_IDLE_TIMEOUT', '300'))
+
+# 独立会话模式下按 command/args/env 指纹复用后端进程
+BACKEND_REUSE: bool = os.getenv('BACKEND_REUSE', 'false').lower() == 'true'
+# 最后一个会话断开后，复用的后端进程继续保留的时间（秒）
+BACKEND_LINGER: float = float(os.getenv('BACKEND_LINGER', '60'))
+
+# 共享会话模式下的后端进程副本数，请求按在途请求数最少的副本分发
+SHARED_REPLICAS: int = int(os.getenv('SHARED_REPLICAS', '1'))
+
+# 列表类方法的响应缓存
+RESPONSE_CACHE: bool = os.getenv('RESPONSE_CACHE', 'false').lower() == 'true'
+# 缓存默认过期时间（秒）
+RESPONSE_CACHE_TTL: float = float(os.getenv('RESPONSE_CACHE_TTL', '60'))
+# 按方法覆盖过期时间，格式：tools/list=300,resources/list=10
+RESPONSE_CACHE_METHOD_TTLS: str = os.getenv('RESPONSE_CACHE_METHOD_TTLS', '')
+# 缓存条目数上限，超出后按 LRU 淘汰
+RESPONSE_CACHE_MAX_ENTRIES: int = int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', '1024'))
+# 是否按 URI 缓存 resources/read 结果
+RESPONSE_CACHE_READ: bool = os.getenv('RESPONSE_CACHE_READ', 'false').lower() == 'true'
+
+# 默认缓存的方法
+CACHED_LIST_METHODS = ("tools/list", "prompts/list", "resources/list", "resources/templates/list")
+
+# 合并相同并发请求的方法列表，逗号分隔，例如 tools/list,resources/read
+COALESCE_METHODS: str = os.getenv('COALESCE_METHODS', '')
+# 幂等工具名称列表，逗号分隔；tools/call 仅对这些工具合并请求
+IDEMPOTENT_TOOLS: str = os.getenv('IDEMPOTENT_TOOLS', '')
+
+# 缓存 tools/call 结果的工具名称列表，逗号分隔，为空表示关闭
+TOOL_CACHE_TOOLS: str = os.getenv('TOOL_CACHE_TOOLS', '')
+# 工具结果缓存过期时间（秒）
+TOOL_CACHE_TTL: float = float(os.getenv('TOOL_CACHE_TTL', '300'))
+# 工具结果缓存总大小上限（字节），超出后按 LRU 淘汰
+TOOL_CACHE_MAX_BYTES: int = int(os.getenv('TOOL_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+# 是否在指纹相同的会话之间共享工具结果缓存
+TOOL_CACHE_SHARED: bool = os.getenv('TOOL_CACHE_SHARED', 'false').lower() == 'true'
+
+# 每个 SSE 会话的发送队列上限（消息数），0 表示不限制
+OUTBOUND_QUEUE_MAX_MESSAGES: int = int(os.getenv('OUTBOUND_QUEUE_MAX_MESSAGES', '1000'))
+# 每个 SSE 会话的发送队列上限（字节），0 表示不限制
+OUTBOUND_QUEUE_MAX_BYTES: int = int(os.getenv('OUTBOUND_QUEUE_MAX_BYTES', str(16 * 1024 * 1024)))
+# 队列满时的处理策略：drop_oldest / coalesce / disconnect
+OUTBOUND_QUEUE_POLICY: str = os.getenv('OUTBOUND_QUEUE_POLICY', 'coalesce').lower()
+
+# SSE 断线后会话及其后端保留的时间（秒），期间客户端可携带 Last-Event-ID 重连恢复，0（默认）表示立即清理、不支持恢复
+SSE_RESUME_GRACE: float = float(os.getenv('SSE_RESUME_GRACE', '0'))
+# 每个会话保留的已发送事件数，用于重连后重放
+SSE_REPLAY_BUFFER: int = int(os.getenv('SSE_REPLAY_BUFFER', '256'))
+# 空闲 SSE 连接发送保活注释的间隔（秒），0 表示不发送
+SSE_KEEPALIVE_INTERVAL: float = float(os.getenv('SSE_KEEPALIVE_INTERVAL', '30'))
+
+# 会话空闲超时（秒）：既无 POST 请求也无服务端通知时关闭会话，0 表示关闭
+SESSION_IDLE_TIMEOUT: float = float(os.getenv('SESSION_IDLE_TIMEOUT', '0'))
+# 会话最长存活时间（秒），0 表示不限制
+SESSION_MAX_LIFETIME: float = float(os.getenv('SESSION_MAX_LIFETIME', '0'))
+# 单个后端进程处理的请求数达到该值后在请求间隙透明重启，0 表示不限制
+BACKEND_MAX_REQUESTS: int = int(os.getenv('BACKEND_MAX_REQUESTS', '0'))
+# 后端进程（含子进程）常驻内存超过该值（MB）后透明重启，0 表示不限制，仅 Linux 生效
+BACKEND_MAX_RSS_MB: float = float(os.getenv('BACKEND_MAX_RSS_MB', '0'))
+# 回收任务的检查间隔（秒）
+REAPER_INTERVAL: float = float(os.getenv('REAPER_INTERVAL', '30'))
+
+# 共享模式后端健康检查间隔（秒），0 表示不检查
+HEALTH_CHECK_INTERVAL: float = float(os.getenv('HEALTH_CHECK_INTERVAL', '0'))
+# 健康检查 ping 的超时时间（秒）
+HEALTH_CHECK_TIMEOUT: float = float(os.getenv('HEALTH_CHECK_TIMEOUT', '5'))
+# 连续多少次 ping 失败后判定后端无响应并切换
+HEALTH_CHECK_FAILURES: int = int(os.getenv('HEALTH_CHECK_FAILURES', '2'))
+# 为每个共享后端保留一个已初始化的热备进程，故障时直接切换
+HOT_STANDBY: bool = os.getenv('HOT_STANDBY', 'false').lower() == 'true'
+# 后端反复重启时的指数退避初始值与上限（秒）
+RESTART_BACKOFF_INITIAL: float = float(os.getenv('RESTART_BACKOFF_INITIAL', '0.5'))
+RESTART_BACKOFF_MAX: float = float(os.getenv('RESTART_BACKOFF_MAX', '30'))
+
+# 重新加载配置后，旧会话在旧后端上继续运行的最长时间（秒），超时后关闭
+RELOAD_DRAIN_TIMEOUT: float = float(os.getenv('RELOAD_DRAIN_TIMEOUT', '300'))
+# 重新加载配置后，旧会话空闲多久（秒）即关闭，客户端重连后使用新后端
+DRAIN_IDLE_TIMEOUT: float = float(os.getenv('DRAIN_IDLE_TIMEOUT', '10'))
+# 关闭服务时等待在途请求完成、SSE 队列发送完毕的最长时间（秒）
+SHUTDOWN_DRAIN_TIMEOUT: float = float(os.getenv('SHUTDOWN_DRAIN_TIMEOUT', '30'))
+
+# 多服务器配置文件（JSON），每个服务器通过 /sse/{name} 与 /messages/{name} 访问
+MCP_SERVERS_CONFIG: str = os.getenv('MCP_SERVERS_CONFIG', '')
+# 配置文件中的服务器在最后一个会话结束多久（秒）后停止，0 表示不停止
+SERVER_IDLE_TIMEOUT: float = float(os.getenv('SERVER_IDLE_TIMEOUT', '600'))
+
+# 请求的默认超时时间（秒），0 表示不限制
+REQUEST_TIMEOUT: float = float(os.getenv('REQUEST_TIMEOUT', '0'))
+# 按方法设置的超时时间，格式：tools/list=10,resources/read=30
+METHOD_TIMEOUTS: str = os.getenv('METHOD_TIMEOUTS', '')
+# 按工具设置的 tools/call 超时时间，格式：search=30,build=600
+TOOL_TIMEOUTS: str = os.getenv('TOOL_TIMEOUTS', '')
+
+# 请求被取消或超时时向后端发送 notifications/cancelled，
+# mcp SDK 1.6 等旧版服务端收到后会退出，因此默认关闭
+FORWARD_CANCELLATION: bool = os.getenv('FORWARD_CANCELLATION', 'false').lower() == 'true'
+
+# 直接运行 main.py 时启动的 worker 进程数
+WORKERS: int = int(os.getenv('WORKERS', '1'))
+# 多 worker 模式下用于 worker 间转发请求的 Unix socket 目录，为空表示不转发
+WORKER_SOCKET_DIR: str = os.getenv('WORKER_SOCKET_DIR', '')
+
+# 以下 PER_KEY 限制按客户端 IP 计算（AUTH_KEY 为所有客户端共用的同一个密钥，无法区分客户端）
+# 每个客户端每秒允许的请求数，0 表示不限制
+RATE_LIMIT_PER_KEY: float = float(os.getenv('RATE_LIMIT_PER_KEY', '0'))
+# 每个会话每秒允许的请求数，0 表示不限制
+RATE_LIMIT_PER_SESSION: float = float(os.getenv('RATE_LIMIT_PER_SESSION', '0'))
+# 令牌桶容量（允许的突发请求数），0 表示与速率相同
+RATE_LIMIT_BURST: int = int(os.getenv('RATE_LIMIT_BURST', '0'))
+# 每个客户端同时处理的最大请求数，0 表示不限制
+MAX_CONCURRENT_PER_KEY: int = int(os.getenv('MAX_CONCURRENT_PER_KEY', '0'))
+# 每个会话同时处理的最大请求数，0 表示不限制
+MAX_CONCURRENT_PER_SESSION: int = int(os.getenv('MAX_CONCURRENT_PER_SESSION', '0'))
+# 每个后端进程同时处理的最大请求数（所有会话共享），0 表示不限制
+MAX_CONCURRENT_PER_BACKEND: int = int(os.getenv('MAX_CONCURRENT_PER_BACKEND', '0'))
+# 每个客户端允许的最大 SSE 会话数，0 表示不限制
+MAX_SESSIONS_PER_KEY: int = int(os.getenv('MAX_SESSIONS_PER_KEY', '0'))
+# 超出限制的请求最多排队等待的时间（秒），0 表示立即拒绝
+ADMISSION_QUEUE_TIMEOUT: float = float(os.getenv('ADMISSION_QUEUE_TIMEOUT', '0'))
+
+# 每个后端按通道（metadata、read、tool）限制的并发请求数，格式：metadata=0,read=8,tool=4，0 表示不限制
+LANE_CONCURRENCY: str = os.getenv('LANE_CONCURRENCY', '')
+
+# 日志级别
+LOG_LEVEL: str = os.getenv('LOG_LEVEL', 'INFO').upper()
+# 日志中消息内容的最大长度（字符），0 表示只记录大小
+LOG_PAYLOAD_LIMIT: int = int(os.getenv('LOG_PAYLOAD_LIMIT', '256'))
+# 逐条消息的 DEBUG 日志采样比例（0-1）
+LOG_SAMPLE_RATE: float = float(os.getenv('LOG_SAMPLE_RATE', '1'))
+# 是否输出每个请求的访问日志（方法、会话、耗时、字节数）
+ACCESS_LOG: bool = os.getenv('ACCESS_LOG', 'true').lower() == 'true'
+
+
+def parse_list(config_str: str) -> List[str]:
+    """解析逗号分隔的配置字符串"""
+    return [item.strip() for item in config_str.split(',') if item.strip()]
+
+
+def parse_key_values(config_str: str) -> Dict[str, str]:
+    """解析 key=value,key=value 形式的配置字符串"""
+    result = {}
+    for item in config_str.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        key, sep, value = item.partition('=')
+        if not sep:
+            raise ValueError(f"Invalid key=value item: {item}")
+        result[key.strip()] = value.strip()
+    return result
+
+
+def get_cache_ttls() -> Dict[str, float]:
+    """获取各方法的缓存过期时间，未开启缓存时返回空字典"""
+    if not RESPONSE_CACHE:
+        return {}
+    ttls = {method: RESPONSE_CACHE_TTL for method in CACHED_LIST_METHODS}
+    if RESPONSE_CACHE_READ:
+        ttls["resources/read"] = RESPONSE_CACHE_TTL
+    for method, ttl in parse_key_values(RESPONSE_CACHE_METHOD_TTLS).items():
+        if method not in CACHED_LIST_METHODS and method != "resources/read":
+            logger.warning(f"Ignoring cache TTL for non-cacheable method: {method}")
+            continue
+        ttls[method] = float(ttl)
+    return {method: ttl for method, ttl in ttls.items() if ttl > 0}
+
+
+def parse_timeouts(config_str: str) -> Dict[str, float]:
+    """解析 name=秒数 形式的超时配置"""
+    return {name: float(value) for name, value in parse_key_values(config_str).items()}
+
+
+def parse_counts(config_str: str) -> Dict[str, int]:
+    """解析 name=数量 形式的配置"""
+    return {name: int(value) for name, value in parse_key_values(config_str).items()}
 
 
 def parse_server_config(config_str: str) -> tuple[str, List[str]]:
@@ -27,6 +218,8 @@ def get_server_params() -> StdioServerParameters:
     
     从环境变量获取配置：
     - MCP_SERVER_CONFIG: 完整的命令配置字符串
+    - MCP_SERVER_CONFIG_FILE: 包含命令配置字符串的文件，优先于 MCP_SERVER_CONFIG，
+      每次调用时重新读取，修改后可通过 SIGHUP 或 /admin/reload 生效
     - 其他所有环境变量都会被传递给子进程
     
     Raises:
@@ -36,7 +229,15 @@ def get_server_params() -> StdioServerParameters:
     env = dict(os.environ)
     
     # 获取服务器配置，如果未设置则抛出错误
-    server_config = env.get('MCP_SERVER_CONFIG')
+    config_file = env.get('MCP_SERVER_CONFIG_FILE')
+    if config_file:
+        try:
+            with open(config_file) as f:
+                server_config = f.read().strip()
+        except OSError as e:
+            raise ValueError(f"Failed to read MCP_SERVER_CONFIG_FILE: {e}")
+    else:
+        server_config = env.get('MCP_SERVER_CONFIG')
     if not server_config:
         raise ValueError("MCP_SERVER_CONFIG environment variable is not set")
     
@@ -56,9 +257,61 @@ def get_server_params() -> StdioServerParameters:
     # 记录环境变量信息
     logger.info(f"Server command: {command}")
     logger.info(f"Server args: {args}")
-    logger.info(f"Environment variables: {', '.join(f'{k}={v}' for k, v in env.items())}")
+    logger.debug("Passing %d environment variables to the server", len(env))
     return StdioServerParameters(
         command=command,
         args=args,
         env=env
-    ) 
\ No newline at end of file
+    ) 
+
+
+class ServerConfig(NamedTuple):
+    """多服务器配置文件中的一个服务器"""
+    name: str
+    params: StdioServerParameters
+    shared_session: bool
+    idle_timeout: float
+
+
+def load_server_catalog(path: str) -> Dict[str, ServerConfig]:
+    """读取多服务器配置文件
+
+    格式：{"servers": {"名称": {"command": "npx -y server", "env": {...},
+    "shared_session": true, "idle_timeout": 600}}}。command 可以是完整命令行，
+    也可以配合 args 列表只写可执行文件；env 会覆盖代理自身的环境变量。
+
+    Raises:
+        ValueError: 配置文件无法读取或格式错误时抛出
+    """
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        raise ValueError(f"Failed to read MCP_SERVERS_CONFIG: {e}")
+
+    servers = data.get('servers') if isinstance(data, dict) else None
+    if not isinstance(servers, dict):
+        raise ValueError("MCP_SERVERS_CONFIG must contain a \"servers\" object")
+
+    catalog = {}
+    for name, item in servers.items():
+        if not re.fullmatch(r'[A-Za-z0-9_.-]+', name):
+            raise ValueError(f"Invalid server name: {name}")
+        if not isinstance(item, dict) or not item.get('command'):
+            raise ValueError(f"Server {name} has no command")
+        if 'args' in item:
+            command, args = item['command'], [str(arg) for arg in item['args']]
+        else:
+            command, args = parse_server_config(item['command'])
+        env = dict(os.environ)
+        env.setdefault('PYTHONUNBUFFERED', '1')
+        env.setdefault('NODE_ENV', 'production')
+        env.update({key: str(value) for key, value in (item.get('env') or {}).items()})
+        catalog[name] = ServerConfig(
+            name=name,
+            params=StdioServerParameters(command=command, args=args, env=env),
+            shared_session=bool(item.get('shared_session', True)),
+            idle_timeout=float(item.get('idle_timeout', SERVER_IDLE_TIMEOUT))
+        )
+    logger.info(f"Loaded {len(catalog)} server(s) from {path}: {', '.join(catalog)}")
+    return catalog
@@ -0,0 +1,191 @@
+import time
+import asyncio
+import logging
+import itertools
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Set, Tuple
+
+from mcp import types
+
+from serialization import dumps
+
+logger = logging.getLogger(__name__)
+
+# Sends resources/subscribe or resources/unsubscribe for a URI to the backend
+Upstream = Callable[[str, str], Awaitable[Any]]
+
+# Notifications every session of a shared backend is interested in
+BROADCAST = (
+    types.LoggingMessageNotification,
+    types.ResourceListChangedNotification,
+    types.ToolListChangedNotification,
+    types.PromptListChangedNotification,
+)
+
+
+def wrap_notification(root, content: Optional[dict] = None) -> dict:
+    """Envelope a server notification is delivered to SSE clients in"""
+    return {
+        "jsonrpc": "2.0",
+        "method": "notifications/message",
+        "params": {
+            "level": "info",
+            "data": {
+                "type": root.__class__.__name__,
+                "content": root.model_dump() if content is None else content
+            }
+        }
+    }
+
+
+class _UriLock:
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        # Coroutines holding or waiting for the lock
+        self.users = 0
+
+
+class NotificationRouter:
+    """Delivers notifications of the shared backends to the sessions they concern
+
+    Progress notifications go to the session that issued the request, using
+    a proxy-assigned progress token so sessions choosing the same token do
+    not collide. resources/updated goes to the sessions subscribed to the
+    URI, list changes and log messages go to every session. Subscriptions
+    are reference counted: the backend sees one subscribe per URI and an
+    unsubscribe once the last session leaves. Each notification is encoded
+    once and the bytes are shared by all target queues.
+    """
+
+    def __init__(self, sessions: Dict[str, Any], upstream: Upstream):
+        self.sessions = sessions
+        self.upstream = upstream
+        # upstream progress token -> (session id, client token)
+        self.progress: Dict[str, Tuple[str, Any]] = {}
+        self.subscribers: Dict[str, Set[str]] = {}
+        # Only URIs being subscribed or unsubscribed right now have a lock
+        self._locks: Dict[str, _UriLock] = {}
+        self._tokens = itertools.count(1)
+        self._unsubscribe_tasks: Set[asyncio.Task] = set()
+        self.routed = 0
+        self.unrouted = 0
+
+    def track_progress(self, session_id: str, params: dict) -> Tuple[Optional[str], dict]:
+        """Swap the client's progress token for a proxy one, returns it with the params to send"""
+        meta = params.get("_meta")
+        token = meta.get("progressToken") if isinstance(meta, dict) else None
+        if token is None:
+            return None, params
+        upstream_token = f"mcpproxy-{next(self._tokens)}"
+        self.progress[upstream_token] = (session_id, token)
+        return upstream_token, {**params, "_meta": {**meta, "progressToken": upstream_token}}
+
+    def untrack_progress(self, upstream_token: Optional[str]):
+        if upstream_token is not None:
+            self.progress.pop(upstream_token, None)
+
+    async def route(self, message):
+        """Deliver a message from a shared backend"""
+        if not isinstance(message, types.ServerNotification):
+            if isinstance(message, Exception):
+                logger.warning(f"Shared backend reported an error: {message}")
+            return
+        root = message.root
+        if isinstance(root, types.ProgressNotification):
+            owner = self.progress.get(str(root.params.progressToken))
+            if owner is None:
+                self.unrouted += 1
+                return
+            session_id, token = owner
+            content = root.model_dump()
+            content["params"]["progressToken"] = token
+            await self._deliver((session_id,), wrap_notification(root, content))
+        elif isinstance(root, types.ResourceUpdatedNotification):
+            await self._deliver(self.subscribers.get(str(root.params.uri), ()), wrap_notification(root))
+        elif isinstance(root, BROADCAST):
+            await self._deliver(list(self.sessions), wrap_notification(root))
+        else:
+            self.unrouted += 1
+
+    async def _deliver(self, session_ids: Iterable[str], notification: dict):
+        data = None
+        for session_id in list(session_ids):
+            session = self.sessions.get(session_id)
+            if session is None:
+                continue
+            if data is None:
+                data = dumps(notification)
+            # Notifications count as activity for the idle reaper, as they do for dedicated backends
+            session.last_activity = time.monotonic()
+            await session.send_message(notification, data)
+            self.routed += 1
+        if data is None:
+            self.unrouted += 1
+
+    @asynccontextmanager
+    async def _lock(self, uri: str):
+        """Serialize subscription changes of uri, forgetting the lock once nobody uses it"""
+        entry = self._locks.get(uri)
+        if entry is None:
+            entry = self._locks[uri] = _UriLock()
+        entry.users += 1
+        try:
+            async with entry.lock:
+                yield
+        finally:
+            entry.users -= 1
+            if not entry.users:
+                del self._locks[uri]
+
+    async def subscribe(self, session_id: str, uri: str):
+        """Subscribe a session to uri, subscribing upstream only for the first one"""
+        async with self._lock(uri):
+            subscribers = self.subscribers.get(uri)
+            if not subscribers:
+                await self.upstream("resources/subscribe", uri)
+                subscribers = self.subscribers[uri] = set()
+            subscribers.add(session_id)
+
+    async def unsubscribe(self, session_id: str, uri: str):
+        """Unsubscribe a session from uri, unsubscribing upstream when it was the last one"""
+        async with self._lock(uri):
+            subscribers = self.subscribers.get(uri)
+            if subscribers is None or session_id not in subscribers:
+                return
+            subscribers.discard(session_id)
+            if not subscribers:
+                del self.subscribers[uri]
+                await self.upstream("resources/unsubscribe", uri)
+
+    def drop_session(self, session_id: str):
+        """Forget a closed session, unsubscribing upstream where it was the last subscriber"""
+        for token, (owner, _) in list(self.progress.items()):
+            if owner == session_id:
+                del self.progress[token]
+        for uri in [uri for uri, subscribers in self.subscribers.items() if session_id in subscribers]:
+            task = asyncio.create_task(self._unsubscribe_quietly(session_id, uri))
+            self._unsubscribe_tasks.add(task)
+            task.add_done_callback(self._unsubscribe_tasks.discard)
+
+    async def _unsubscribe_quietly(self, session_id: str, uri: str):
+        try:
+            await self.unsubscribe(session_id, uri)
+        except Exception as e:
+            logger.warning(f"Failed to unsubscribe {uri} upstream: {e}")
+
+    async def resubscribe(self, include: Callable[[str], bool]):
+        """Subscribe again to the URIs a replaced backend process was subscribed to"""
+        for uri in [uri for uri in self.subscribers if include(uri)]:
+            try:
+                await self.upstream("resources/subscribe", uri)
+            except Exception as e:
+                logger.warning(f"Failed to resubscribe {uri}: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "subscriptions": len(self.subscribers),
+            "subscribers": sum(len(s) for s in self.subscribers.values()),
+            "progress_tokens": len(self.progress),
+            "routed": self.routed,
+            "unrouted": self.unrouted,
+        }
@@ -7,6 +7,8 @@ METHOD_NOT_FOUND = -32601
 INVALID_PARAMS = -32602
 INTERNAL_ERROR = -32603
 SERVER_ERROR_START = -32000
+TIMEOUT_ERROR = -32001
+LIMIT_EXCEEDED = -32002
 SERVER_ERROR_END = -32099
 
 
@@ -0,0 +1,85 @@
+import time
+import asyncio
+import logging
+from typing import Dict, List, Optional, Set
+
+from metrics import SSE_KEEPALIVES
+
+logger = logging.getLogger(__name__)
+
+# SSE comment frame, ignored by clients but keeps proxies and load balancers from timing out
+KEEPALIVE_FRAME = b": keepalive\n\n"
+
+
+class KeepAliveScheduler:
+    """One task sending keep-alive frames to all idle SSE streams
+
+    Streams are spread over buckets and each tick checks a single bucket,
+    so every stream is looked at once per interval and the frames are
+    spread out instead of all firing together. A stream only gets a frame
+    when nothing was written to it for about one interval.
+    """
+
+    def __init__(self, interval: float = 30.0, buckets: int = 10):
+        self.interval = interval
+        self.buckets: List[Set] = [set() for _ in range(max(buckets, 1))]
+        self.index: Dict[object, int] = {}
+        self.sent = 0
+        self._next = 0
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def tick(self) -> float:
+        return self.interval / len(self.buckets)
+
+    def register(self, queue):
+        """Start sending keep-alives to the stream reading queue"""
+        if queue in self.index:
+            return
+        bucket = self._next % len(self.buckets)
+        self._next += 1
+        self.buckets[bucket].add(queue)
+        self.index[queue] = bucket
+
+    def unregister(self, queue):
+        bucket = self.index.pop(queue, None)
+        if bucket is not None:
+            self.buckets[bucket].discard(queue)
+
+    async def start(self):
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        bucket = 0
+        while True:
+            await asyncio.sleep(self.tick)
+            try:
+                self.check(self.buckets[bucket])
+            except Exception as e:
+                logger.error(f"Keep-alive check failed: {e}")
+            bucket = (bucket + 1) % len(self.buckets)
+
+    def check(self, queues: Set):
+        """Ask the idle streams among queues to write a keep-alive frame"""
+        idle_since = time.monotonic() - (self.interval - self.tick)
+        for queue in queues:
+            if queue.last_sent <= idle_since and queue.request_keepalive():
+                self.sent += 1
+                SSE_KEEPALIVES.inc()
+
+    def stats(self) -> dict:
+        return {
+            "interval": self.interval,
+            "streams": len(self.index),
+            "sent": self.sent,
+        }
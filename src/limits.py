@@ -0,0 +1,251 @@
+import math
+import time
+import asyncio
+import weakref
+from collections import deque
+from typing import Callable, Deque, Dict, Optional, Tuple
+
+from metrics import REQUESTS_REJECTED
+
+
+class LimitExceeded(Exception):
+    """Raised when a request or session is over one of the admission limits"""
+
+    def __init__(self, scope: str, retry_after: float):
+        self.scope = scope
+        self.retry_after = max(retry_after, 0.0)
+        super().__init__(f"Too many requests ({scope} limit), retry after {self.retry_after:.1f}s")
+
+    @property
+    def data(self) -> dict:
+        """Error data for the JSON-RPC rejection"""
+        return {"scope": self.scope, "retryAfter": round(self.retry_after, 3)}
+
+    @property
+    def retry_after_header(self) -> str:
+        return str(max(1, math.ceil(self.retry_after)))
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+
+    def take(self, max_wait: float = 0.0) -> Tuple[bool, float]:
+        """Take a token, returns (admitted, delay) where delay is the wait before
+        proceeding when admitted, or the retry hint when not"""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True, 0.0
+        wait = (1 - self.tokens) / self.rate
+        if wait <= max_wait:
+            # Reserve the token so later callers queue behind this one
+            self.tokens -= 1
+            return True, wait
+        return False, wait
+
+    def full(self) -> bool:
+        """Whether the bucket has refilled completely, so forgetting it changes nothing"""
+        return self.tokens + (time.monotonic() - self.updated) * self.rate >= self.burst
+
+
+class ConcurrencyLimit:
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.active = 0
+        self.waiters: Deque[asyncio.Future] = deque()
+
+    async def acquire(self, scope: str, timeout: float = 0.0):
+        if self.active < self.limit and not self.waiters:
+            self.active += 1
+            return
+        if timeout <= 0:
+            raise LimitExceeded(scope, 1.0)
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, timeout)
+        except asyncio.TimeoutError:
+            raise LimitExceeded(scope, 1.0) from None
+        except asyncio.CancelledError:
+            # The slot was handed over just as we gave up
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+        finally:
+            if waiter in self.waiters:
+                self.waiters.remove(waiter)
+
+    def release(self):
+        """Hand the slot to the oldest waiter, or free it"""
+        while self.waiters:
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+
+class _KeyState:
+    def __init__(self):
+        self.sessions = 0
+        self.bucket: Optional[TokenBucket] = None
+        self.concurrency: Optional[ConcurrencyLimit] = None
+
+
+class _SessionState:
+    def __init__(self):
+        self.bucket: Optional[TokenBucket] = None
+        self.concurrency: Optional[ConcurrencyLimit] = None
+
+
+class AdmissionControl:
+    """Rate limits and concurrency caps per client key, per session and per backend
+
+    Requests over a rate limit wait for a token if it becomes available
+    within queue_timeout and are rejected otherwise; the same goes for
+    concurrency slots. Rejections carry a retry hint in seconds.
+    """
+
+    def __init__(
+        self,
+        key_rate: float = 0.0,
+        session_rate: float = 0.0,
+        burst: int = 0,
+        key_concurrency: int = 0,
+        session_concurrency: int = 0,
+        backend_concurrency: int = 0,
+        key_sessions: int = 0,
+        queue_timeout: float = 0.0
+    ):
+        self.key_rate = key_rate
+        self.session_rate = session_rate
+        self.burst = burst
+        self.key_concurrency = key_concurrency
+        self.session_concurrency = session_concurrency
+        self.backend_concurrency = backend_concurrency
+        self.key_sessions = key_sessions
+        self.queue_timeout = queue_timeout
+        self.keys: Dict[str, _KeyState] = {}
+        # Keys without sessions, kept until their rate bucket has refilled
+        self.idle_keys: Dict[str, None] = {}
+        self.sessions: Dict[str, _SessionState] = {}
+        self.backends: "weakref.WeakKeyDictionary[object, ConcurrencyLimit]" = weakref.WeakKeyDictionary()
+        self.admitted = 0
+        self.queued = 0
+        self.rejected: Dict[str, int] = {}
+
+    def _bucket(self, rate: float) -> Optional[TokenBucket]:
+        return TokenBucket(rate, self.burst or math.ceil(rate)) if rate > 0 else None
+
+    def _reject(self, scope: str, retry_after: float) -> LimitExceeded:
+        self.rejected[scope] = self.rejected.get(scope, 0) + 1
+        REQUESTS_REJECTED.inc(scope)
+        return LimitExceeded(scope, retry_after)
+
+    def open_session(self, key: str, session_id: str):
+        """Account a new session of key, raises LimitExceeded over the per-key session cap"""
+        self._prune()
+        state = self.keys.get(key)
+        if state is None:
+            state = self.keys[key] = _KeyState()
+            state.bucket = self._bucket(self.key_rate)
+            if self.key_concurrency:
+                state.concurrency = ConcurrencyLimit(self.key_concurrency)
+        if self.key_sessions and state.sessions >= self.key_sessions:
+            raise self._reject("key_sessions", 5.0)
+        state.sessions += 1
+        self.idle_keys.pop(key, None)
+        session = self.sessions[session_id] = _SessionState()
+        session.bucket = self._bucket(self.session_rate)
+        if self.session_concurrency:
+            session.concurrency = ConcurrencyLimit(self.session_concurrency)
+
+    def close_session(self, key: str, session_id: str):
+        if self.sessions.pop(session_id, None) is None:
+            return
+        state = self.keys.get(key)
+        if state is not None:
+            state.sessions -= 1
+            if state.sessions <= 0:
+                # Reconnecting must not reset the key's rate limit, so its state outlives the session
+                self.idle_keys[key] = None
+        self._prune()
+
+    def _prune(self):
+        """Forget keys without sessions once their rate bucket refilled and no request is running"""
+        for key in list(self.idle_keys):
+            state = self.keys.get(key)
+            if state is not None:
+                if state.sessions > 0:
+                    del self.idle_keys[key]
+                    continue
+                if state.concurrency is not None and state.concurrency.active:
+                    continue
+                if state.bucket is not None and not state.bucket.full():
+                    continue
+                del self.keys[key]
+            del self.idle_keys[key]
+
+    async def _take(self, bucket: Optional[TokenBucket], scope: str):
+        if bucket is None:
+            return
+        admitted, delay = bucket.take(self.queue_timeout)
+        if not admitted:
+            raise self._reject(scope, delay)
+        if delay > 0:
+            self.queued += 1
+            await asyncio.sleep(delay)
+
+    async def _acquire(self, limit: Optional[ConcurrencyLimit], scope: str):
+        if limit is None:
+            return
+        try:
+            await limit.acquire(scope, self.queue_timeout)
+        except LimitExceeded as e:
+            raise self._reject(scope, e.retry_after) from None
+
+    async def admit(self, key: str, session_id: str) -> Callable[[], None]:
+        """Admit a request of a session, returns the function releasing its slots"""
+        state = self.keys.get(key) or _KeyState()
+        session = self.sessions.get(session_id) or _SessionState()
+        await self._take(state.bucket, "key_rate")
+        await self._take(session.bucket, "session_rate")
+        await self._acquire(state.concurrency, "key_concurrency")
+        try:
+            await self._acquire(session.concurrency, "session_concurrency")
+        except BaseException:
+            if state.concurrency is not None:
+                state.concurrency.release()
+            raise
+        self.admitted += 1
+
+        def release():
+            if session.concurrency is not None:
+                session.concurrency.release()
+            if state.concurrency is not None:
+                state.concurrency.release()
+        return release
+
+    async def acquire_backend(self, backend) -> Optional[ConcurrencyLimit]:
+        """Take a slot of the global per-backend concurrency cap"""
+        if not self.backend_concurrency:
+            return None
+        limit = self.backends.get(backend)
+        if limit is None:
+            limit = self.backends[backend] = ConcurrencyLimit(self.backend_concurrency)
+        await self._acquire(limit, "backend_concurrency")
+        return limit
+
+    def stats(self) -> dict:
+        return {
+            "keys": len(self.keys),
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "rejected": dict(self.rejected),
+        }
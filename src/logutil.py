@@ -0,0 +1,99 @@
+import re
+import logging
+import reprlib
+from typing import Any, Mapping, Optional
+
+# Per-request access log, one line per JSON-RPC request
+access_logger = logging.getLogger("mcpproxy.access")
+
+# Header, query parameter and environment variable names whose values are never logged
+SENSITIVE = re.compile(r"auth|token|key|secret|passw|credential|cookie", re.IGNORECASE)
+REDACTED = "***"
+_QUERY_SECRET = re.compile(r"((?:^|[?&])[^=&]*(?:auth|token|key|secret|passw)[^=&]*=)[^&]*", re.IGNORECASE)
+
+_settings = {"payload_limit": 256, "sample_every": 1}
+
+
+def configure(payload_limit: int = 256, sample_rate: float = 1.0):
+    """Set how much of a payload is logged and which share of high-volume events"""
+    _settings["payload_limit"] = max(payload_limit, 0)
+    _settings["sample_every"] = max(1, round(1 / sample_rate)) if sample_rate > 0 else 0
+
+
+def redact(values: Mapping[str, Any]) -> dict:
+    """Copy of values with sensitive entries masked"""
+    return {k: REDACTED if SENSITIVE.search(str(k)) else v for k, v in values.items()}
+
+
+def redact_query(path: str) -> str:
+    """Mask the values of secret-looking query parameters in a URL path"""
+    return _QUERY_SECRET.sub(lambda m: m.group(1) + REDACTED, path)
+
+
+class Payload:
+    """Message formatted only when its log record is emitted, cut to the payload limit
+
+    With a limit of 0 only the size of encoded messages is logged.
+    """
+
+    __slots__ = ("message",)
+
+    def __init__(self, message: Any):
+        self.message = message
+
+    def __str__(self) -> str:
+        limit = _settings["payload_limit"]
+        message = self.message
+        if isinstance(message, (bytes, str)):
+            size = len(message)
+            if limit == 0:
+                return f"<{size} bytes>"
+            if isinstance(message, bytes):
+                message = message[:limit].decode(errors="replace")
+            if size <= limit:
+                return message
+            return f"{message[:limit]}... <{size} bytes>"
+        if limit == 0:
+            return f"<{type(message).__name__}>"
+        # reprlib bounds the work on large nested messages, unlike repr()
+        text = _repr.repr(message)
+        return text if len(text) <= limit else text[:limit] + "..."
+
+
+_repr = reprlib.Repr()
+_repr.maxlevel = 4
+_repr.maxdict = _repr.maxlist = 16
+_repr.maxstring = _repr.maxother = 128
+
+
+class Sampler:
+    """Lets through one in every N events of a high-volume log line"""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self) -> bool:
+        every = _settings["sample_every"]
+        if not every:
+            return False
+        self.count += 1
+        return (self.count - 1) % every == 0
+
+
+def log_access(method: str, session_id: str, id: Any, status: str, duration: float, size: Optional[int] = None):
+    """Structured access log line for a finished request"""
+    if access_logger.isEnabledFor(logging.INFO):
+        access_logger.info(
+            "method=%s session=%s id=%s status=%s duration_ms=%.1f bytes=%s",
+            method, session_id, id, status, duration * 1000, "-" if size is None else size
+        )
+
+
+class RedactQueryFilter(logging.Filter):
+    """Masks secrets in the request path of uvicorn access log records"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        args = record.args
+        if isinstance(args, tuple) and len(args) >= 3 and isinstance(args[2], str):
+            record.args = args[:2] + (redact_query(args[2]),) + args[3:]
+        return True
@@ -1,41 +1,73 @@
 import logging
 import asyncio
-import uuid
-import json
-import time
 import os
+import signal
+import tempfile
+from typing import Optional
 
 from starlette.applications import Starlette
 from starlette.routing import Route
-from starlette.responses import StreamingResponse, JSONResponse
+from starlette.responses import StreamingResponse, JSONResponse, PlainTextResponse
 import uvicorn
-from mcp import ClientSession, stdio_client, types
-from mcp import StdioServerParameters
 
 from jsonrpc import (
-    PARSE_ERROR, INVALID_REQUEST, METHOD_NOT_FOUND, INVALID_PARAMS, 
-    INTERNAL_ERROR, SERVER_ERROR_START, create_error_response, 
-    create_success_response, create_notification, validate_request
+    INVALID_REQUEST, INTERNAL_ERROR, SERVER_ERROR_START, LIMIT_EXCEEDED, create_error_response
 )
-from config import get_server_params, AUTH_KEY
-from proxy import MCPProxy, serialize_result
+from config import (
+    get_server_params, AUTH_KEY, ASYNC_DISPATCH, MAX_INFLIGHT_PER_SESSION,
+    WARM_POOL_SIZE, WARM_POOL_MAX_SIZE, WARM_POOL_SPAWN_CONCURRENCY, WARM_POOL_IDLE_TIMEOUT,
+    BACKEND_REUSE, BACKEND_LINGER, SHARED_REPLICAS,
+    RESPONSE_CACHE_MAX_ENTRIES, get_cache_ttls,
+    COALESCE_METHODS, IDEMPOTENT_TOOLS, parse_list,
+    TOOL_CACHE_TOOLS, TOOL_CACHE_TTL, TOOL_CACHE_MAX_BYTES, TOOL_CACHE_SHARED,
+    OUTBOUND_QUEUE_MAX_MESSAGES, OUTBOUND_QUEUE_MAX_BYTES, OUTBOUND_QUEUE_POLICY,
+    SSE_RESUME_GRACE, SSE_REPLAY_BUFFER,
+    SESSION_IDLE_TIMEOUT, SESSION_MAX_LIFETIME, BACKEND_MAX_REQUESTS, BACKEND_MAX_RSS_MB, REAPER_INTERVAL,
+    WORKERS, WORKER_SOCKET_DIR, REQUEST_TIMEOUT, METHOD_TIMEOUTS, TOOL_TIMEOUTS, parse_timeouts,
+    FORWARD_CANCELLATION, RATE_LIMIT_PER_KEY, RATE_LIMIT_PER_SESSION, RATE_LIMIT_BURST,
+    MAX_CONCURRENT_PER_KEY, MAX_CONCURRENT_PER_SESSION, MAX_CONCURRENT_PER_BACKEND,
+    MAX_SESSIONS_PER_KEY, ADMISSION_QUEUE_TIMEOUT, LANE_CONCURRENCY, parse_counts,
+    LOG_LEVEL, LOG_PAYLOAD_LIMIT, LOG_SAMPLE_RATE, ACCESS_LOG, SSE_KEEPALIVE_INTERVAL,
+    HEALTH_CHECK_INTERVAL, HEALTH_CHECK_TIMEOUT, HEALTH_CHECK_FAILURES, HOT_STANDBY,
+    RESTART_BACKOFF_INITIAL, RESTART_BACKOFF_MAX,
+    RELOAD_DRAIN_TIMEOUT, DRAIN_IDLE_TIMEOUT, SHUTDOWN_DRAIN_TIMEOUT,
+    MCP_SERVERS_CONFIG, load_server_catalog
+)
+from proxy import MCPProxy
+from cache import ResponseCache, ToolResultCache
+from coalesce import SingleFlight
+from limits import AdmissionControl, LimitExceeded
+from scheduler import LaneScheduler
+from keepalive import KEEPALIVE_FRAME
+from outbound import KEEPALIVE
+from logutil import Payload, RedactQueryFilter, Sampler, access_logger, configure as configure_logging, redact
+from servers import ServerCatalog, UnknownServer
+from metrics import REGISTRY, SSE_BYTES, SSE_SESSIONS, SSE_RESUMES, QUEUE_DEPTH
 
 # Configure logging with more details
 logging.basicConfig(
-    level=logging.INFO,
+    level=getattr(logging, LOG_LEVEL, logging.INFO),
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
+configure_logging(LOG_PAYLOAD_LIMIT, LOG_SAMPLE_RATE)
+access_logger.disabled = not ACCESS_LOG
+# uvicorn logs the full request path, which carries auth_key
+logging.getLogger("uvicorn.access").addFilter(RedactQueryFilter())
+send_sampler = Sampler()
 
 # Log environment information at startup
-logger.info("Starting server with environment:")
-for key, value in os.environ.items():
-    logger.info(f"ENV: {key}={value}")
+if logger.isEnabledFor(logging.DEBUG):
+    logger.debug("Starting server with environment: %s", redact(os.environ))
 
-# Get configurations
+# Get configurations, the default server is optional when MCP_SERVERS_CONFIG lists servers
 try:
-    params = get_server_params()
-    logger.info(f"Server parameters initialized: {params}")
+    if os.getenv('MCP_SERVER_CONFIG') or os.getenv('MCP_SERVER_CONFIG_FILE') or not MCP_SERVERS_CONFIG:
+        params = get_server_params()
+        logger.info(f"Server parameters initialized: {params.command} {params.args}")
+    else:
+        params = None
+        logger.info("No default MCP server configured, serving MCP_SERVERS_CONFIG only")
 except Exception as e:
     logger.error(f"Failed to get server parameters: {e}")
     raise
@@ -43,45 +75,125 @@ except Exception as e:
 # 控制是否使用共享会话的环境变量
 SHARED_SESSION = os.environ.get('SHARED_SESSION', 'true').lower() == 'true'
 logger.info(f"Shared session mode: {SHARED_SESSION}")
+logger.info(f"Async dispatch mode: {ASYNC_DISPATCH}")
+
+# 响应缓存
+cache_ttls = get_cache_ttls()
+logger.info(f"Response cache TTLs: {cache_ttls}")
+
+# 相同并发请求合并
+coalesce_methods = set(parse_list(COALESCE_METHODS))
+logger.info(f"Coalesced methods: {sorted(coalesce_methods)}")
+
+# 工具调用结果缓存
+cached_tools = set(parse_list(TOOL_CACHE_TOOLS))
+logger.info(f"Cached tools: {sorted(cached_tools)}")
+
+# 准入控制：速率与并发限制
+admission_enabled = any((
+    RATE_LIMIT_PER_KEY, RATE_LIMIT_PER_SESSION, MAX_CONCURRENT_PER_KEY,
+    MAX_CONCURRENT_PER_SESSION, MAX_CONCURRENT_PER_BACKEND, MAX_SESSIONS_PER_KEY
+))
+
+# 按通道调度后端请求
+lane_limits = parse_counts(LANE_CONCURRENCY)
+logger.info(f"Scheduler lane limits: {lane_limits}")
+
+def build_proxy(shared_session: bool, worker_socket_dir: str = "") -> MCPProxy:
+    """Create a proxy configured from the environment
+
+    Caches, coalescing, limits and lanes are per proxy, so one catalog
+    server cannot use up the capacity of the others.
+    """
+    return MCPProxy(
+        shared_session=shared_session,
+        async_dispatch=ASYNC_DISPATCH,
+        max_inflight=MAX_INFLIGHT_PER_SESSION,
+        pool_size=WARM_POOL_SIZE,
+        pool_max_size=WARM_POOL_MAX_SIZE,
+        pool_spawn_concurrency=WARM_POOL_SPAWN_CONCURRENCY,
+        pool_idle_timeout=WARM_POOL_IDLE_TIMEOUT,
+        backend_reuse=BACKEND_REUSE,
+        backend_linger=BACKEND_LINGER,
+        replicas=SHARED_REPLICAS,
+        cache=ResponseCache(cache_ttls, RESPONSE_CACHE_MAX_ENTRIES) if cache_ttls else None,
+        coalescer=SingleFlight(coalesce_methods, set(parse_list(IDEMPOTENT_TOOLS))) if coalesce_methods else None,
+        tool_cache=ToolResultCache(
+            cached_tools,
+            ttl=TOOL_CACHE_TTL,
+            max_bytes=TOOL_CACHE_MAX_BYTES,
+            shared=TOOL_CACHE_SHARED
+        ) if cached_tools else None,
+        queue_max_messages=OUTBOUND_QUEUE_MAX_MESSAGES,
+        queue_max_bytes=OUTBOUND_QUEUE_MAX_BYTES,
+        queue_policy=OUTBOUND_QUEUE_POLICY,
+        resume_grace=SSE_RESUME_GRACE,
+        replay_size=SSE_REPLAY_BUFFER,
+        session_idle_timeout=SESSION_IDLE_TIMEOUT,
+        session_max_lifetime=SESSION_MAX_LIFETIME,
+        backend_max_requests=BACKEND_MAX_REQUESTS,
+        backend_max_rss=int(BACKEND_MAX_RSS_MB * 1024 * 1024),
+        reaper_interval=REAPER_INTERVAL,
+        worker_socket_dir=worker_socket_dir,
+        request_timeout=REQUEST_TIMEOUT,
+        method_timeouts=parse_timeouts(METHOD_TIMEOUTS),
+        tool_timeouts=parse_timeouts(TOOL_TIMEOUTS),
+        forward_cancellation=FORWARD_CANCELLATION,
+        admission=AdmissionControl(
+            key_rate=RATE_LIMIT_PER_KEY,
+            session_rate=RATE_LIMIT_PER_SESSION,
+            burst=RATE_LIMIT_BURST,
+            key_concurrency=MAX_CONCURRENT_PER_KEY,
+            session_concurrency=MAX_CONCURRENT_PER_SESSION,
+            backend_concurrency=MAX_CONCURRENT_PER_BACKEND,
+            key_sessions=MAX_SESSIONS_PER_KEY,
+            queue_timeout=ADMISSION_QUEUE_TIMEOUT
+        ) if admission_enabled else None,
+        scheduler=LaneScheduler(lane_limits) if lane_limits else None,
+        keepalive_interval=SSE_KEEPALIVE_INTERVAL,
+        health_check_interval=HEALTH_CHECK_INTERVAL,
+        health_check_timeout=HEALTH_CHECK_TIMEOUT,
+        health_check_failures=HEALTH_CHECK_FAILURES,
+        hot_standby=HOT_STANDBY,
+        restart_backoff_initial=RESTART_BACKOFF_INITIAL,
+        restart_backoff_max=RESTART_BACKOFF_MAX,
+        reload_drain_timeout=RELOAD_DRAIN_TIMEOUT,
+        drain_idle_timeout=DRAIN_IDLE_TIMEOUT
+    )
+
+
+def merge_queue_depths(proxies) -> dict:
+    """Outbound queue depth over several proxies"""
+    depths = [server_proxy.queue_depth() for server_proxy in proxies]
+    return {
+        ("total",): sum(d[("total",)] for d in depths),
+        ("max",): max((d[("max",)] for d in depths), default=0),
+    }
 
-# Global variables
-global_client_session = None
-global_stdio_client = None
-global_streams = None
-active_sessions = {}  # Store active SSE sessions
 
 # Initialize proxy
-proxy = MCPProxy(shared_session=SHARED_SESSION)
+proxy = build_proxy(SHARED_SESSION, WORKER_SOCKET_DIR)
 
-async def initialize_global_session():
-    """初始化全局MCP客户端会话"""
-    global global_client_session, global_stdio_client, global_streams
-    try:
-        logger.info("Initializing global MCP session...")
-        global_stdio_client = stdio_client(params)
-        logger.info("Created stdio client")
-        global_streams = await global_stdio_client.__aenter__()
-        logger.info("Entered stdio client context")
-        global_client_session = await ClientSession(global_streams[0], global_streams[1]).__aenter__()
-        logger.info("Global MCP session initialized successfully")
-    except Exception as e:
-        logger.error(f"Failed to initialize global MCP session: {e}", exc_info=True)
-        raise
+# 多服务器目录：配置文件中的服务器在首次使用时启动，空闲后停止
+catalog = ServerCatalog(
+    load_server_catalog(MCP_SERVERS_CONFIG),
+    lambda config: build_proxy(config.shared_session),
+    check_interval=REAPER_INTERVAL
+) if MCP_SERVERS_CONFIG else None
 
-async def cleanup_global_session():
-    """清理全局MCP客户端会话"""
-    global global_client_session, global_stdio_client, global_streams
-    try:
-        if global_client_session:
-            await global_client_session.__aexit__(None, None, None)
-        if global_stdio_client:
-            await global_stdio_client.__aexit__(None, None, None)
-        global_client_session = None
-        global_stdio_client = None
-        global_streams = None
-        logger.info("Global MCP session cleaned up successfully")
-    except Exception as e:
-        logger.error(f"Error during global session cleanup: {e}")
+# Outbound queue depth of every proxy in this process
+QUEUE_DEPTH.callback = lambda: merge_queue_depths([proxy] + (catalog.running() if catalog else []))
+
+
+async def resolve_proxy(name: Optional[str]) -> MCPProxy:
+    """Proxy serving /sse or /sse/{name}, starting a configured server on first use"""
+    if name is None:
+        if proxy.params is None:
+            raise UnknownServer(name)
+        return proxy
+    if catalog is None:
+        raise UnknownServer(name)
+    return await catalog.get(name)
 
 def validate_server_key(request) -> tuple[bool, JSONResponse | None]:
     """验证服务器密钥
@@ -111,219 +223,72 @@ def validate_server_key(request) -> tuple[bool, JSONResponse | None]:
             )
     return True, None
 
-def get_session_params(request):
-    """从请求参数中获取配置，并覆盖环境变量配置
-    
-    基于 get_server_params() 返回的 StdioServerParameters 对象，
-    使用请求参数覆盖其中的环境变量值
-    """
-    base_params = get_server_params()
-    
-    # 获取所有查询参数
-    query_params = dict(request.query_params)
-    
-    # 移除特殊参数
-    query_params.pop('auth_key', None)
-    
-    # 更新环境变量
-    new_env = dict(base_params.env)
-    new_env.update(query_params)
-    
-    # 返回新的 StdioServerParameters，保持 command 和 args 不变
-    return StdioServerParameters(
-        command=base_params.command,
-        args=base_params.args,
-        env=new_env
-    )
-
-class SSESession:
-    def __init__(self, session_id, params):
-        self.session_id = session_id
-        self.message_queue = asyncio.Queue()
-        self.closed = False
-        self.client_session = None
-        self.streams = None
-        self.stdio_client = None
-        self._init_task = None
-        self._cleanup_lock = asyncio.Lock()
-        self.is_initialized = False
-        self.params = params
-
-    async def send_message(self, message):
-        if not self.closed:
-            logger.info(f"Queuing message for SSE client: {message}")
-            await self.message_queue.put(message)
-
-    async def handle_server_message(self, message):
-        """Handle messages from the server"""
-        try:
-            logger.info(f"Received server message: {message}")
-            if isinstance(message, types.ServerNotification):
-                # Handle server notifications
-                notification = {
-                    "jsonrpc": "2.0",
-                    "method": "notifications/message",
-                    "params": {
-                        "level": "info",
-                        "data": {
-                            "type": message.root.__class__.__name__,
-                            "content": serialize_result(message.root)
-                        }
-                    }
-                }
-                logger.info(f"Processing server notification: {notification}")
-                await self.send_message(notification)
-
-            elif isinstance(message, Exception):
-                # Handle errors
-                error = {
-                    "jsonrpc": "2.0",
-                    "method": "notifications/message",
-                    "params": {
-                        "level": "error",
-                        "data": {
-                            "type": "error",
-                            "message": str(message)
-                        }
-                    }
-                }
-                logger.info(f"Processing server error: {error}")
-                await self.send_message(error)
-
-        except Exception as e:
-            logger.error(f"Error handling server message: {e}")
-            # 发送错误通知
-            error = {
-                "jsonrpc": "2.0",
-                "method": "notifications/message",
-                "params": {
-                    "level": "error",
-                    "data": {
-                        "type": "error",
-                        "message": f"Error handling server message: {str(e)}"
-                    }
-                }
-            }
-            await self.send_message(error)
-
-    async def initialize_client(self):
-        """初始化客户端连接"""
-        if self.is_initialized:
-            return
-            
-        self._init_task = asyncio.current_task()
-        
-        if not SHARED_SESSION:
-            try:
-                logger.info(f"Initializing dedicated session for {self.session_id}")
-                self.stdio_client = stdio_client(self.params)
-                self.streams = await self.stdio_client.__aenter__()
-                self.client_session = await ClientSession(
-                    self.streams[0], 
-                    self.streams[1],
-                    message_handler=self.handle_server_message
-                ).__aenter__()
-                self.is_initialized = True
-                logger.info(f"Dedicated session initialized for {self.session_id}")
-            except Exception as e:
-                logger.error(f"Failed to initialize dedicated session: {e}")
-                raise
-        else:
-            self.is_initialized = True
-
-    async def close(self):
-        """关闭会话"""
-        if self.closed:
-            return
-            
-        self.closed = True
-
-        if not SHARED_SESSION:
-            # 确保只在初始化的 task 中执行清理
-            if self._init_task and self._init_task != asyncio.current_task():
-                loop = asyncio.get_event_loop()
-                done = loop.create_future()
-                
-                def _schedule_cleanup():
-                    if not done.done():
-                        done.set_result(None)
-                
-                # 在初始化 task 中调度清理
-                self._init_task.get_loop().call_soon_threadsafe(_schedule_cleanup)
-                await done
-                
-                # 等待初始化 task 完成清理
-                while self.client_session is not None or self.stdio_client is not None:
-                    await asyncio.sleep(0.1)
-            else:
-                # 在初始化 task 中，直接执行清理
-                try:
-                    if self.client_session:
-                        await self.client_session.__aexit__(None, None, None)
-                        self.client_session = None
-                    
-                    if self.stdio_client:
-                        await self.stdio_client.__aexit__(None, None, None)
-                        self.stdio_client = None
-                    
-                    self.streams = None
-                except Exception as e:
-                    logger.error(f"Error during cleanup: {e}")
-
-
-async def sse_stream(session):
-    """SSE stream handler"""
+async def sse_stream(proxy, session, resume_from=None, messages_path="/messages"):
+    """SSE stream handler, replaying buffered events after resume_from when resuming"""
+    # Take over the outbound queue from a previous stream of this session
+    consumer = session.message_queue.attach()
+    SSE_SESSIONS.inc()
     try:
         # Send initial message with message endpoint URL
-        messages_url = f"/messages?session_id={session.session_id}"
+        messages_url = f"{messages_path}?session_id={session.session_id}"
         logger.info(f"Starting SSE stream for session {session.session_id}")
-        yield f"event: endpoint\ndata: {messages_url}\n\n"
+        chunk = f"event: endpoint\nid: {session.session_id}:{resume_from or 0}\ndata: {messages_url}\n\n".encode()
+        SSE_BYTES.inc(amount=len(chunk))
+        yield chunk
+
+        if resume_from is not None:
+            events, lost = session.replay.since(resume_from)
+            if lost:
+                logger.warning(f"Replay buffer of session {session.session_id} no longer holds all events after {resume_from}")
+            for event_id, message in events:
+                chunk = sse_frame(session.session_id, event_id, message)
+                SSE_BYTES.inc(amount=len(chunk))
+                yield chunk
+
+        # Idle streams get keep-alive comments from the shared scheduler
+        if proxy.keepalive is not None:
+            proxy.keepalive.register(session.message_queue)
 
-        # Send a comment every 30 seconds to keep the connection alive
-        keep_alive_task = asyncio.create_task(send_keep_alive(session))
-        
         try:
             while not session.closed:
-                message = await session.message_queue.get()
+                message = await session.message_queue.get(consumer)
                 if message is None:
                     break
-                if isinstance(message, dict):
-                    message = json.dumps(message)
-                logger.debug(f"Sending message to client {session.session_id}: {message}")
-                yield f"data: {message}\n\n"
+                if message is KEEPALIVE:
+                    SSE_BYTES.inc(amount=len(KEEPALIVE_FRAME))
+                    yield KEEPALIVE_FRAME
+                    continue
+                event_id = session.replay.append(message)
+                if logger.isEnabledFor(logging.DEBUG) and send_sampler():
+                    logger.debug("Sending message to client %s: %s", session.session_id, Payload(message))
+                chunk = sse_frame(session.session_id, event_id, message)
+                SSE_BYTES.inc(amount=len(chunk))
+                yield chunk
         finally:
-            keep_alive_task.cancel()
-            try:
-                await keep_alive_task
-            except asyncio.CancelledError:
-                pass
-            
+            # A resumed stream registers the same queue again
+            if proxy.keepalive is not None and session.message_queue.consumer == consumer:
+                proxy.keepalive.unregister(session.message_queue)
+
     except Exception as e:
         logger.error(f"SSE stream error for session {session.session_id}: {e}", exc_info=True)
     finally:
+        SSE_SESSIONS.dec()
         logger.info(f"SSE stream ended for session {session.session_id}")
-        await proxy.cleanup_session(session.session_id)
+        # A resumed stream now owns the session
+        if session.message_queue.consumer == consumer:
+            await proxy.detach_session(session.session_id)
 
-async def send_keep_alive(session):
-    """Send keep-alive comments periodically"""
-    try:
-        while not session.closed:
-            await asyncio.sleep(30)
-            await session.message_queue.put({
-                "jsonrpc": "2.0",
-                "method": "ping",
-                "params": {
-                    "timestamp": int(time.time())
-                }
-            })
-    except asyncio.CancelledError:
-        pass
+def sse_frame(session_id: str, event_id: int, data: bytes) -> bytes:
+    """SSE message event carrying already encoded JSON"""
+    return b"".join((f"id: {session_id}:{event_id}\ndata: ".encode(), data, b"\n\n"))
 
 async def handle_sse(request):
     """Handle SSE connections"""
+    name = request.path_params.get("server")
     logger.info(f"New SSE connection request from {request.client}")
-    logger.info(f"Request headers: {dict(request.headers)}")
-    logger.info(f"Request query params: {dict(request.query_params)}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Request headers: %s", redact(request.headers))
+        logger.debug("Request query params: %s", redact(request.query_params))
     
     # Validate server key
     is_valid, error_response = proxy.validate_server_key(
@@ -333,25 +298,72 @@ async def handle_sse(request):
     if not is_valid:
         logger.warning(f"Invalid server key from {request.client}")
         return error_response
-        
-    session_id = str(uuid.uuid4())
-    logger.info(f"Created new session {session_id} for client {request.client}")
-    
-    # Get session parameters
-    session_params = proxy.get_session_params(params, request.query_params) if not SHARED_SESSION else params
-    logger.info(f"Session parameters for {session_id}: {session_params}")
-    
+
+    # The default proxy stops accepting first on shutdown, also for servers not started yet
+    if not proxy.accepting:
+        return JSONResponse(
+            create_error_response(INTERNAL_ERROR, "Server is shutting down"),
+            status_code=503
+        )
+
+    # Servers from MCP_SERVERS_CONFIG start on first use
     try:
-        session = await proxy.create_session(session_id, session_params)
+        server_proxy = await resolve_proxy(name)
+    except UnknownServer:
+        message = f"Unknown server: {name}" if name else "No default MCP server is configured"
+        return JSONResponse(create_error_response(INVALID_REQUEST, message), status_code=404)
     except Exception as e:
-        logger.error(f"Failed to create session: {e}")
+        logger.error(f"Failed to start server {name}: {e}")
         return JSONResponse(
-            create_error_response(INTERNAL_ERROR, "Failed to create session"),
-            status_code=500
+            create_error_response(INTERNAL_ERROR, f"Failed to start MCP server: {e}"),
+            status_code=502
         )
 
+    if not server_proxy.accepting:
+        return JSONResponse(
+            create_error_response(INTERNAL_ERROR, "Server is shutting down"),
+            status_code=503
+        )
+        
+    # Resume the session of a reconnecting client
+    last_event_id = request.headers.get("last-event-id")
+    resumed = server_proxy.resume_session(last_event_id) if last_event_id else None
+    if resumed is not None:
+        session, resume_from = resumed
+        session_id = session.session_id
+        SSE_RESUMES.inc()
+        logger.info(f"Resuming session {session_id} after event {resume_from} for client {request.client}")
+    else:
+        session_id = server_proxy.new_session_id()
+        resume_from = None
+        logger.info(f"Created new session {session_id} for client {request.client}")
+
+        # Get session parameters
+        session_params = server_proxy.params
+        if not server_proxy.shared_session:
+            session_params = server_proxy.get_session_params(session_params, request.query_params)
+        logger.debug("Session parameters for %s: %s %s", session_id, session_params.command, session_params.args)
+
+        # AUTH_KEY is one secret shared by every client, so per-key limits apply per client address
+        limit_key = getattr(request.client, "host", "")
+        try:
+            session = await server_proxy.create_session(session_id, session_params, limit_key or "")
+        except LimitExceeded as e:
+            logger.warning(f"Rejected SSE connection from {request.client}: {e}")
+            return JSONResponse(
+                create_error_response(LIMIT_EXCEEDED, str(e), data=e.data),
+                status_code=429,
+                headers={"Retry-After": e.retry_after_header}
+            )
+        except Exception as e:
+            logger.error(f"Failed to create session: {e}")
+            return JSONResponse(
+                create_error_response(INTERNAL_ERROR, "Failed to create session"),
+                status_code=500
+            )
+
     response = StreamingResponse(
-        sse_stream(session),
+        sse_stream(server_proxy, session, resume_from, f"/messages/{name}" if name else "/messages"),
         media_type="text/event-stream",
     )
     response.headers["Cache-Control"] = "no-cache"
@@ -362,26 +374,21 @@ async def handle_sse(request):
     return response
 
 
-# Predefined method handlers mapping
-METHOD_HANDLERS = {
-    "initialize": lambda session, params: session.initialize(),
-    "tools/list": lambda session, params: session.list_tools(),
-    "tools/call": lambda session, params: session.call_tool(params.get("name"), params.get("arguments")),
-    "prompts/list": lambda session, params: session.list_prompts(),
-    "prompts/get": lambda session, params: session.get_prompt(params.get("name"), params.get("arguments")),
-    "resources/list": lambda session, params: session.list_resources(),
-    "resources/templates/list": lambda session, params: session.list_resource_templates(),
-    "resources/read": lambda session, params: session.read_resource(params.get("uri")),
-    "resources/subscribe": lambda session, params: session.subscribe_resource(params.get("uri")),
-    "resources/unsubscribe": lambda session, params: session.unsubscribe_resource(params.get("uri")),
-}
-
 async def handle_message(request):
     """Handle JSON-RPC 2.0 messages"""
     try:
         session_id = request.query_params.get("session_id")
         data = await request.json()
-        return await proxy.handle_message(session_id, data)
+        name = request.path_params.get("server")
+        if name is None:
+            return await proxy.route_message(session_id, data)
+        try:
+            server_proxy = catalog.find(name, session_id) if catalog is not None else None
+        except UnknownServer:
+            server_proxy = None
+        if server_proxy is None:
+            return JSONResponse(create_error_response(SERVER_ERROR_START, "Invalid session", None))
+        return await server_proxy.route_message(session_id, data)
     except Exception as e:
         logger.error(f"Error handling message: {e}")
         return JSONResponse(
@@ -389,38 +396,139 @@ async def handle_message(request):
             status_code=500
         )
 
+async def handle_stats(request):
+    """Return proxy runtime statistics"""
+    is_valid, error_response = proxy.validate_server_key(
+        request.query_params.get("auth_key"),
+        AUTH_KEY
+    )
+    if not is_valid:
+        return error_response
+    name = request.path_params.get("server")
+    if name is not None:
+        server_proxy = catalog.find(name) if catalog is not None and name in catalog.entries else None
+        if server_proxy is None:
+            return JSONResponse(create_error_response(INVALID_REQUEST, f"Server {name} is not running"), status_code=404)
+        return JSONResponse(server_proxy.stats())
+    stats = proxy.stats()
+    if catalog is not None:
+        stats["servers"] = catalog.stats()
+    return JSONResponse(stats)
+
+
+async def handle_metrics(request):
+    """Return metrics in the Prometheus text format"""
+    is_valid, error_response = proxy.validate_server_key(
+        request.query_params.get("auth_key"),
+        AUTH_KEY
+    )
+    if not is_valid:
+        return error_response
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
+async def reload_config() -> dict:
+    """Re-read the server config and switch new sessions to backends started with it"""
+    result = {}
+    try:
+        if params is not None:
+            reloaded = await proxy.reload(get_server_params())
+            result.update(reloaded=reloaded, generation=proxy.generation)
+            if reloaded:
+                logger.info(f"Server config reloaded, generation {proxy.generation}")
+            else:
+                logger.info("Server config unchanged, nothing to reload")
+        if catalog is not None:
+            result["servers"] = await catalog.reload(load_server_catalog(MCP_SERVERS_CONFIG))
+            logger.info(f"Server catalog reloaded: {result['servers'] or 'no changes'}")
+    except Exception as e:
+        logger.error(f"Failed to reload server config: {e}")
+        raise
+    return result
+
+
+async def handle_reload(request):
+    """Reload the server config on demand"""
+    is_valid, error_response = proxy.validate_server_key(
+        request.query_params.get("auth_key"),
+        AUTH_KEY
+    )
+    if not is_valid:
+        return error_response
+    try:
+        return JSONResponse(await reload_config())
+    except Exception as e:
+        return JSONResponse(
+            create_error_response(INTERNAL_ERROR, f"Failed to reload server config: {e}"),
+            status_code=500
+        )
+
+
+def reload_on_signal():
+    task = asyncio.ensure_future(reload_config())
+    # Errors are logged by reload_config
+    task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
 
 # Create Starlette application
 app = Starlette(
     routes=[
         Route("/sse", handle_sse),
+        Route("/sse/{server}", handle_sse),
         Route("/messages", handle_message, methods=["POST"]),
+        Route("/messages/{server}", handle_message, methods=["POST"]),
+        Route("/stats", handle_stats),
+        Route("/stats/{server}", handle_stats),
+        Route("/metrics", handle_metrics),
+        Route("/admin/reload", handle_reload, methods=["POST"]),
     ]
 )
 
 @app.on_event("startup")
 async def startup_event():
     """Initialize global MCP session on startup"""
-    if SHARED_SESSION:
-        await proxy.initialize_global_session(params)
-    else:
-        logger.info("Running in dedicated session mode - skipping global session initialization")
+    if params is not None:
+        await proxy.start(params)
+    if catalog is not None:
+        await catalog.start()
+    if hasattr(signal, "SIGHUP"):
+        asyncio.get_running_loop().add_signal_handler(signal.SIGHUP, reload_on_signal)
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Cleanup global MCP session on shutdown"""
-    if SHARED_SESSION:
-        await proxy.cleanup_global_session()
+    if catalog is not None:
+        await catalog.stop()
+    await proxy.stop()
+
+class DrainingServer(uvicorn.Server):
+    """uvicorn server that drains the proxy before closing connections"""
+
+    async def shutdown(self, sockets=None):
+        await asyncio.gather(
+            proxy.drain(SHUTDOWN_DRAIN_TIMEOUT),
+            catalog.drain(SHUTDOWN_DRAIN_TIMEOUT) if catalog is not None else asyncio.sleep(0)
+        )
+        await super().shutdown(sockets)
+
 
 if __name__ == "__main__":
     # Configure uvicorn with appropriate settings
-    config = uvicorn.Config(
-        app,
+    server_options = dict(
         host="0.0.0.0",
         port=8000,
         log_level="info",
         timeout_keep_alive=120,
-        access_log=True
+        access_log=True,
+        # SSE streams are ended by the drain, this only bounds stragglers
+        timeout_graceful_shutdown=SHUTDOWN_DRAIN_TIMEOUT + 5
     )
-    server = uvicorn.Server(config)
-    server.run()
+    if WORKERS > 1:
+        # Workers relay POSTs for sessions they do not own over Unix sockets
+        if not WORKER_SOCKET_DIR:
+            os.environ['WORKER_SOCKET_DIR'] = os.path.join(tempfile.gettempdir(), f"mcpproxy-{os.getpid()}")
+        uvicorn.run("main:app", workers=WORKERS, **server_options)
+    else:
+        config = uvicorn.Config(app, **server_options)
+        server = DrainingServer(config)
+        server.run()
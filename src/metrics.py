@@ -0,0 +1,237 @@
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SPAWN_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_labels(names: Tuple[str, ...], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self.values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for labels, value in self.values.items():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(_Metric):
+    type_name = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        callback: Optional[Callable[[], Dict[LabelValues, float]]] = None
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.values: Dict[LabelValues, float] = {}
+        self.callback = callback
+
+    def inc(self, *labels: str, amount: float = 1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def dec(self, *labels: str, amount: float = 1):
+        self.values[labels] = self.values.get(labels, 0) - amount
+
+    def set(self, value: float, *labels: str):
+        self.values[labels] = value
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        values = self.callback() if self.callback is not None else self.values
+        for labels, value in values.items():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts..., +Inf count, sum]
+        self.values: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, value: float, *labels: str):
+        series = self.values.get(labels)
+        if series is None:
+            series = self.values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for labels, series in self.values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            label_str = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_str} {_format_value(series[-1])}")
+            lines.append(f"{self.name}_count{label_str} {cumulative}")
+        return lines
+
+
+class Registry:
+    """Prometheus text-format metrics
+
+    Values are plain numbers only touched from the event loop thread, so
+    recording a sample needs no locks. Gauges with a callback are computed
+    at scrape time.
+    """
+
+    def __init__(self):
+        self.metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+REQUEST_DURATION = REGISTRY.register(Histogram(
+    "mcpproxy_request_duration_seconds",
+    "End-to-end time to answer a JSON-RPC request in the proxy",
+    ["method"]
+))
+PROXY_OVERHEAD = REGISTRY.register(Histogram(
+    "mcpproxy_proxy_overhead_seconds",
+    "Part of the request time not spent waiting for the backend",
+    ["method"]
+))
+BACKEND_DURATION = REGISTRY.register(Histogram(
+    "mcpproxy_backend_duration_seconds",
+    "Time spent in upstream backend calls",
+    ["method"]
+))
+REQUESTS_IN_FLIGHT = REGISTRY.register(Gauge(
+    "mcpproxy_requests_in_flight",
+    "JSON-RPC requests currently being processed",
+    ["method"]
+))
+ERRORS = REGISTRY.register(Counter(
+    "mcpproxy_errors_total",
+    "JSON-RPC error responses by error code",
+    ["code"]
+))
+MESSAGES_QUEUED = REGISTRY.register(Counter(
+    "mcpproxy_sse_messages_queued_total",
+    "Messages queued for SSE clients"
+))
+REQUESTS_CANCELLED = REGISTRY.register(Counter(
+    "mcpproxy_requests_cancelled_total",
+    "In-flight requests cancelled by the client or because their session closed",
+    ["reason"]
+))
+SSE_BYTES = REGISTRY.register(Counter(
+    "mcpproxy_sse_bytes_sent_total",
+    "Bytes written to SSE streams"
+))
+SSE_RESUMES = REGISTRY.register(Counter(
+    "mcpproxy_sse_resumes_total",
+    "SSE streams resumed with Last-Event-ID"
+))
+SSE_SESSIONS = REGISTRY.register(Gauge(
+    "mcpproxy_sse_sessions",
+    "Active SSE sessions"
+))
+QUEUE_DEPTH = REGISTRY.register(Gauge(
+    "mcpproxy_outbound_queue_depth",
+    "Messages waiting in SSE outbound queues",
+    ["stat"]
+))
+BACKEND_PROCESSES = REGISTRY.register(Gauge(
+    "mcpproxy_backend_processes",
+    "Running MCP server processes"
+))
+BACKEND_SPAWN_DURATION = REGISTRY.register(Histogram(
+    "mcpproxy_backend_spawn_duration_seconds",
+    "Time to spawn and initialize an MCP server process",
+    buckets=SPAWN_BUCKETS
+))
+POOL_HITS = REGISTRY.register(Counter(
+    "mcpproxy_warm_pool_hits_total",
+    "Sessions served a ready backend from the warm pool"
+))
+POOL_MISSES = REGISTRY.register(Counter(
+    "mcpproxy_warm_pool_misses_total",
+    "Sessions that found the warm pool empty and waited for a spawn"
+))
+BACKEND_RECYCLES = REGISTRY.register(Counter(
+    "mcpproxy_backend_recycles_total",
+    "Backend processes restarted by the recycling policy",
+    ["reason"]
+))
+SESSIONS_REAPED = REGISTRY.register(Counter(
+    "mcpproxy_sessions_reaped_total",
+    "Sessions closed by the reaper",
+    ["reason"]
+))
+REQUESTS_REJECTED = REGISTRY.register(Counter(
+    "mcpproxy_requests_rejected_total",
+    "Requests and sessions rejected by admission control",
+    ["scope"]
+))
+LANE_WAIT = REGISTRY.register(Histogram(
+    "mcpproxy_lane_wait_seconds",
+    "Time backend calls waited for a slot in their scheduler lane",
+    ["lane"]
+))
+SSE_KEEPALIVES = REGISTRY.register(Counter(
+    "mcpproxy_sse_keepalives_total",
+    "Keep-alive comment frames written to idle SSE streams"
+))
+BACKEND_FAILOVERS = REGISTRY.register(Counter(
+    "mcpproxy_backend_failovers_total",
+    "Shared backend processes replaced by the supervisor",
+    ["reason"]
+))
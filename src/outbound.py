@@ -0,0 +1,222 @@
+import time
+import asyncio
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple, Union
+
+from serialization import dumps
+
+# Slow-consumer policies
+DROP_OLDEST = "drop_oldest"
+COALESCE = "coalesce"
+DISCONNECT = "disconnect"
+POLICIES = (DROP_OLDEST, COALESCE, DISCONNECT)
+
+# Returned by OutboundQueue.get() when the stream should write a keep-alive frame
+KEEPALIVE = object()
+
+
+def progress_token(message: Any) -> Optional[str]:
+    """Progress token of a progress notification, also when wrapped in notifications/message"""
+    if not isinstance(message, dict):
+        return None
+    method = message.get("method")
+    params = message.get("params") or {}
+    if method == "notifications/progress":
+        token = params.get("progressToken")
+    elif method == "notifications/message":
+        data = params.get("data") or {}
+        if not isinstance(data, dict) or data.get("type") != "ProgressNotification":
+            return None
+        token = ((data.get("content") or {}).get("params") or {}).get("progressToken")
+    else:
+        return None
+    return None if token is None else str(token)
+
+
+class _Item:
+    __slots__ = ("data", "size", "notification", "token")
+
+    def __init__(self, data: bytes, notification: bool, token: Optional[str]):
+        self.data = data
+        self.size = len(data)
+        self.notification = notification
+        self.token = token
+
+
+class OutboundQueue:
+    """Bounded, byte-accounted queue of encoded messages for one SSE client
+
+    Messages are JSON-encoded once on enqueue, pre-encoded responses are
+    queued as is. When the queue exceeds
+    max_messages or max_bytes the policy applies: drop_oldest drops the
+    oldest notifications, coalesce additionally replaces a queued progress
+    notification with a newer one for the same token, and disconnect ends
+    the stream. Responses are never dropped: a queue still over its limits
+    once no notification is left to drop is disconnected instead.
+    """
+
+    def __init__(self, max_messages: int = 0, max_bytes: int = 0, policy: str = COALESCE):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown outbound queue policy: {policy}")
+        self.max_messages = max_messages
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.items: Deque[_Item] = deque()
+        self.progress: Dict[str, _Item] = {}
+        self.bytes = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.disconnected = False
+        # End the stream once the queue is empty
+        self.finishing = False
+        self.consumer = 0
+        # When the consumer last took something off the queue
+        self.last_sent = time.monotonic()
+        self.keepalive_due = False
+        self._event = asyncio.Event()
+
+    def qsize(self) -> int:
+        return len(self.items)
+
+    def put(self, message: Any, data: Optional[bytes] = None) -> bool:
+        """Enqueue a message, returns False if it was not accepted
+
+        data is the message already encoded, shared when the same
+        notification goes to many queues.
+        """
+        if self.disconnected:
+            return False
+        if data is None:
+            if isinstance(message, bytes):
+                data = message
+            elif isinstance(message, str):
+                data = message.encode()
+            else:
+                data = dumps(message)
+        notification = isinstance(message, dict) and "id" not in message
+        token = progress_token(message) if notification and self.policy == COALESCE else None
+
+        if token is not None and token in self.progress:
+            item = self.progress[token]
+            self.bytes += len(data) - item.size
+            item.data, item.size = data, len(data)
+            self.coalesced += 1
+            return True
+
+        item = _Item(data, notification, token)
+        self.items.append(item)
+        self.bytes += item.size
+        if token is not None:
+            self.progress[token] = item
+        self._event.set()
+
+        if self._over_limit():
+            if self.policy != DISCONNECT:
+                self._drop_notifications()
+            # Only responses left, the client is not reading them
+            if self.policy == DISCONNECT or self._over_limit():
+                self.disconnect()
+                return False
+        return True
+
+    def _over_limit(self, count: Optional[int] = None) -> bool:
+        count = len(self.items) if count is None else count
+        return (self.max_messages > 0 and count > self.max_messages) or \
+            (self.max_bytes > 0 and self.bytes > self.max_bytes)
+
+    def _drop_notifications(self):
+        count = len(self.items)
+        kept: Deque[_Item] = deque()
+        for item in self.items:
+            if item.notification and self._over_limit(count):
+                self._forget(item)
+                count -= 1
+                self.dropped += 1
+            else:
+                kept.append(item)
+        self.items = kept
+
+    def _forget(self, item: _Item):
+        self.bytes -= item.size
+        if item.token is not None and self.progress.get(item.token) is item:
+            del self.progress[item.token]
+
+    def attach(self) -> int:
+        """Register a new consumer, ending the get() of the previous one"""
+        self.consumer += 1
+        self.last_sent = time.monotonic()
+        self._event.set()
+        return self.consumer
+
+    def request_keepalive(self) -> bool:
+        """Have the waiting consumer write a keep-alive, returns False if one is already pending"""
+        if self.disconnected or self.keepalive_due:
+            return False
+        self.keepalive_due = True
+        self._event.set()
+        return True
+
+    async def get(self, consumer: int = 0) -> Union[bytes, object, None]:
+        """Next encoded message, KEEPALIVE when the stream was idle for too long,
+        or None once the consumer was disconnected or replaced"""
+        while not self.items:
+            if self.disconnected or self.finishing or consumer != self.consumer:
+                return None
+            if self.keepalive_due:
+                self.keepalive_due = False
+                self.last_sent = time.monotonic()
+                return KEEPALIVE
+            self._event.clear()
+            await self._event.wait()
+        if self.disconnected or consumer != self.consumer:
+            return None
+        item = self.items.popleft()
+        self._forget(item)
+        self.keepalive_due = False
+        self.last_sent = time.monotonic()
+        return item.data
+
+    def finish(self):
+        """End the stream after everything queued has been sent"""
+        self.finishing = True
+        self._event.set()
+
+    def disconnect(self):
+        """Drop everything queued and end the stream"""
+        self.disconnected = True
+        self.items.clear()
+        self.progress.clear()
+        self.bytes = 0
+        self._event.set()
+
+    def stats(self) -> dict:
+        return {
+            "depth": len(self.items),
+            "bytes": self.bytes,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+            "disconnected": self.disconnected,
+        }
+
+
+class ReplayBuffer:
+    """Ring buffer of the last events written to an SSE stream
+
+    Events are numbered from 1; a client reconnecting with the number of
+    the last event it saw gets every later event that is still buffered.
+    """
+
+    def __init__(self, size: int = 256):
+        self.events: Deque[Tuple[int, bytes]] = deque(maxlen=max(size, 0))
+        self.last_id = 0
+
+    def append(self, data: bytes) -> int:
+        self.last_id += 1
+        self.events.append((self.last_id, data))
+        return self.last_id
+
+    def since(self, event_id: int) -> Tuple[List[Tuple[int, bytes]], bool]:
+        """Events after event_id, and whether any of them were already evicted"""
+        events = [event for event in self.events if event[0] > event_id]
+        first = events[0][0] if events else self.last_id + 1
+        return events, first > event_id + 1
@@ -0,0 +1,65 @@
+import os
+import logging
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+# pid -> (parent pid, resident set size in bytes)
+ProcessTable = Dict[int, Tuple[int, int]]
+
+
+def available() -> bool:
+    """Whether process information can be read from /proc"""
+    return os.path.isdir("/proc/self")
+
+
+def process_table() -> ProcessTable:
+    """Snapshot parent pid and RSS of every visible process"""
+    table: ProcessTable = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "rb") as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # Fields after the parenthesized command name start at field 3 (state)
+        fields = stat[stat.rfind(b")") + 2:].split()
+        try:
+            table[int(entry)] = (int(fields[1]), int(fields[21]) * PAGE_SIZE)
+        except (IndexError, ValueError):
+            continue
+    return table
+
+
+def find_child(table: ProcessTable, marker: str, value: str) -> Optional[int]:
+    """Find the child of this process whose environment has marker=value"""
+    needle = f"{marker}={value}".encode()
+    parent = os.getpid()
+    for pid, (ppid, _) in table.items():
+        if ppid != parent:
+            continue
+        try:
+            with open(f"/proc/{pid}/environ", "rb") as f:
+                if needle in f.read().split(b"\0"):
+                    return pid
+        except OSError:
+            continue
+    return None
+
+
+def tree_rss(table: ProcessTable, pid: int) -> int:
+    """Total RSS of a process and all of its descendants"""
+    children: Dict[int, list] = {}
+    for child, (ppid, _) in table.items():
+        children.setdefault(ppid, []).append(child)
+    total, stack = 0, [pid]
+    while stack:
+        current = stack.pop()
+        if current in table:
+            total += table[current][1]
+        stack.extend(children.get(current, ()))
+    return total
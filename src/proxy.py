@@ -3,58 +3,144 @@ import asyncio
 import uuid
 import json
 import time
-from typing import Dict, Optional, Tuple
+from contextlib import nullcontext
+from contextvars import ContextVar
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
 
-from starlette.responses import JSONResponse
-from mcp import ClientSession, stdio_client, types
+from starlette.responses import JSONResponse, Response
+from mcp import ClientSession, types
 from mcp import StdioServerParameters
 
+from backend import Backend, BackendPool, BackendRegistry, ReplicaSet, fingerprint, same_params, PROCESS_MARKER
+from cache import ResponseCache, ToolResultCache, canonical_params
+from coalesce import SingleFlight
+from outbound import OutboundQueue, ReplayBuffer, COALESCE, POLICIES
+from workers import RelayError, WorkerRelay
+from limits import AdmissionControl, LimitExceeded
+from scheduler import LaneScheduler
+from serialization import dump_model, encode_response
+from logutil import Payload, Sampler, log_access
+from keepalive import KeepAliveScheduler
+from supervisor import Supervisor
+from fanout import NotificationRouter, wrap_notification
+from metrics import (
+    REQUEST_DURATION, PROXY_OVERHEAD, BACKEND_DURATION, REQUESTS_IN_FLIGHT,
+    ERRORS, MESSAGES_QUEUED, QUEUE_DEPTH, SESSIONS_REAPED, BACKEND_RECYCLES, REQUESTS_CANCELLED
+)
+import procinfo
 from jsonrpc import (
-    PARSE_ERROR, INVALID_REQUEST, METHOD_NOT_FOUND, INVALID_PARAMS, 
-    INTERNAL_ERROR, SERVER_ERROR_START, create_error_response, 
+    PARSE_ERROR, METHOD_NOT_FOUND, INVALID_PARAMS, 
+    INTERNAL_ERROR, SERVER_ERROR_START, TIMEOUT_ERROR, LIMIT_EXCEEDED, create_error_response, 
     create_success_response, validate_request
 )
 
 logger = logging.getLogger(__name__)
+# Per-message debug lines are sampled, they fire for every queued or received message
+_queue_sampler = Sampler()
+_server_message_sampler = Sampler()
+
+# Seconds the current request spent waiting for upstream calls
+_upstream_time: ContextVar[Optional[List[float]]] = ContextVar("upstream_time", default=None)
+
+# Seconds a relayed request may take beyond its deadline before the owning worker counts as hung
+RELAY_GRACE = 5.0
 
 class SSESession:
-    def __init__(self, session_id: str, params: StdioServerParameters):
+    def __init__(
+        self,
+        session_id: str,
+        params: StdioServerParameters,
+        max_inflight: int = 0,
+        message_queue: Optional[OutboundQueue] = None,
+        replay_size: int = 256
+    ):
         self.session_id = session_id
-        self.message_queue = asyncio.Queue()
+        # Auth key (or client address) the admission limits are accounted to
+        self.auth_key = ""
+        # Config generation the session started on, and the shared replicas serving it
+        self.generation = 0
+        self.replicas: Optional[ReplicaSet] = None
+        self.message_queue = message_queue or OutboundQueue()
+        self.replay = ReplayBuffer(replay_size)
+        # Pending cleanup while no SSE stream is attached
+        self.cleanup_handle: Optional[asyncio.TimerHandle] = None
+        self.created_at = time.monotonic()
+        # Last POST or server notification, used by the idle reaper
+        self.last_activity = self.created_at
+        self.active_requests = 0
         self.closed = False
-        self.client_session: Optional[ClientSession] = None
-        self.streams = None
-        self.stdio_client = None
-        self._init_task = None
-        self._cleanup_lock = asyncio.Lock()
+        self.inflight: Set[asyncio.Task] = set()
+        # Client request id -> task computing its response, for notifications/cancelled
+        self.calls: Dict[object, asyncio.Task] = {}
+        self.max_inflight = max_inflight
+        self.backend: Optional[Backend] = None
         self.is_initialized = False
+        # Backend startup shared by every request that arrives before it is done
+        self.ready: Optional[asyncio.Task] = None
         self.params = params
 
-    async def send_message(self, message):
+    @property
+    def client_session(self) -> Optional[ClientSession]:
+        return self.backend.client_session if self.backend else None
+
+    @property
+    def busy(self) -> bool:
+        """Whether requests of this session are still being processed"""
+        return self.active_requests > 0 or bool(self.inflight) or bool(self.calls)
+
+    async def send_message(self, message, data: Optional[bytes] = None):
         if not self.closed:
-            logger.info(f"Queuing message for SSE client: {message}")
-            await self.message_queue.put(message)
+            if logger.isEnabledFor(logging.DEBUG) and _queue_sampler():
+                logger.debug("Queuing message for SSE client %s: %s", self.session_id, Payload(message))
+            if self.message_queue.put(message, data):
+                MESSAGES_QUEUED.inc()
+            elif self.message_queue.disconnected:
+                logger.warning(f"Disconnecting slow SSE client {self.session_id}")
+
+    def start_task(self, coro) -> Optional[asyncio.Task]:
+        """Run coro as a tracked background task, returns None when the in-flight limit is reached"""
+        if self.max_inflight and len(self.inflight) >= self.max_inflight:
+            coro.close()
+            return None
+        task = asyncio.create_task(coro)
+        self.inflight.add(task)
+        task.add_done_callback(self.inflight.discard)
+        return task
+
+    def track_call(self, id, task: asyncio.Task):
+        """Register the task answering request id so the client can cancel it"""
+        if id is None:
+            return
+        self.calls[id] = task
+        task.add_done_callback(lambda t: self.calls.pop(id, None) if self.calls.get(id) is t else None)
+
+    def cancel_call(self, id) -> bool:
+        """Cancel the in-flight request with the given client request id"""
+        task = self.calls.pop(id, None)
+        if task is None or task.done():
+            return False
+        task.cancel()
+        return True
+
+    async def cancel_tasks(self):
+        """Cancel all in-flight background tasks and calls"""
+        tasks = list(self.inflight | set(self.calls.values()))
+        self.calls.clear()
+        for task in tasks:
+            if not task.done():
+                REQUESTS_CANCELLED.inc("session_closed")
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
 
     async def handle_server_message(self, message):
         """Handle messages from the server"""
         try:
-            logger.info(f"Received server message: {message}")
+            if logger.isEnabledFor(logging.DEBUG) and _server_message_sampler():
+                logger.debug("Received server message for session %s: %s", self.session_id, Payload(message))
+            self.last_activity = time.monotonic()
             if isinstance(message, types.ServerNotification):
-                # 使用 model_dump() 序列化 Pydantic 模型
-                content = message.root.model_dump()
-                # 确保消息符合 JSON-RPC 2.0 格式
-                notification = {
-                    "jsonrpc": "2.0",
-                    "method": "notifications/message",
-                    "params": {
-                        "level": "info",
-                        "data": {
-                            "type": message.root.__class__.__name__,
-                            "content": content
-                        }
-                    }
-                }
-                await self.send_message(notification)
+                await self.send_message(wrap_notification(message.root))
             elif isinstance(message, Exception):
                 error = {
                     "jsonrpc": "2.0",
@@ -83,99 +169,559 @@ class SSESession:
             }
             await self.send_message(error)
 
-    async def initialize_client(self):
-        """Initialize client connection"""
+    async def initialize_client(
+        self,
+        acquire: Callable[[StdioServerParameters], Awaitable[Backend]],
+        release: Optional[Callable[[Backend], Awaitable[None]]] = None
+    ):
+        """Initialize client connection with a backend obtained from acquire"""
         if self.is_initialized:
             return
             
-        self._init_task = asyncio.current_task()
-        
         try:
             logger.info(f"Initializing dedicated session for {self.session_id}")
-            self.stdio_client = stdio_client(self.params)
-            self.streams = await self.stdio_client.__aenter__()
-            self.client_session = await ClientSession(
-                self.streams[0], 
-                self.streams[1],
-                message_handler=self.handle_server_message
-            ).__aenter__()
+            backend = await acquire(self.params)
+            if self.closed:
+                # Session went away while the backend was starting
+                if release is not None:
+                    await release(backend)
+                else:
+                    await backend.close()
+                return
+            backend.listeners.add(self.handle_server_message)
+            self.backend = backend
             self.is_initialized = True
             logger.info(f"Dedicated session initialized for {self.session_id}")
         except Exception as e:
             logger.error(f"Failed to initialize dedicated session: {e}")
             raise
 
-    async def close(self):
-        """Close session"""
+    def start_client(
+        self,
+        acquire: Callable[[StdioServerParameters], Awaitable[Backend]],
+        release: Optional[Callable[[Backend], Awaitable[None]]] = None
+    ) -> asyncio.Task:
+        """Start initializing the backend in the background, once per session or again after a failed start"""
+        if self.ready is None or (self.ready.done() and not self.ready.cancelled() and self.ready.exception() is not None):
+            self.ready = asyncio.create_task(self._start_client(acquire, release))
+            # Retrieve the error so it is not reported when no POST waits for it
+            self.ready.add_done_callback(lambda t: t.cancelled() or t.exception())
+        return self.ready
+
+    async def _start_client(self, acquire, release):
+        try:
+            await self.initialize_client(acquire, release)
+        except Exception as e:
+            await self.send_message(error_response(INTERNAL_ERROR, f"Failed to start MCP server: {e}"))
+            raise
+
+    async def wait_ready(self):
+        """Wait for the backend started by start_client, raises its startup error"""
+        if self.ready is not None:
+            await asyncio.shield(self.ready)
+
+    async def close(self, release: Optional[Callable[[Backend], Awaitable[None]]] = None):
+        """Close session and hand the backend to release, or close it directly"""
         if self.closed:
             return
             
         self.closed = True
+        if self.ready is not None and not self.ready.done():
+            self.ready.cancel()
+            await asyncio.gather(self.ready, return_exceptions=True)
+        await self.cancel_tasks()
 
-        if self._init_task and self._init_task != asyncio.current_task():
-            loop = asyncio.get_event_loop()
-            done = loop.create_future()
-            
-            def _schedule_cleanup():
-                if not done.done():
-                    done.set_result(None)
-            
-            self._init_task.get_loop().call_soon_threadsafe(_schedule_cleanup)
-            await done
-            
-            while self.client_session is not None or self.stdio_client is not None:
-                await asyncio.sleep(0.1)
-        else:
-            try:
-                if self.client_session:
-                    await self.client_session.__aexit__(None, None, None)
-                    self.client_session = None
-                
-                if self.stdio_client:
-                    await self.stdio_client.__aexit__(None, None, None)
-                    self.stdio_client = None
-                
-                self.streams = None
-            except Exception as e:
-                logger.error(f"Error during cleanup: {e}")
+        if self.backend:
+            backend, self.backend = self.backend, None
+            backend.listeners.discard(self.handle_server_message)
+            if release is not None:
+                await release(backend)
+            else:
+                await backend.close()
 
 class MCPProxy:
-    def __init__(self, shared_session: bool = True):
+    def __init__(
+        self,
+        shared_session: bool = True,
+        async_dispatch: bool = False,
+        max_inflight: int = 0,
+        pool_size: int = 0,
+        pool_max_size: int = 0,
+        pool_spawn_concurrency: int = 2,
+        pool_idle_timeout: float = 300.0,
+        backend_reuse: bool = False,
+        backend_linger: float = 60.0,
+        replicas: int = 1,
+        cache: Optional[ResponseCache] = None,
+        coalescer: Optional[SingleFlight] = None,
+        tool_cache: Optional[ToolResultCache] = None,
+        queue_max_messages: int = 0,
+        queue_max_bytes: int = 0,
+        queue_policy: str = COALESCE,
+        resume_grace: float = 0.0,
+        replay_size: int = 256,
+        session_idle_timeout: float = 0.0,
+        session_max_lifetime: float = 0.0,
+        backend_max_requests: int = 0,
+        backend_max_rss: int = 0,
+        reaper_interval: float = 30.0,
+        worker_socket_dir: str = "",
+        request_timeout: float = 0.0,
+        method_timeouts: Optional[Dict[str, float]] = None,
+        tool_timeouts: Optional[Dict[str, float]] = None,
+        forward_cancellation: bool = False,
+        admission: Optional[AdmissionControl] = None,
+        scheduler: Optional[LaneScheduler] = None,
+        keepalive_interval: float = 30.0,
+        health_check_interval: float = 0.0,
+        health_check_timeout: float = 5.0,
+        health_check_failures: int = 2,
+        hot_standby: bool = False,
+        restart_backoff_initial: float = 0.5,
+        restart_backoff_max: float = 30.0,
+        reload_drain_timeout: float = 300.0,
+        drain_idle_timeout: float = 10.0
+    ):
         self.shared_session = shared_session
-        self.global_client_session: Optional[ClientSession] = None
-        self.global_stdio_client = None
-        self.global_streams = None
+        self.async_dispatch = async_dispatch
+        self.max_inflight = max_inflight
+        self.pool_size = pool_size
+        self.pool_max_size = pool_max_size
+        self.pool_spawn_concurrency = pool_spawn_concurrency
+        self.pool_idle_timeout = pool_idle_timeout
+        self.pool: Optional[BackendPool] = None
+        self.registry: Optional[BackendRegistry] = None
+        if backend_reuse and not shared_session:
+            self.registry = BackendRegistry(self.spawn_backend, linger=backend_linger)
+        self.replica_count = replicas
+        self.cache = cache
+        self.coalescer = coalescer
+        self.tool_cache = tool_cache
+        self.queue_max_messages = queue_max_messages
+        self.queue_max_bytes = queue_max_bytes
+        self.queue_policy = queue_policy
+        if queue_policy not in POLICIES:
+            raise ValueError(f"Unknown outbound queue policy: {queue_policy}")
+        self.resume_grace = resume_grace
+        self.replay_size = replay_size
+        self.session_idle_timeout = session_idle_timeout
+        self.session_max_lifetime = session_max_lifetime
+        self.backend_max_requests = backend_max_requests
+        self.backend_max_rss = backend_max_rss
+        if self.backend_max_rss and not procinfo.available():
+            logger.warning("BACKEND_MAX_RSS_MB needs /proc, RSS-based recycling is disabled")
+            self.backend_max_rss = 0
+        self.reaper_interval = reaper_interval
+        self.request_timeout = request_timeout
+        self.method_timeouts = method_timeouts or {}
+        self.tool_timeouts = tool_timeouts or {}
+        self.forward_cancellation = forward_cancellation
+        self.admission = admission
+        self.scheduler = scheduler
+        self.reaped_sessions = 0
+        self.recycled_backends = 0
+        self._reaper_task: Optional[asyncio.Task] = None
+        self._recycle_tasks: Set[asyncio.Task] = set()
+        self._recycling: Set[Backend] = set()
+        self.keepalive = KeepAliveScheduler(keepalive_interval) if keepalive_interval > 0 else None
+        self.relay: Optional[WorkerRelay] = None
+        if worker_socket_dir:
+            self.relay = WorkerRelay(worker_socket_dir, self.handle_forwarded)
+        self.replicas: Optional[ReplicaSet] = None
+        # Replicas of earlier configs still serving sessions started before a reload
+        self.draining_replicas: List[ReplicaSet] = []
+        # Server parameters new sessions start with, replaced by reload()
+        self.params: Optional[StdioServerParameters] = None
+        self.generation = 0
+        self.reloads = 0
+        self.reload_drain_timeout = reload_drain_timeout
+        self.drain_idle_timeout = drain_idle_timeout
+        self.accepting = True
+        self.retired_sessions = 0
+        self._reload_lock = asyncio.Lock()
+        self._drain_tasks: Set[asyncio.Task] = set()
+        self.supervisor: Optional[Supervisor] = None
+        if hot_standby and not (shared_session and health_check_interval > 0):
+            logger.warning("HOT_STANDBY needs shared session mode and HEALTH_CHECK_INTERVAL > 0, no standby is kept")
+        if shared_session and health_check_interval > 0:
+            self.supervisor = Supervisor(
+                self.supervised_backends,
+                interval=health_check_interval,
+                timeout=health_check_timeout,
+                failures=health_check_failures,
+                standby=hot_standby,
+                backoff_initial=restart_backoff_initial,
+                backoff_max=restart_backoff_max,
+                on_failover=self.resubscribe
+            )
         self.active_sessions: Dict[str, SSESession] = {}
+        # Shared backends deliver notifications through the router, dedicated ones directly
+        self.router = NotificationRouter(self.active_sessions, self.call_subscription) if shared_session else None
+        # With several proxies in one process the first one, or main, owns the gauge
+        if QUEUE_DEPTH.callback is None:
+            QUEUE_DEPTH.callback = self.queue_depth
+
+    async def start(self, params: StdioServerParameters):
+        """Start the backends and background tasks for params"""
+        if self.shared_session:
+            await self.initialize_global_session(params)
+        else:
+            logger.info("Running in dedicated session mode - skipping global session initialization")
+            await self.initialize_pool(params)
+        await self.start_reaper()
+        if self.keepalive:
+            await self.keepalive.start()
+        if self.relay:
+            await self.relay.start()
+
+    async def stop(self):
+        """Close all sessions, backends and background tasks"""
+        if self.relay:
+            await self.relay.close()
+        await self.stop_reaper()
+        if self.keepalive:
+            await self.keepalive.stop()
+        await self.cleanup_sessions()
+        if self.shared_session:
+            await self.cleanup_global_session()
+        else:
+            await self.cleanup_pool()
 
     async def initialize_global_session(self, params: StdioServerParameters):
-        """Initialize global MCP client session"""
+        """Initialize global MCP client session replicas"""
+        self.params = params
         try:
-            logger.info("Initializing global MCP session...")
-            self.global_stdio_client = stdio_client(params)
-            self.global_streams = await self.global_stdio_client.__aenter__()
-            self.global_client_session = await ClientSession(
-                self.global_streams[0], 
-                self.global_streams[1]
-            ).__aenter__()
+            logger.info(f"Initializing global MCP session with {self.replica_count} replica(s)...")
+            replicas = ReplicaSet(params, self.replica_count, factory=self.new_backend)
+            await replicas.start()
+            self.replicas = replicas
+            if self.supervisor is not None:
+                await self.supervisor.start()
             logger.info("Global MCP session initialized successfully")
         except Exception as e:
             logger.error(f"Failed to initialize global MCP session: {e}", exc_info=True)
             raise
 
     async def cleanup_global_session(self):
-        """Cleanup global MCP client session"""
+        """Cleanup global MCP client session replicas"""
         try:
-            if self.global_client_session:
-                await self.global_client_session.__aexit__(None, None, None)
-            if self.global_stdio_client:
-                await self.global_stdio_client.__aexit__(None, None, None)
-            self.global_client_session = None
-            self.global_stdio_client = None
-            self.global_streams = None
+            await self.stop_draining()
+            if self.supervisor is not None:
+                await self.supervisor.stop()
+            if self.replicas:
+                await self.replicas.close()
+                self.replicas = None
             logger.info("Global MCP session cleaned up successfully")
         except Exception as e:
             logger.error(f"Error during global session cleanup: {e}")
 
+    async def initialize_pool(self, params: StdioServerParameters):
+        """Start the warm backend pool for independent-session mode"""
+        self.params = params
+        if self.shared_session or self.pool_size <= 0:
+            return
+        self.pool = BackendPool(
+            params,
+            min_size=self.pool_size,
+            max_size=self.pool_max_size,
+            spawn_concurrency=self.pool_spawn_concurrency,
+            idle_timeout=self.pool_idle_timeout,
+            factory=self.new_backend
+        )
+        await self.pool.start()
+        logger.info(f"Warm backend pool started with {self.pool_size} backends")
+
+    async def cleanup_pool(self):
+        """Close the warm backend pool and any reused backends"""
+        await self.stop_draining()
+        if self.registry:
+            await self.registry.close()
+        if self.pool:
+            await self.pool.close()
+            self.pool = None
+            logger.info("Warm backend pool closed")
+
+    async def start_reaper(self):
+        """Start the background reaper if any session or backend limit is set"""
+        if self.session_idle_timeout or self.session_max_lifetime or self.backend_max_rss:
+            self._reaper_task = asyncio.create_task(self.reaper_loop())
+
+    async def stop_reaper(self):
+        """Stop the reaper and wait for running recycles"""
+        if self._reaper_task:
+            self._reaper_task.cancel()
+            await asyncio.gather(self._reaper_task, return_exceptions=True)
+            self._reaper_task = None
+        await asyncio.gather(*self._recycle_tasks, return_exceptions=True)
+
+    async def reaper_loop(self):
+        while True:
+            await asyncio.sleep(self.reaper_interval)
+            try:
+                await self.reap()
+            except Exception as e:
+                logger.error(f"Reaper error: {e}", exc_info=True)
+
+    async def reap(self):
+        """Close idle or expired sessions and recycle backends over their memory limit"""
+        now = time.monotonic()
+        for session_id, session in list(self.active_sessions.items()):
+            if session.closed or session.cleanup_handle is not None:
+                continue
+            if self.session_max_lifetime and now - session.created_at > self.session_max_lifetime:
+                await self.reap_session(session_id, "lifetime")
+            elif self.session_idle_timeout and session.active_requests == 0 \
+                    and now - session.last_activity > self.session_idle_timeout:
+                await self.reap_session(session_id, "idle")
+
+        if self.backend_max_rss:
+            table = procinfo.process_table()
+            for backend in self.live_backends():
+                process = backend.process
+                if process.pid is None:
+                    process.pid = procinfo.find_child(table, PROCESS_MARKER, process.id)
+                if process.pid is None:
+                    continue
+                rss = procinfo.tree_rss(table, process.pid)
+                if rss > self.backend_max_rss:
+                    self.recycle_backend(backend, "rss", f"pid {process.pid} uses {rss >> 20} MB")
+
+    async def reap_session(self, session_id: str, reason: str):
+        """Close a session and end its SSE stream"""
+        session = self.active_sessions.get(session_id)
+        if session is None:
+            return
+        logger.info(f"Reaping session {session_id} ({reason})")
+        self.reaped_sessions += 1
+        SESSIONS_REAPED.inc(reason)
+        session.message_queue.disconnect()
+        await self.cleanup_session(session_id)
+
+    def live_backends(self) -> List[Backend]:
+        """Running backends attached to replicas, sessions or the reuse registry"""
+        backends: Dict[int, Backend] = {}
+        if self.replicas:
+            for backend in self.replicas.replicas:
+                backends[id(backend)] = backend
+        for session in self.active_sessions.values():
+            if session.backend is not None:
+                backends[id(session.backend)] = session.backend
+        if self.registry:
+            for entry in self.registry.entries.values():
+                if entry.backend is not None:
+                    backends[id(entry.backend)] = entry.backend
+        return [b for b in backends.values() if not b.closed and b.process is not None]
+
+    def recycle_backend(self, backend: Backend, reason: str, detail: str = ""):
+        """Restart a backend's process in the background"""
+        if backend in self._recycling or backend.recycling or backend.closed:
+            return
+        logger.info(f"Recycling backend ({reason}) {detail}".rstrip())
+        self.recycled_backends += 1
+        BACKEND_RECYCLES.inc(reason)
+        self._recycling.add(backend)
+        task = asyncio.create_task(self._recycle(backend))
+        self._recycle_tasks.add(task)
+        task.add_done_callback(self._recycle_tasks.discard)
+
+    async def _recycle(self, backend: Backend):
+        try:
+            await backend.recycle()
+            await self.resubscribe(backend)
+        except Exception as e:
+            logger.error(f"Failed to recycle backend: {e}")
+        finally:
+            self._recycling.discard(backend)
+
+    def supervised_backends(self) -> List[Backend]:
+        """The current shared replicas and the old ones still draining after a reload"""
+        sets = ([self.replicas] if self.replicas else []) + self.draining_replicas
+        return [backend for replicas in sets for backend in replicas.replicas]
+
+    async def resubscribe(self, backend: Backend):
+        """Restore the resource subscriptions of a shared backend that got a new process"""
+        if self.router is not None and self.replicas is not None:
+            await self.router.resubscribe(lambda uri: self.replicas.pick(uri) is backend)
+
+    async def reload(self, params: StdioServerParameters) -> bool:
+        """Start new sessions on backends running params, returns False when nothing changed
+
+        Sessions started before keep their backends and are retired once
+        they go idle or the drain deadline passes. Old shared replicas are
+        closed when their last session is gone.
+        """
+        async with self._reload_lock:
+            if self.params is not None and same_params(self.params, params):
+                return False
+            logger.info(f"Reloading backend config: {params.command} {params.args}")
+            old_replicas = None
+            if self.shared_session:
+                replicas = ReplicaSet(params, self.replica_count, factory=self.new_backend)
+                await replicas.start()
+                old_replicas, self.replicas = self.replicas, replicas
+                if old_replicas is not None:
+                    self.draining_replicas.append(old_replicas)
+                self.params = params
+                # Subscriptions are sent to the current replicas, the new ones need all of them
+                if self.router is not None:
+                    await self.router.resubscribe(lambda uri: True)
+            else:
+                # Start one backend before committing, so a bad command fails the reload here
+                backend = self.new_backend(params)
+                await backend.start()
+                old_pool, self.pool = self.pool, None
+                await self.initialize_pool(params)
+                if self.pool is not None:
+                    # The checked backend serves as the first warm one
+                    self.pool.idle.append(backend)
+                else:
+                    self._track_drain(backend.close())
+                if old_pool is not None:
+                    self._track_drain(old_pool.close())
+            self.generation += 1
+            self.reloads += 1
+            self._track_drain(self._drain_generation(self.generation, old_replicas))
+            return True
+
+    def _track_drain(self, coro):
+        task = asyncio.create_task(coro)
+        self._drain_tasks.add(task)
+        task.add_done_callback(self._drain_tasks.discard)
+
+    async def _drain_generation(self, generation: int, replicas: Optional[ReplicaSet]):
+        """Retire the sessions started before generation, then close their replicas"""
+        deadline = time.monotonic() + self.reload_drain_timeout
+        try:
+            while True:
+                old = [s for s in self.active_sessions.values() if s.generation < generation]
+                if not old:
+                    break
+                now = time.monotonic()
+                for session in old:
+                    if now >= deadline or (not session.busy and now - session.last_activity >= self.drain_idle_timeout):
+                        try:
+                            await self.retire_session(session.session_id)
+                        except Exception as e:
+                            logger.error(f"Failed to retire session {session.session_id}: {e}")
+                await asyncio.sleep(min(1.0, max(self.drain_idle_timeout, 0.1)))
+        finally:
+            if replicas is not None:
+                if replicas in self.draining_replicas:
+                    self.draining_replicas.remove(replicas)
+                await replicas.close()
+                logger.info(f"Replicas of config generation {generation - 1} closed")
+
+    async def retire_session(self, session_id: str, flush_timeout: float = 5.0):
+        """End a session gracefully: its stream gets what is already queued, then it is closed"""
+        session = self.active_sessions.get(session_id)
+        if session is None:
+            return
+        logger.info(f"Retiring session {session_id}")
+        self.retired_sessions += 1
+        session.message_queue.finish()
+        deadline = time.monotonic() + flush_timeout
+        while session.cleanup_handle is None and session.message_queue.qsize() and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        await self.cleanup_session(session_id)
+
+    async def drain(self, timeout: float):
+        """Stop accepting sessions, let in-flight requests finish, then retire every session"""
+        self.accepting = False
+        deadline = time.monotonic() + timeout
+        logger.info(f"Draining {len(self.active_sessions)} session(s)")
+        while any(s.busy for s in self.active_sessions.values()) and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        await asyncio.gather(*(
+            self.retire_session(session_id, max(deadline - time.monotonic(), 0.5))
+            for session_id in list(self.active_sessions)
+        ))
+
+    async def stop_draining(self):
+        """Cancel reload drains, closing the replicas they hold"""
+        for task in list(self._drain_tasks):
+            task.cancel()
+        await asyncio.gather(*self._drain_tasks, return_exceptions=True)
+
+    def new_backend(self, params: StdioServerParameters) -> Backend:
+        """Create a backend wired to the proxy-level message hooks"""
+        # Only RSS recycling needs the marker to find the child's pid
+        backend = Backend(params, forward_cancel=self.forward_cancellation, mark_process=bool(self.backend_max_rss))
+        backend.listeners.add(lambda message: self.on_backend_message(backend, message))
+        return backend
+
+    async def on_backend_message(self, backend: Backend, message):
+        """Proxy-level handling of messages from any backend"""
+        if self.cache is not None:
+            self.cache.handle_notification(backend.fingerprint, message)
+        if self.tool_cache is not None:
+            self.tool_cache.handle_notification(backend.fingerprint, message)
+        if self.router is not None:
+            await self.router.route(message)
+
+    async def call_subscription(self, method: str, uri: str):
+        """Send a resources/(un)subscribe for the router to the replica owning uri"""
+        backend = self.replicas.pick(uri) if self.replicas else None
+        if backend is None:
+            raise RuntimeError("MCP session not initialized")
+        handler = METHOD_HANDLERS[method]
+        return await backend.call(lambda client_session: handler(client_session, {"uri": uri}))
+
+    async def spawn_backend(self, params: StdioServerParameters) -> Backend:
+        """Start a new backend, taking a warm one from the pool when possible"""
+        if self.pool is not None and self.pool.matches(params):
+            return await self.pool.acquire()
+        backend = self.new_backend(params)
+        await backend.start()
+        return backend
+
+    async def acquire_backend(self, params: StdioServerParameters) -> Backend:
+        """Get a backend for a session, reusing one with the same fingerprint if enabled"""
+        if self.registry is not None:
+            return await self.registry.acquire(params)
+        return await self.spawn_backend(params)
+
+    async def release_backend(self, backend: Backend):
+        """Release a backend once its session is gone"""
+        if self.registry is not None:
+            await self.registry.release(backend)
+        else:
+            await backend.close()
+
+    def stats(self) -> dict:
+        """Runtime statistics of the proxy"""
+        return {
+            "shared_session": self.shared_session,
+            "active_sessions": len(self.active_sessions),
+            "detached_sessions": sum(1 for s in self.active_sessions.values() if s.cleanup_handle is not None),
+            "reaped_sessions": self.reaped_sessions,
+            "recycled_backends": self.recycled_backends,
+            "relay": self.relay.stats() if self.relay else None,
+            "generation": self.generation,
+            "reloads": self.reloads,
+            "accepting": self.accepting,
+            "retired_sessions": self.retired_sessions,
+            "keepalive": self.keepalive.stats() if self.keepalive else None,
+            "supervisor": self.supervisor.stats() if self.supervisor else None,
+            "router": self.router.stats() if self.router else None,
+            "admission": self.admission.stats() if self.admission else None,
+            "lanes": self.scheduler.stats() if self.scheduler else None,
+            "pool": self.pool.stats() if self.pool else None,
+            "reuse": self.registry.stats() if self.registry else None,
+            "replicas": self.replicas.stats() if self.replicas else None,
+            "cache": self.cache.stats() if self.cache else None,
+            "coalesce": self.coalescer.stats() if self.coalescer else None,
+            "tool_cache": self.tool_cache.stats() if self.tool_cache else None,
+            "queues": {
+                session_id: session.message_queue.stats()
+                for session_id, session in self.active_sessions.items()
+            },
+        }
+
+    def queue_depth(self) -> Dict[Tuple[str, ...], int]:
+        """Total and largest outbound queue depth, sampled at scrape time"""
+        depths = [session.message_queue.qsize() for session in self.active_sessions.values()]
+        return {("total",): sum(depths), ("max",): max(depths, default=0)}
+
     def validate_server_key(self, auth_key: Optional[str], required_key: Optional[str]) -> Tuple[bool, Optional[JSONResponse]]:
         """Validate server key"""
         if required_key is not None:
@@ -215,98 +761,454 @@ class MCPProxy:
             env=new_env
         )
 
-    async def create_session(self, session_id: str, params: StdioServerParameters) -> SSESession:
-        """Create a new session"""
-        session = SSESession(session_id, params)
+    def new_session_id(self) -> str:
+        """New session id, tagged with this worker's id when requests are relayed between workers"""
+        return self.relay.new_session_id() if self.relay else str(uuid.uuid4())
+
+    async def create_session(self, session_id: str, params: StdioServerParameters, auth_key: str = "") -> SSESession:
+        """Create a new session, raises LimitExceeded when auth_key has too many sessions"""
+        if self.admission is not None:
+            self.admission.open_session(auth_key, session_id)
+        session = SSESession(
+            session_id,
+            params,
+            self.max_inflight,
+            OutboundQueue(self.queue_max_messages, self.queue_max_bytes, self.queue_policy),
+            self.replay_size
+        )
+        session.auth_key = auth_key
+        session.generation = self.generation
+        session.replicas = self.replicas
         self.active_sessions[session_id] = session
         
         if not self.shared_session:
-            try:
-                await session.initialize_client()
-            except Exception as e:
-                logger.error(f"Failed to initialize client session: {e}")
-                raise
+            # Stream the endpoint event right away, POSTs wait for the backend
+            session.start_client(self.acquire_backend, self.release_backend)
         
         return session
 
+    async def detach_session(self, session_id: str):
+        """Handle a dropped SSE stream, keeping the session resumable for the grace period"""
+        session = self.active_sessions.get(session_id)
+        if session is None:
+            return
+        if self.resume_grace <= 0 or session.closed or session.message_queue.disconnected \
+                or session.message_queue.finishing:
+            await self.cleanup_session(session_id)
+            return
+        logger.info(f"Session {session_id} detached, cleanup in {self.resume_grace}s unless resumed")
+        session.cleanup_handle = asyncio.get_running_loop().call_later(
+            self.resume_grace,
+            lambda: asyncio.ensure_future(self.cleanup_session(session_id))
+        )
+
+    def resume_session(self, last_event_id: str) -> Optional[Tuple[SSESession, int]]:
+        """Find the session a Last-Event-ID belongs to, returns it with the last event number seen"""
+        session_id, _, event_id = last_event_id.rpartition(":")
+        session = self.active_sessions.get(session_id)
+        if session is None or session.closed or not event_id.isdigit():
+            return None
+        if session.cleanup_handle is not None:
+            session.cleanup_handle.cancel()
+            session.cleanup_handle = None
+        return session, int(event_id)
+
     async def cleanup_session(self, session_id: str):
         """Cleanup session"""
         if session_id in self.active_sessions:
             session = self.active_sessions[session_id]
-            await session.close()
-            del self.active_sessions[session_id]
+            if session.cleanup_handle is not None:
+                session.cleanup_handle.cancel()
+                session.cleanup_handle = None
+            await session.close(self.release_backend)
+            # Another cleanup may have finished while this one was closing the session
+            if self.active_sessions.pop(session_id, None) is None:
+                return
+            if self.tool_cache is not None:
+                self.tool_cache.drop_session(session_id)
+            if self.admission is not None:
+                self.admission.close_session(session.auth_key, session_id)
+            if self.router is not None:
+                self.router.drop_session(session_id)
             logger.info(f"Session {session_id} removed from active sessions")
 
+    async def cleanup_sessions(self):
+        """Cleanup all sessions, including detached ones waiting to be resumed"""
+        for session_id in list(self.active_sessions):
+            await self.cleanup_session(session_id)
+
+    def select_backend(self, session: SSESession, method: str, params: dict) -> Optional[Backend]:
+        """Pick the backend serving a request"""
+        if not self.shared_session:
+            return session.backend
+        sticky_param = STICKY_METHODS.get(method)
+        sticky_key = str(params.get(sticky_param)) if sticky_param else None
+        replicas = self.session_replicas(session)
+        return replicas.pick(sticky_key) if replicas else None
+
+    def session_replicas(self, session: SSESession) -> Optional[ReplicaSet]:
+        """Shared replicas of the config generation a session started on"""
+        return session.replicas or self.replicas
+
+    def cache_scope(self, session: SSESession) -> str:
+        """Identity of the backend configuration serving a session"""
+        if self.shared_session:
+            replicas = self.session_replicas(session)
+            return replicas.fingerprint if replicas else ""
+        return session.backend.fingerprint if session.backend else fingerprint(session.params)
+
+    def initialize_response(self, session: SSESession) -> Optional[dict]:
+        """Normalized initialize result of the backend serving a session, computed once per backend"""
+        if self.shared_session:
+            replicas = self.session_replicas(session)
+            backend = replicas.pick() if replicas else None
+        else:
+            backend = session.backend
+        if backend is None or backend.initialize_result is None:
+            return None
+        if backend.initialize_response is None:
+            backend.initialize_response = normalize_initialize_result(backend.initialize_result.model_dump())
+        return backend.initialize_response
+
+    def deadline(self, method: str, params: dict) -> float:
+        """Timeout in seconds for a request, 0 for none"""
+        if method == "tools/call" and params.get("name") in self.tool_timeouts:
+            return self.tool_timeouts[params.get("name")]
+        return self.method_timeouts.get(method, self.request_timeout)
+
+    async def call_ready(self, session: SSESession, method: str, params: dict):
+        """Run call_timed once the session's dedicated backend is up, starting it again if it failed"""
+        if not self.shared_session:
+            session.start_client(self.acquire_backend, self.release_backend)
+            try:
+                await session.wait_ready()
+            except Exception as e:
+                raise RuntimeError(f"Failed to start MCP server: {e}") from e
+        return await self.call_timed(session, method, params)
+
+    async def call_timed(self, session: SSESession, method: str, params: dict):
+        """Run call_method under its deadline, recording its latency split into proxy overhead and upstream time"""
+        started = time.perf_counter()
+        upstream = [0.0]
+        token = _upstream_time.set(upstream)
+        REQUESTS_IN_FLIGHT.inc(method)
+        session.active_requests += 1
+        timeout = self.deadline(method, params)
+        try:
+            if timeout > 0:
+                return await asyncio.wait_for(self.call_method(session, method, params), timeout)
+            return await self.call_method(session, method, params)
+        finally:
+            session.active_requests -= 1
+            REQUESTS_IN_FLIGHT.dec(method)
+            _upstream_time.reset(token)
+            elapsed = time.perf_counter() - started
+            REQUEST_DURATION.observe(elapsed, method)
+            PROXY_OVERHEAD.observe(max(elapsed - upstream[0], 0.0), method)
+
+    async def call_method(self, session: SSESession, method: str, params: dict):
+        """Forward a method call to the backend, answering from the cache when possible"""
+        if method == "initialize":
+            # The backend handshake already ran when it was spawned
+            resp = self.initialize_response(session)
+            if resp is not None:
+                return resp
+
+        if method in ("resources/subscribe", "resources/unsubscribe") and self.router is not None:
+            # Subscriptions to the shared backend are reference counted across sessions
+            uri = str(params.get("uri"))
+            if method == "resources/subscribe":
+                await self.router.subscribe(session.session_id, uri)
+            else:
+                await self.router.unsubscribe(session.session_id, uri)
+            return {}
+
+        if method == "tools/call" and self.tool_cache is not None and self.tool_cache.cacheable(params):
+            return await self.call_tool_cached(session, params)
+
+        if self.cache is None or not self.cache.cacheable(method):
+            return await self.call_coalesced(session, method, params)
+
+        scope = self.cache_scope(session)
+        key = self.cache.key(scope, method, params)
+        resp = self.cache.get(key)
+        if resp is not None:
+            return resp
+        generation = self.cache.generation(scope)
+        resp = await self.call_coalesced(session, method, params)
+        self.cache.put(key, resp, generation)
+        return resp
+
+    async def call_tool_cached(self, session: SSESession, params: dict):
+        """Serve an allow-listed tool call from the tool result cache
+
+        A request with params._meta.noCache set skips the lookup and refreshes the entry.
+        """
+        key = self.tool_cache.key(self.cache_scope(session), session.session_id, params)
+        meta = params.get("_meta") or {}
+        if not meta.get("noCache"):
+            resp = self.tool_cache.get(key)
+            if resp is not None:
+                return resp
+        resp = await self.call_coalesced(session, "tools/call", params)
+        self.tool_cache.put(key, resp)
+        return resp
+
+    async def call_coalesced(self, session: SSESession, method: str, params: dict):
+        """Share one upstream call between identical concurrent requests to the same backend"""
+        started = time.perf_counter()
+        try:
+            if self.coalescer is None or not self.coalescer.coalescable(method, params):
+                return await self.call_backend(session, method, params)
+            # Shared replicas are interchangeable, dedicated backends are not
+            replicas = self.session_replicas(session) if self.shared_session else None
+            target = replicas.fingerprint if replicas else id(session.backend)
+            key = (target, method, canonical_params(params))
+            return await self.coalescer.do(key, lambda: self.call_backend(session, method, params))
+        finally:
+            upstream = _upstream_time.get()
+            if upstream is not None:
+                upstream[0] += time.perf_counter() - started
+
+    async def call_backend(self, session: SSESession, method: str, params: dict):
+        """Forward a method call to the backend and normalize the result"""
+        backend = self.select_backend(session, method, params)
+        if backend is None:
+            raise RuntimeError("MCP session not initialized")
+        handler = METHOD_HANDLERS[method]
+        progress_token = None
+        if self.router is not None:
+            progress_token, params = self.router.track_progress(session.session_id, params)
+        # Safe to send again if the process fails over before answering
+        retry = method in RETRYABLE_METHODS
+        # A shared backend keeps serving other sessions, closing this one must not cancel upstream
+        forward_cancel = (lambda: not session.closed) if self.shared_session else None
+        started = time.perf_counter()
+        try:
+            # The backend slot is taken inside the lane, calls queued behind their lane hold none
+            async with self.scheduler.slot(backend, method) if self.scheduler is not None else nullcontext():
+                slot = await self.admission.acquire_backend(backend) if self.admission is not None else None
+                try:
+                    resp = await backend.call(lambda client_session: handler(client_session, params), retry, forward_cancel)
+                finally:
+                    if slot is not None:
+                        slot.release()
+        finally:
+            if self.router is not None:
+                self.router.untrack_progress(progress_token)
+            BACKEND_DURATION.observe(time.perf_counter() - started, method)
+            if self.backend_max_requests and backend.process.requests >= self.backend_max_requests:
+                self.recycle_backend(backend, "requests")
+        # Results passed through unchanged are encoded to JSON once, straight from the model
+        if method not in LIST_METHODS and method != "initialize" and hasattr(resp, "__pydantic_serializer__"):
+            return dump_model(resp)
+
+        # 使用 model_dump() 序列化 Pydantic 模型
+        if hasattr(resp, 'model_dump'):
+            resp = resp.model_dump()
+        
+        if method == "initialize" and isinstance(resp, dict):
+            resp = normalize_initialize_result(resp)
+        
+        # Ensure nextCursor is a string in list responses
+        if method in LIST_METHODS and isinstance(resp, dict):
+            if resp.get("nextCursor") is None:
+                resp["nextCursor"] = ""
+        
+        return resp
+
+    async def dispatch(self, session: SSESession, method: str, params: dict, id):
+        """Run a method call in the background and push the result or error to the SSE queue"""
+        started = time.perf_counter()
+        status, size = "ok", None
+        try:
+            resp = await self.call_ready(session, method, params)
+            body = encode_response(resp, id)
+            size = len(body)
+            await session.send_message(body)
+        except asyncio.CancelledError:
+            status = "cancelled"
+            raise
+        except asyncio.TimeoutError:
+            status = "timeout"
+            await session.send_message(timeout_response(method, self.deadline(method, params), id))
+        except LimitExceeded as e:
+            status = "rejected"
+            await session.send_message(limit_error(e, id))
+        except TypeError as e:
+            status = "error"
+            await session.send_message(error_response(INVALID_PARAMS, str(e), id))
+        except Exception as e:
+            status = "error"
+            logger.error(f"Error processing method {method}: {e}")
+            await session.send_message(error_response(INTERNAL_ERROR, str(e), id))
+        finally:
+            log_access(method, session.session_id, id, status, time.perf_counter() - started, size)
+
+    def handle_client_notification(self, session: SSESession, method: str, params: dict):
+        """Act on notifications sent by the client, the rest are acknowledged and dropped"""
+        if method == "notifications/cancelled":
+            request_id = params.get("requestId")
+            if session.cancel_call(request_id):
+                REQUESTS_CANCELLED.inc("client")
+                logger.info(f"Cancelled request {request_id} of session {session.session_id}: {params.get('reason')}")
+
+    async def route_message(self, session_id: str, data: dict) -> Response:
+        """Handle a POST locally or relay it to the worker that owns the session"""
+        if self.relay is not None and session_id not in self.active_sessions and not self.relay.owns(session_id):
+            if not self.relay.valid(session_id):
+                return JSONResponse(error_response(SERVER_ERROR_START, "Invalid session", None), status_code=404)
+            # The owning worker enforces the request deadline, allow a little extra for the relay
+            params = data.get("params") if isinstance(data, dict) else None
+            deadline = self.deadline(data.get("method"), params) if isinstance(params, dict) else self.request_timeout
+            try:
+                result = await self.relay.forward(session_id, data, deadline + RELAY_GRACE if deadline else None)
+            except RelayError as e:
+                logger.error(str(e))
+                id = data.get("id") if isinstance(data, dict) else None
+                return JSONResponse(error_response(INTERNAL_ERROR, str(e), id), status_code=502)
+            if result is not None:
+                status, body = result
+                return Response(body, status_code=status, media_type="application/json")
+        return await self.handle_message(session_id, data)
+
+    async def handle_forwarded(self, session_id: str, data: dict) -> Tuple[int, bytes]:
+        """Handle a POST relayed from another worker"""
+        response = await self.handle_message(session_id, data)
+        return response.status_code, response.body
+
     async def handle_message(self, session_id: str, data: dict) -> JSONResponse:
         """Handle JSON-RPC 2.0 messages"""
         try:
             if session_id not in self.active_sessions:
-                return JSONResponse(create_error_response(SERVER_ERROR_START, "Invalid session", None))
+                return JSONResponse(error_response(SERVER_ERROR_START, "Invalid session", None))
                 
             session = self.active_sessions[session_id]
-            
-            if not session.is_initialized:
-                await session.initialize_client()
-
-            client_session = self.global_client_session if self.shared_session else session.client_session
-            if not client_session:
-                return JSONResponse(create_error_response(INTERNAL_ERROR, "MCP session not initialized"))
+            session.last_activity = time.monotonic()
 
             # Validate JSON-RPC request
-            is_valid, error_response = validate_request(data)
+            is_valid, validation_error = validate_request(data)
             if not is_valid:
-                return JSONResponse(error_response)
+                ERRORS.inc(str(validation_error["error"]["code"]))
+                return JSONResponse(validation_error)
 
             method = data.get("method")
-            params = data.get("params", {})
+            # An explicit "params": null means no params
+            params = data.get("params") or {}
             id = data.get("id")
 
+            if id is None and method.startswith("notifications/"):
+                self.handle_client_notification(session, method, params)
+                return Response(status_code=202)
+
+            handler = METHOD_HANDLERS.get(method)
+            if not handler:
+                return JSONResponse(error_response(METHOD_NOT_FOUND, f"Method '{method}' not found", id))
+
+            started = time.perf_counter()
+            release = None
+            if self.admission is not None:
+                try:
+                    release = await self.admission.admit(session.auth_key, session_id)
+                except LimitExceeded as e:
+                    log_access(method, session_id, id, "rejected", time.perf_counter() - started)
+                    return limit_response(e, id)
+
+            if not self.shared_session:
+                # Requests wait for the dedicated backend in their own task, after being acknowledged
+                session.start_client(self.acquire_backend, self.release_backend)
+
+            if self.async_dispatch:
+                task = session.start_task(self.dispatch(session, method, params, id))
+                if task is None:
+                    if release is not None:
+                        release()
+                    return JSONResponse(
+                        error_response(SERVER_ERROR_START, "Too many in-flight requests", id),
+                        status_code=429
+                    )
+                session.track_call(id, task)
+                if release is not None:
+                    task.add_done_callback(lambda _: release())
+                return JSONResponse(create_success_response("accepted", id), status_code=202)
+
+            # Run the call as its own task so notifications/cancelled can stop it
+            task = asyncio.ensure_future(self.call_ready(session, method, params))
+            session.track_call(id, task)
+            if release is not None:
+                task.add_done_callback(lambda _: release())
+            status, size = "cancelled", None
             try:
-                handler = METHOD_HANDLERS.get(method)
-                if not handler:
-                    return JSONResponse(create_error_response(METHOD_NOT_FOUND, f"Method '{method}' not found", id))
-
-                resp = await handler(client_session, params)
-                # 使用 model_dump() 序列化 Pydantic 模型
-                if hasattr(resp, 'model_dump'):
-                    resp = resp.model_dump()
-                
-                # Ensure capabilities have the correct structure for initialize response
-                if method == "initialize" and isinstance(resp, dict):
-                    if "capabilities" in resp:
-                        capabilities = resp["capabilities"]
-                        if capabilities.get("experimental") is None:
-                            capabilities["experimental"] = {}
-                        if capabilities.get("logging") is None:
-                            capabilities["logging"] = {}
-                        if capabilities.get("prompts") is None:
-                            capabilities["prompts"] = {}
-                        if capabilities.get("resources") is None:
-                            capabilities["resources"] = {}
-                        if "tools" in capabilities and capabilities["tools"].get("listChanged") is None:
-                            capabilities["tools"]["listChanged"] = False
-                        if resp.get("instructions") is None:
-                            resp["instructions"] = ""
-                
-                # Ensure nextCursor is a string in list responses
-                if method in ["tools/list", "prompts/list", "resources/list", "resources/templates/list"] and isinstance(resp, dict):
-                    if resp.get("nextCursor") is None:
-                        resp["nextCursor"] = ""
-                
-                await session.send_message(create_success_response(resp, id))
-                return JSONResponse(create_success_response("ok", id))
+                try:
+                    await asyncio.wait({task})
+                except asyncio.CancelledError:
+                    task.cancel()
+                    raise
+                if task.cancelled():
+                    return JSONResponse(create_success_response("cancelled", id))
 
-            except TypeError as e:
-                return JSONResponse(create_error_response(INVALID_PARAMS, str(e), id))
-            except Exception as e:
-                logger.error(f"Error processing method {method}: {e}")
-                return JSONResponse(create_error_response(INTERNAL_ERROR, str(e), id))
+                try:
+                    resp = task.result()
+                    body = encode_response(resp, id)
+                    status, size = "ok", len(body)
+                    await session.send_message(body)
+                    return JSONResponse(create_success_response("ok", id))
+
+                except asyncio.TimeoutError:
+                    status = "timeout"
+                    return JSONResponse(timeout_response(method, self.deadline(method, params), id))
+                except LimitExceeded as e:
+                    status = "rejected"
+                    return limit_response(e, id)
+                except TypeError as e:
+                    status = "error"
+                    return JSONResponse(error_response(INVALID_PARAMS, str(e), id))
+                except Exception as e:
+                    status = "error"
+                    logger.error(f"Error processing method {method}: {e}")
+                    return JSONResponse(error_response(INTERNAL_ERROR, str(e), id))
+            finally:
+                log_access(method, session_id, id, status, time.perf_counter() - started, size)
                 
         except json.JSONDecodeError:
-            return JSONResponse(create_error_response(PARSE_ERROR, "Parse error"))
+            return JSONResponse(error_response(PARSE_ERROR, "Parse error"))
         except Exception as e:
             logger.error(f"Error handling message: {e}")
-            return JSONResponse(create_error_response(INTERNAL_ERROR, str(e), data.get("id") if isinstance(data, dict) else None))
+            return JSONResponse(error_response(INTERNAL_ERROR, str(e), data.get("id") if isinstance(data, dict) else None))
+
+def error_response(code: int, message: str, id=None, data=None) -> dict:
+    """Create a JSON-RPC error response and count it by code"""
+    ERRORS.inc(str(code))
+    return create_error_response(code, message, id, data)
+
+def timeout_response(method: str, timeout: float, id) -> dict:
+    """Error response for a request that ran past its deadline"""
+    return error_response(TIMEOUT_ERROR, f"Request '{method}' timed out after {timeout:g}s", id)
+
+def limit_error(e: LimitExceeded, id) -> dict:
+    """Error response for a request rejected by admission control, with its retry hint"""
+    return error_response(LIMIT_EXCEEDED, str(e), id, e.data)
+
+def limit_response(e: LimitExceeded, id) -> JSONResponse:
+    return JSONResponse(limit_error(e, id), status_code=429, headers={"Retry-After": e.retry_after_header})
+
+def normalize_initialize_result(resp: dict) -> dict:
+    """Ensure capabilities have the correct structure for initialize response"""
+    if "capabilities" in resp:
+        capabilities = resp["capabilities"]
+        if capabilities.get("experimental") is None:
+            capabilities["experimental"] = {}
+        if capabilities.get("logging") is None:
+            capabilities["logging"] = {}
+        if capabilities.get("prompts") is None:
+            capabilities["prompts"] = {}
+        if capabilities.get("resources") is None:
+            capabilities["resources"] = {}
+        if "tools" in capabilities and capabilities["tools"].get("listChanged") is None:
+            capabilities["tools"]["listChanged"] = False
+        if resp.get("instructions") is None:
+            resp["instructions"] = ""
+    return resp
 
 def serialize_result(result):
     """Serialize result to JSON-compatible format"""
@@ -323,11 +1225,35 @@ def serialize_result(result):
     else:
         return str(result)
 
+def call_tool(session: ClientSession, params: dict):
+    """tools/call, passing on _meta so the backend sees the progress token"""
+    meta = params.get("_meta")
+    if not meta:
+        return session.call_tool(params.get("name"), params.get("arguments"))
+    return session.send_request(
+        types.ClientRequest(types.CallToolRequest(
+            method="tools/call",
+            params=types.CallToolRequestParams(name=params.get("name"), arguments=params.get("arguments"), _meta=meta)
+        )),
+        types.CallToolResult
+    )
+
+# List methods whose nextCursor is normalized
+LIST_METHODS = ("tools/list", "prompts/list", "resources/list", "resources/templates/list")
+RETRYABLE_METHODS = LIST_METHODS + ("initialize", "ping", "resources/read", "prompts/get")
+
+# Stateful methods routed to a fixed replica, keyed by the named param
+STICKY_METHODS = {
+    "resources/subscribe": "uri",
+    "resources/unsubscribe": "uri",
+}
+
 # Predefined method handlers mapping
 METHOD_HANDLERS = {
     "initialize": lambda session, params: session.initialize(),
+    "ping": lambda session, params: session.send_ping(),
     "tools/list": lambda session, params: session.list_tools(),
-    "tools/call": lambda session, params: session.call_tool(params.get("name"), params.get("arguments")),
+    "tools/call": lambda session, params: call_tool(session, params),
     "prompts/list": lambda session, params: session.list_prompts(),
     "prompts/get": lambda session, params: session.get_prompt(params.get("name"), params.get("arguments")),
     "resources/list": lambda session, params: session.list_resources(),
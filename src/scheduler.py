@@ -0,0 +1,92 @@
+import time
+import asyncio
+import weakref
+from contextlib import asynccontextmanager
+from typing import Dict
+
+from metrics import LANE_WAIT
+
+METADATA = "metadata"
+READ = "read"
+TOOL = "tool"
+LANES = (METADATA, READ, TOOL)
+
+READ_METHODS = {"resources/read", "prompts/get"}
+
+
+def lane_of(method: str) -> str:
+    """Lane a backend call is scheduled in"""
+    if method == "tools/call":
+        return TOOL
+    if method in READ_METHODS:
+        return READ
+    return METADATA
+
+
+class _Lane:
+    def __init__(self, limit: int):
+        self.semaphore = asyncio.Semaphore(limit) if limit > 0 else None
+        self.active = 0
+        self.waiting = 0
+
+
+class LaneScheduler:
+    """Per-backend concurrency lanes for metadata, read and tool calls
+
+    Each lane has its own cap on calls in flight to a backend, so a flood
+    of slow tool calls only queues behind other tool calls while list and
+    read requests keep their own slots. A limit of 0 leaves a lane
+    unbounded.
+    """
+
+    def __init__(self, limits: Dict[str, int]):
+        unknown = set(limits) - set(LANES)
+        if unknown:
+            raise ValueError(f"Unknown scheduler lanes: {sorted(unknown)}")
+        self.limits = {lane: limits.get(lane, 0) for lane in LANES}
+        self.backends: "weakref.WeakKeyDictionary[object, Dict[str, _Lane]]" = weakref.WeakKeyDictionary()
+        self.waited: Dict[str, float] = {lane: 0.0 for lane in LANES}
+        self.scheduled: Dict[str, int] = {lane: 0 for lane in LANES}
+
+    def _lane(self, backend, lane: str) -> _Lane:
+        lanes = self.backends.get(backend)
+        if lanes is None:
+            lanes = self.backends[backend] = {name: _Lane(limit) for name, limit in self.limits.items()}
+        return lanes[lane]
+
+    @asynccontextmanager
+    async def slot(self, backend, method: str):
+        """Hold a slot of the method's lane on backend for the duration of the call"""
+        name = lane_of(method)
+        lane = self._lane(backend, name)
+        started = time.perf_counter()
+        if lane.semaphore is not None:
+            lane.waiting += 1
+            try:
+                await lane.semaphore.acquire()
+            finally:
+                lane.waiting -= 1
+        waited = time.perf_counter() - started
+        LANE_WAIT.observe(waited, name)
+        self.waited[name] += waited
+        self.scheduled[name] += 1
+        lane.active += 1
+        try:
+            yield
+        finally:
+            lane.active -= 1
+            if lane.semaphore is not None:
+                lane.semaphore.release()
+
+    def stats(self) -> dict:
+        lanes = list(self.backends.values())
+        return {
+            name: {
+                "limit": self.limits[name],
+                "active": sum(b[name].active for b in lanes),
+                "waiting": sum(b[name].waiting for b in lanes),
+                "scheduled": self.scheduled[name],
+                "avg_wait": round(self.waited[name] / self.scheduled[name], 4) if self.scheduled[name] else 0.0,
+            }
+            for name in LANES
+        }
@@ -0,0 +1,60 @@
+import json
+from typing import Any
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class RawJSON:
+    """Result already encoded as JSON, spliced into the response envelope as is"""
+
+    __slots__ = ("data", "is_error")
+
+    def __init__(self, data: bytes, is_error: bool = False):
+        self.data = data
+        self.is_error = is_error
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+
+def dumps(obj: Any) -> bytes:
+    """Encode obj as compact JSON bytes, with orjson when it is installed"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, default=_default)
+        except TypeError:
+            # orjson rejects ints over 64 bits and non-str dict keys
+            pass
+    return json.dumps(obj, separators=(",", ":"), default=_default).encode()
+
+
+def _default(obj: Any) -> str:
+    return str(obj)
+
+
+def dump_model(model) -> RawJSON:
+    """Encode a Pydantic result straight to JSON bytes, skipping the intermediate JSON string"""
+    is_error = bool(getattr(model, "isError", False))
+    if orjson is not None:
+        # model_dump() shares the model's strings, so this copies the payload only once
+        return RawJSON(dumps(model.model_dump()), is_error)
+    # Same output as model_dump(), without the decode/encode round trip of model_dump_json()
+    return RawJSON(model.__pydantic_serializer__.to_json(model, by_alias=False), is_error)
+
+
+def encode_response(result: Any, id: Any) -> bytes:
+    """Encode a JSON-RPC success response, splicing in a pre-encoded result"""
+    if isinstance(result, RawJSON):
+        # A single join copies the payload once, chained + would copy it per operand
+        return b"".join((b'{"jsonrpc":"2.0","result":', result.data, b',"id":', dumps(id), b"}"))
+    return dumps({"jsonrpc": "2.0", "result": result, "id": id})
+
+
+def encoded_size(value: Any) -> int:
+    """Size in bytes of value encoded as JSON"""
+    if isinstance(value, RawJSON):
+        return len(value.data)
+    return len(dumps(value))
@@ -0,0 +1,234 @@
+import time
+import asyncio
+import logging
+from typing import Callable, Dict, List, Optional, Set
+
+from backend import same_params
+from config import ServerConfig
+from proxy import MCPProxy
+
+logger = logging.getLogger(__name__)
+
+
+class UnknownServer(KeyError):
+    """No server with this name is configured"""
+
+
+class _Entry:
+    def __init__(self, config: ServerConfig):
+        self.config = config
+        self.proxy: Optional[MCPProxy] = None
+        self.starting: Optional[asyncio.Task] = None
+        # When the server was last seen without sessions, None while it has some
+        self.idle_since: Optional[float] = None
+        self.starts = 0
+        self.stops = 0
+        self.lock = asyncio.Lock()
+
+
+class ServerCatalog:
+    """Named MCP servers hosted by one process
+
+    Each server gets its own MCPProxy, created and started on first use.
+    Concurrent first requests share one start. A server without sessions
+    for its idle_timeout is stopped, and started again when it is next
+    used.
+    """
+
+    def __init__(
+        self,
+        configs: Dict[str, ServerConfig],
+        factory: Callable[[ServerConfig], MCPProxy],
+        check_interval: float = 30.0
+    ):
+        self.entries: Dict[str, _Entry] = {name: _Entry(config) for name, config in configs.items()}
+        self.factory = factory
+        self.check_interval = check_interval
+        # Proxies replaced by a reload, draining their sessions before they stop
+        self.retiring: Dict[str, List[MCPProxy]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._stop_tasks: Set[asyncio.Task] = set()
+
+    def _entry(self, name: str) -> _Entry:
+        entry = self.entries.get(name)
+        if entry is None:
+            raise UnknownServer(name)
+        return entry
+
+    async def get(self, name: str) -> MCPProxy:
+        """The proxy of a server, starting it if it is not running"""
+        entry = self._entry(name)
+        entry.idle_since = None
+        if entry.proxy is not None:
+            return entry.proxy
+        if entry.starting is None:
+            entry.starting = asyncio.create_task(self._start(entry))
+        try:
+            return await asyncio.shield(entry.starting)
+        finally:
+            if entry.starting is not None and entry.starting.done():
+                entry.starting = None
+
+    def find(self, name: str, session_id: Optional[str] = None) -> Optional[MCPProxy]:
+        """The running proxy of a server, or the retiring one still holding session_id"""
+        entry = self.entries.get(name)
+        retiring = self.retiring.get(name, ())
+        if entry is None and not retiring:
+            raise UnknownServer(name)
+        if entry is not None and entry.proxy is not None and session_id in entry.proxy.active_sessions:
+            return entry.proxy
+        for proxy in retiring:
+            if session_id in proxy.active_sessions:
+                return proxy
+        return entry.proxy if entry is not None else None
+
+    def running(self) -> List[MCPProxy]:
+        return [entry.proxy for entry in self.entries.values() if entry.proxy is not None]
+
+    async def _start(self, entry: _Entry) -> MCPProxy:
+        async with entry.lock:
+            if entry.proxy is not None:
+                return entry.proxy
+            config = entry.config
+            logger.info(f"Starting server {config.name}: {config.params.command} {config.params.args}")
+            proxy = self.factory(config)
+            try:
+                await proxy.start(config.params)
+            except BaseException:
+                await proxy.stop()
+                raise
+            entry.proxy = proxy
+            entry.starts += 1
+            entry.idle_since = time.monotonic()
+            return proxy
+
+    async def _stop(self, entry: _Entry, reason: str, if_idle: bool = False):
+        async with entry.lock:
+            # A session may have started since the idle check
+            if if_idle and (entry.idle_since is None or entry.proxy is None or entry.proxy.active_sessions):
+                return
+            proxy, entry.proxy = entry.proxy, None
+            if proxy is None:
+                return
+            logger.info(f"Stopping server {entry.config.name} ({reason})")
+            entry.idle_since = None
+            entry.stops += 1
+            await proxy.stop()
+
+    async def start(self):
+        """Start the idle check, servers themselves start on first use"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the idle check and every running server"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        for task in list(self._stop_tasks):
+            task.cancel()
+        await asyncio.gather(*self._stop_tasks, return_exceptions=True)
+        for name, proxies in list(self.retiring.items()):
+            for proxy in proxies:
+                await proxy.stop()
+        self.retiring.clear()
+        for entry in self.entries.values():
+            if entry.starting is not None:
+                entry.starting.cancel()
+            await self._stop(entry, "shutdown")
+
+    async def drain(self, timeout: float):
+        """Drain every running server, see MCPProxy.drain"""
+        proxies = self.running() + [proxy for retiring in self.retiring.values() for proxy in retiring]
+        await asyncio.gather(*(proxy.drain(timeout) for proxy in proxies))
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.check_interval)
+            try:
+                await self.stop_idle()
+            except Exception as e:
+                logger.error(f"Idle server check failed: {e}", exc_info=True)
+
+    async def stop_idle(self):
+        """Stop the servers that had no session for their idle timeout"""
+        now = time.monotonic()
+        for entry in self.entries.values():
+            proxy = entry.proxy
+            if proxy is None or entry.config.idle_timeout <= 0:
+                continue
+            if proxy.active_sessions:
+                entry.idle_since = None
+            elif entry.idle_since is None:
+                entry.idle_since = now
+            elif now - entry.idle_since >= entry.config.idle_timeout:
+                await self._stop(entry, "idle", if_idle=True)
+
+    async def reload(self, configs: Dict[str, ServerConfig]) -> Dict[str, str]:
+        """Apply a new catalog, returns what happened to each changed server
+
+        Running servers with a new command, args or env reload in place,
+        a change of session mode or removal stops them after draining.
+        """
+        changes = {}
+        for name, entry in list(self.entries.items()):
+            config = configs.get(name)
+            if config is None:
+                del self.entries[name]
+                self._retire(name, entry, "removed")
+                changes[name] = "removed"
+            elif config != entry.config:
+                old, entry.config = entry.config, config
+                if entry.proxy is None:
+                    changes[name] = "updated"
+                elif old.shared_session != config.shared_session:
+                    # The session mode of a running proxy cannot change
+                    self._retire(name, entry, "session mode changed")
+                    changes[name] = "restarted"
+                elif not same_params(old.params, config.params):
+                    await entry.proxy.reload(config.params)
+                    changes[name] = "reloaded"
+        for name, config in configs.items():
+            if name not in self.entries:
+                self.entries[name] = _Entry(config)
+                changes[name] = "added"
+        return changes
+
+    def _retire(self, name: str, entry: _Entry, reason: str):
+        """Take the running proxy out of the catalog and stop it once its sessions drained"""
+        proxy, entry.proxy = entry.proxy, None
+        if proxy is None:
+            return
+        logger.info(f"Retiring server {name} ({reason})")
+        entry.stops += 1
+        self.retiring.setdefault(name, []).append(proxy)
+
+        async def retire():
+            try:
+                await proxy.drain(proxy.reload_drain_timeout)
+                await proxy.stop()
+            finally:
+                proxies = self.retiring.get(name, [])
+                if proxy in proxies:
+                    proxies.remove(proxy)
+                if not proxies:
+                    self.retiring.pop(name, None)
+
+        task = asyncio.create_task(retire())
+        self._stop_tasks.add(task)
+        task.add_done_callback(self._stop_tasks.discard)
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        return {
+            name: {
+                "running": entry.proxy is not None,
+                "shared_session": entry.config.shared_session,
+                "sessions": len(entry.proxy.active_sessions) if entry.proxy else 0,
+                "idle_for": round(now - entry.idle_since, 1) if entry.proxy and entry.idle_since else 0,
+                "starts": entry.starts,
+                "stops": entry.stops,
+            }
+            for name, entry in self.entries.items()
+        }
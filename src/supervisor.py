@@ -0,0 +1,174 @@
+import time
+import asyncio
+import logging
+import weakref
+from typing import Awaitable, Callable, List, Optional, Set
+
+from backend import Backend
+from metrics import BACKEND_FAILOVERS
+
+logger = logging.getLogger(__name__)
+
+
+class _Health:
+    def __init__(self):
+        self.failures = 0
+        self.restarts = 0
+        self.retry_at = 0.0
+        self.standby_failures = 0
+        self.standby_retry_at = 0.0
+        self.standby_task: Optional[asyncio.Task] = None
+
+
+class Supervisor:
+    """Watches the shared backends and fails over the ones that stop answering
+
+    Every interval each backend is checked: a process whose stdout closed is
+    dead right away, a live one must answer an MCP ping within timeout, and
+    failures consecutive missed pings mark it unresponsive. The replacement
+    is the hot standby when one is kept, otherwise a freshly spawned process.
+    Repeated restarts of the same backend back off exponentially from
+    backoff_initial up to backoff_max, until it passes a health check again.
+    """
+
+    def __init__(
+        self,
+        backends: Callable[[], List[Backend]],
+        interval: float = 5.0,
+        timeout: float = 5.0,
+        failures: int = 2,
+        standby: bool = False,
+        backoff_initial: float = 0.5,
+        backoff_max: float = 30.0,
+        on_failover: Optional[Callable[[Backend], Awaitable[None]]] = None
+    ):
+        self.backends = backends
+        self.interval = interval
+        self.timeout = timeout
+        self.failures = max(failures, 1)
+        self.standby = standby
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self.on_failover = on_failover
+        self.health: "weakref.WeakKeyDictionary[Backend, _Health]" = weakref.WeakKeyDictionary()
+        self.checks = 0
+        self.failed_checks = 0
+        self.failovers = 0
+        self.failed_restarts = 0
+        self._task: Optional[asyncio.Task] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def start(self):
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def _run(self):
+        while True:
+            try:
+                await self.check()
+            except Exception as e:
+                logger.error(f"Supervisor check failed: {e}", exc_info=True)
+            await asyncio.sleep(self.interval)
+
+    async def check(self):
+        """Check every backend once, failing over the dead and unresponsive ones"""
+        await asyncio.gather(*(self._check(backend) for backend in self.backends()))
+
+    def backoff(self, attempts: int) -> float:
+        return min(self.backoff_initial * 2 ** attempts, self.backoff_max)
+
+    async def _check(self, backend: Backend):
+        if backend.retired or backend.recycling:
+            return
+        health = self.health.get(backend)
+        if health is None:
+            health = self.health[backend] = _Health()
+        # Retryable calls on a dead process wait about this long for the replacement
+        backend.failover_wait = self.interval + max(2 * backend.spawn_duration, 1.0)
+
+        self.checks += 1
+        if not backend.healthy:
+            reason = "dead"
+        else:
+            try:
+                await backend.process.ping(self.timeout)
+            except Exception as e:
+                health.failures += 1
+                self.failed_checks += 1
+                logger.warning(f"Backend health check failed ({health.failures}/{self.failures}): {e!r}")
+                if health.failures < self.failures:
+                    return
+                reason = "unresponsive"
+            else:
+                health.failures = 0
+                health.restarts = 0
+                health.retry_at = 0.0
+                if self.standby:
+                    self._ensure_standby(backend, health)
+                return
+
+        if time.monotonic() < health.retry_at:
+            return
+        await self._failover(backend, health, reason)
+
+    async def _failover(self, backend: Backend, health: _Health, reason: str):
+        delay = self.backoff(health.restarts)
+        health.restarts += 1
+        health.retry_at = time.monotonic() + delay
+        logger.warning(f"Backend is {reason}, failing over")
+        try:
+            await backend.failover()
+        except Exception as e:
+            self.failed_restarts += 1
+            logger.error(f"Failed to restart backend, next attempt in {delay:.1f}s: {e}")
+            return
+        health.failures = 0
+        self.failovers += 1
+        BACKEND_FAILOVERS.inc(reason)
+        if self.on_failover is not None:
+            try:
+                await self.on_failover(backend)
+            except Exception as e:
+                logger.error(f"Error after backend failover: {e}")
+
+    def _ensure_standby(self, backend: Backend, health: _Health):
+        """Start a standby process in the background unless one is ready or starting"""
+        if backend.standby is not None and backend.standby.alive:
+            return
+        if health.standby_task is not None or time.monotonic() < health.standby_retry_at:
+            return
+        task = asyncio.create_task(self._prepare_standby(backend, health))
+        health.standby_task = task
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _prepare_standby(self, backend: Backend, health: _Health):
+        try:
+            await backend.prepare_standby()
+            health.standby_failures = 0
+        except Exception as e:
+            delay = self.backoff(health.standby_failures)
+            health.standby_failures += 1
+            health.standby_retry_at = time.monotonic() + delay
+            logger.error(f"Failed to start standby backend, next attempt in {delay:.1f}s: {e}")
+        finally:
+            health.standby_task = None
+
+    def stats(self) -> dict:
+        return {
+            "interval": self.interval,
+            "standby": self.standby,
+            "checks": self.checks,
+            "failed_checks": self.failed_checks,
+            "failovers": self.failovers,
+            "failed_restarts": self.failed_restarts,
+        }
@@ -0,0 +1,146 @@
+import os
+import re
+import json
+import uuid
+import asyncio
+import logging
+from typing import Awaitable, Callable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Separates the owning worker's id from the random part of a session id
+SEPARATOR = "."
+# Largest forwarded request or response line
+MAX_MESSAGE_SIZE = 64 * 1024 * 1024
+# Worker ids double as socket file names, so they are restricted to safe characters
+WORKER_ID = re.compile(r"[A-Za-z0-9_-]+")
+
+# Handles a forwarded POST, returns the HTTP status and JSON body
+RelayHandler = Callable[[str, dict], Awaitable[Tuple[int, bytes]]]
+
+
+def session_owner(session_id: Optional[str]) -> Optional[str]:
+    """Worker id encoded in a session id, if any"""
+    if not session_id or SEPARATOR not in session_id:
+        return None
+    return session_id.split(SEPARATOR, 1)[0]
+
+
+class RelayError(Exception):
+    """The owning worker did not answer a forwarded request properly"""
+
+
+class WorkerRelay:
+    """Forwards POSTs for sessions owned by another worker over Unix sockets
+
+    Every worker listens on <socket_dir>/<worker_id>.sock and prefixes the
+    session ids it creates with its worker id, so whichever worker a POST
+    lands on can relay it to the worker holding the SSE stream. Each
+    exchange is one JSON request line answered by "<status> <body>".
+    """
+
+    def __init__(self, socket_dir: str, handler: RelayHandler, worker_id: Optional[str] = None):
+        self.socket_dir = socket_dir
+        self.worker_id = worker_id or str(os.getpid())
+        if not WORKER_ID.fullmatch(self.worker_id):
+            raise ValueError(f"Invalid worker id: {self.worker_id}")
+        self.handler = handler
+        self.forwarded = 0
+        self.received = 0
+        self.failures = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    def socket_path(self, worker_id: str) -> str:
+        return os.path.join(self.socket_dir, f"{worker_id}.sock")
+
+    def new_session_id(self) -> str:
+        return f"{self.worker_id}{SEPARATOR}{uuid.uuid4()}"
+
+    def valid(self, session_id: Optional[str]) -> bool:
+        """Whether a session id names no owner or an owner this relay could have created"""
+        owner = session_owner(session_id)
+        return owner is None or WORKER_ID.fullmatch(owner) is not None
+
+    def owns(self, session_id: Optional[str]) -> bool:
+        owner = session_owner(session_id)
+        return owner is None or owner == self.worker_id
+
+    async def start(self):
+        os.makedirs(self.socket_dir, exist_ok=True)
+        path = self.socket_path(self.worker_id)
+        if os.path.exists(path):
+            os.unlink(path)
+        self._server = await asyncio.start_unix_server(self._serve, path=path, limit=MAX_MESSAGE_SIZE)
+        logger.info(f"Worker {self.worker_id} listening for forwarded requests on {path}")
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+            try:
+                os.unlink(self.socket_path(self.worker_id))
+            except OSError:
+                pass
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request = json.loads(await reader.readline())
+            self.received += 1
+            status, body = await self.handler(request["session_id"], request["data"])
+            writer.write(f"{status} ".encode() + body + b"\n")
+            await writer.drain()
+        except Exception as e:
+            logger.error(f"Error handling forwarded request: {e}")
+        finally:
+            writer.close()
+
+    async def forward(
+        self,
+        session_id: str,
+        data: dict,
+        timeout: Optional[float] = None
+    ) -> Optional[Tuple[int, bytes]]:
+        """Relay a POST to the owning worker, returns None if it cannot be reached
+
+        Raises RelayError when the worker does not answer within timeout or
+        its reply is malformed.
+        """
+        if not self.valid(session_id):
+            raise ValueError(f"Invalid session id: {session_id}")
+        path = self.socket_path(session_owner(session_id))
+        try:
+            reader, writer = await asyncio.open_unix_connection(path, limit=MAX_MESSAGE_SIZE)
+        except OSError as e:
+            self.failures += 1
+            logger.warning(f"Cannot reach worker for session {session_id}: {e}")
+            return None
+        try:
+            writer.write(json.dumps({"session_id": session_id, "data": data}).encode() + b"\n")
+            await writer.drain()
+            line = await asyncio.wait_for(reader.readline(), timeout)
+        except asyncio.TimeoutError:
+            self.failures += 1
+            raise RelayError(f"Worker for session {session_id} did not answer within {timeout}s")
+        except (OSError, ValueError) as e:
+            self.failures += 1
+            raise RelayError(f"Failed to relay request for session {session_id}: {e}")
+        finally:
+            writer.close()
+        if not line:
+            self.failures += 1
+            return None
+        status, _, body = line.rstrip(b"\n").partition(b" ")
+        if not status.isdigit():
+            self.failures += 1
+            raise RelayError(f"Malformed reply from worker for session {session_id}")
+        self.forwarded += 1
+        return int(status), body
+
+    def stats(self) -> dict:
+        return {
+            "worker_id": self.worker_id,
+            "forwarded": self.forwarded,
+            "received": self.received,
+            "failures": self.failures,
+        }
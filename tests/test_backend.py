@@ -0,0 +1,129 @@
+import asyncio
+
+import pytest
+
+from mcp import StdioServerParameters, types
+
+from backend import Backend, BackendRegistry, fingerprint, _RequestRecorder
+
+
+class FakeStream:
+    def __init__(self):
+        self.messages = []
+
+    async def send(self, message):
+        self.messages.append(message.root)
+
+
+class FakeProcess:
+    """A live process whose session sends one request and never gets an answer"""
+
+    alive = True
+    failed = False
+
+    def __init__(self):
+        self.stream = _RequestRecorder(FakeStream())
+        self.session = self
+
+    def begin_call(self):
+        pass
+
+    def end_call(self):
+        pass
+
+    async def call_tool(self, request_id):
+        await self.stream.send(types.JSONRPCMessage(types.JSONRPCRequest(jsonrpc="2.0", id=request_id, method="tools/call")))
+        await asyncio.Event().wait()
+
+    async def send_notification(self, notification):
+        await self.stream.send(types.JSONRPCMessage(types.JSONRPCNotification(
+            jsonrpc="2.0", **notification.model_dump(by_alias=True, mode="json", exclude_none=True)
+        )))
+
+
+def test_cancelled_calls_forward_the_id_their_own_request_was_sent_with():
+    async def run():
+        backend = Backend(StdioServerParameters(command="server"), forward_cancel=True)
+        backend.process = process = FakeProcess()
+        calls = [asyncio.ensure_future(backend.call(lambda session, i=i: session.call_tool(i))) for i in (7, 8)]
+        await asyncio.sleep(0.01)
+        calls[1].cancel()
+        await asyncio.gather(*calls[1:], return_exceptions=True)
+        await asyncio.gather(*backend._cancel_tasks)
+
+        cancelled = [m for m in process.stream.messages if isinstance(m, types.JSONRPCNotification)]
+        assert [m.params["requestId"] for m in cancelled] == [8]
+        calls[0].cancel()
+
+    asyncio.run(run())
+
+
+def registry(linger=60.0):
+    spawned = []
+
+    async def spawn(params):
+        await asyncio.sleep(0.01)
+        spawned.append(Backend(params))
+        return spawned[-1]
+
+    return BackendRegistry(spawn, linger=linger), spawned
+
+
+def test_fingerprint_covers_command_args_and_env():
+    base = StdioServerParameters(command="server", args=["-v"], env={"A": "1", "B": "2"})
+    assert fingerprint(base) == fingerprint(StdioServerParameters(command="server", args=["-v"], env={"B": "2", "A": "1"}))
+    assert fingerprint(base) != fingerprint(base.model_copy(update={"env": {"A": "1", "B": "3"}}))
+    assert fingerprint(base) != fingerprint(base.model_copy(update={"args": ["-q"]}))
+
+
+def test_sessions_with_the_same_params_share_one_backend():
+    async def run():
+        backends, spawned = registry()
+        params = StdioServerParameters(command="server", env={"TOKEN": "a"})
+        first, second = await asyncio.gather(backends.acquire(params), backends.acquire(params))
+        other = await backends.acquire(params.model_copy(update={"env": {"TOKEN": "b"}}))
+        assert first is second and other is not first
+        assert len(spawned) == 2 and backends.reuses == 1
+        await backends.close()
+
+    asyncio.run(run())
+
+
+def test_released_backend_lingers_for_a_reconnect_then_closes():
+    async def run():
+        backends, spawned = registry(linger=0.05)
+        params = StdioServerParameters(command="server")
+        backend = await backends.acquire(params)
+        await backends.release(backend)
+        assert await backends.acquire(params) is backend
+        await backends.release(backend)
+
+        await asyncio.sleep(0.1)
+        await asyncio.gather(*backends._close_tasks)
+        assert backend.closed and not backends.entries
+        assert await backends.acquire(params) is not backend
+        assert len(spawned) == 2
+        await backends.close()
+
+    asyncio.run(run())
+
+
+def test_failed_spawn_is_not_cached():
+    async def run():
+        attempts = []
+
+        async def spawn(params):
+            attempts.append(params)
+            if len(attempts) == 1:
+                raise RuntimeError("spawn failed")
+            return Backend(params)
+
+        backends = BackendRegistry(spawn)
+        params = StdioServerParameters(command="server")
+        with pytest.raises(RuntimeError):
+            await backends.acquire(params)
+        assert not backends.entries
+        assert (await backends.acquire(params)).params == params
+        await backends.close()
+
+    asyncio.run(run())
@@ -0,0 +1,139 @@
+from mcp import types
+
+import cache
+from cache import ResponseCache, ToolResultCache
+from serialization import RawJSON
+
+
+def tools_changed():
+    return types.ServerNotification(root=types.ToolListChangedNotification(method="notifications/tools/list_changed"))
+
+
+def test_entries_expire_after_their_method_ttl(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    responses = ResponseCache({"tools/list": 10})
+    key = responses.key("a", "tools/list", {})
+    responses.put(key, "tools", responses.generation("a"))
+
+    now[0] += 9
+    assert responses.get(key) == "tools"
+    now[0] += 2
+    assert responses.get(key) is None
+    assert (responses.hits, responses.misses) == (1, 1)
+
+
+def test_least_recently_used_entry_is_evicted():
+    responses = ResponseCache({"resources/read": 60}, max_entries=2)
+    keys = [responses.key("a", "resources/read", {"uri": uri}) for uri in ("x", "y", "z")]
+    responses.put(keys[0], 0, 0)
+    responses.put(keys[1], 1, 0)
+    responses.get(keys[0])
+    responses.put(keys[2], 2, 0)
+
+    assert responses.get(keys[1]) is None
+    assert responses.get(keys[0]) == 0 and responses.get(keys[2]) == 2
+    assert responses.evictions == 1
+
+
+def test_params_are_keyed_regardless_of_order():
+    responses = ResponseCache({"prompts/get": 60})
+    assert responses.key("a", "prompts/get", {"name": "n", "arguments": {"x": 1}}) == \
+        responses.key("a", "prompts/get", {"arguments": {"x": 1}, "name": "n"})
+    assert responses.key("a", "prompts/get", None) == responses.key("a", "prompts/get", {})
+
+
+def test_response_fetched_before_an_invalidation_is_not_stored():
+    responses = ResponseCache({"tools/list": 60})
+    key = responses.key("a", "tools/list", {})
+    generation = responses.generation("a")
+    responses.handle_notification("a", tools_changed())
+    responses.put(key, "stale", generation)
+    assert responses.get(key) is None
+
+
+def test_notifications_only_invalidate_their_scope_and_methods():
+    responses = ResponseCache({"tools/list": 60, "prompts/list": 60})
+    tools_a = responses.key("a", "tools/list", {})
+    prompts_a = responses.key("a", "prompts/list", {})
+    tools_b = responses.key("b", "tools/list", {})
+    for key in (tools_a, prompts_a, tools_b):
+        responses.put(key, key, 0)
+
+    responses.handle_notification("a", tools_changed())
+    assert responses.get(tools_a) is None
+    assert responses.get(prompts_a) == prompts_a
+    assert responses.get(tools_b) == tools_b
+
+
+def test_resource_update_drops_only_that_uri():
+    responses = ResponseCache({"resources/read": 60})
+    x = responses.key("a", "resources/read", {"uri": "mem://x"})
+    y = responses.key("a", "resources/read", {"uri": "mem://y"})
+    responses.put(x, "x", 0)
+    responses.put(y, "y", 0)
+    responses.handle_notification("a", types.ServerNotification(root=types.ResourceUpdatedNotification(
+        method="notifications/resources/updated", params=types.ResourceUpdatedNotificationParams(uri="mem://x")
+    )))
+    assert responses.get(x) is None
+    assert responses.get(y) == "y"
+
+
+def call(name, **arguments):
+    return {"name": name, "arguments": arguments}
+
+
+def test_only_allow_listed_tools_are_cached():
+    results = ToolResultCache({"lookup"})
+    assert results.cacheable(call("lookup", q=1))
+    assert not results.cacheable(call("write", q=1))
+
+
+def test_results_are_private_to_the_session_unless_shared():
+    private = ToolResultCache({"lookup"})
+    assert private.key("a", "s1", call("lookup", q=1)) != private.key("a", "s2", call("lookup", q=1))
+    shared = ToolResultCache({"lookup"}, shared=True)
+    assert shared.key("a", "s1", call("lookup", q=1)) == shared.key("a", "s2", call("lookup", q=1))
+
+
+def test_error_results_are_not_stored():
+    results = ToolResultCache({"lookup"})
+    results.put("k1", {"content": [], "isError": True})
+    results.put("k2", RawJSON(b'{"content":[],"isError":true}', is_error=True))
+    assert not results.entries
+
+
+def test_total_size_is_bounded_by_evicting_the_oldest():
+    value = RawJSON(b"x" * 40)
+    results = ToolResultCache({"lookup"}, max_bytes=100)
+    for key in ("k1", "k2", "k3"):
+        results.put(key, value)
+    assert list(results.entries) == ["k2", "k3"]
+    assert results.bytes == 80 and results.evictions == 1
+    # Larger than the whole cache, never stored
+    results.put("k4", RawJSON(b"x" * 101))
+    assert "k4" not in results.entries
+
+
+def test_results_expire_after_the_ttl(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    results = ToolResultCache({"lookup"}, ttl=5)
+    results.put("k", {"content": []})
+    now[0] += 6
+    assert results.get("k") is None
+    assert results.bytes == 0
+
+
+def test_closed_session_and_tool_list_change_drop_results():
+    results = ToolResultCache({"lookup"})
+    s1 = results.key("a", "s1", call("lookup", q=1))
+    s2 = results.key("a", "s2", call("lookup", q=1))
+    other = results.key("b", "s2", call("lookup", q=1))
+    for key in (s1, s2, other):
+        results.put(key, {"content": []})
+
+    results.drop_session("s1")
+    assert s1 not in results.entries and s2 in results.entries
+    results.handle_notification("a", tools_changed())
+    assert list(results.entries) == [other]
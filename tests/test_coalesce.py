@@ -0,0 +1,91 @@
+import asyncio
+
+import pytest
+
+from coalesce import SingleFlight
+
+
+def test_only_listed_methods_and_idempotent_tools_coalesce():
+    flights = SingleFlight({"tools/list", "tools/call"}, {"lookup"})
+    assert flights.coalescable("tools/list", {})
+    assert not flights.coalescable("prompts/list", {})
+    assert flights.coalescable("tools/call", {"name": "lookup"})
+    assert not flights.coalescable("tools/call", {"name": "write"})
+
+
+def test_identical_concurrent_calls_share_one_upstream_call():
+    async def run():
+        flights = SingleFlight({"tools/list"}, set())
+        release = asyncio.Event()
+        calls = []
+
+        async def upstream():
+            calls.append(1)
+            await release.wait()
+            return "tools"
+
+        waiters = [asyncio.ensure_future(flights.do("k", upstream)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        release.set()
+        assert await asyncio.gather(*waiters) == ["tools"] * 3
+        assert len(calls) == 1
+        assert (flights.leaders, flights.coalesced) == (1, 2)
+        assert not flights.flights
+
+    asyncio.run(run())
+
+
+def test_errors_reach_every_waiter():
+    async def run():
+        flights = SingleFlight({"tools/list"}, set())
+
+        async def upstream():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("backend down")
+
+        results = await asyncio.gather(*(flights.do("k", upstream) for _ in range(2)), return_exceptions=True)
+        assert [str(r) for r in results] == ["backend down"] * 2
+
+    asyncio.run(run())
+
+
+def test_cancelled_waiter_does_not_fail_the_others():
+    async def run():
+        flights = SingleFlight({"tools/list"}, set())
+        release = asyncio.Event()
+
+        async def upstream():
+            await release.wait()
+            return "tools"
+
+        first = asyncio.ensure_future(flights.do("k", upstream))
+        second = asyncio.ensure_future(flights.do("k", upstream))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        release.set()
+        assert await second == "tools"
+        with pytest.raises(asyncio.CancelledError):
+            await first
+
+    asyncio.run(run())
+
+
+def test_upstream_call_is_cancelled_when_every_waiter_leaves():
+    async def run():
+        flights = SingleFlight({"tools/list"}, set())
+        cancelled = asyncio.Event()
+
+        async def upstream():
+            try:
+                await asyncio.Event().wait()
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        waiter = asyncio.ensure_future(flights.do("k", upstream))
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        await asyncio.wait_for(cancelled.wait(), 1)
+        assert not flights.flights
+
+    asyncio.run(run())
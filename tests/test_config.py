@@ -0,0 +1,43 @@
+import json
+
+import pytest
+
+from config import SERVER_IDLE_TIMEOUT, load_server_catalog
+
+
+def write_catalog(tmp_path, data):
+    path = tmp_path / "servers.json"
+    path.write_text(json.dumps(data))
+    return str(path)
+
+
+def test_catalog_servers_are_parsed(tmp_path, monkeypatch):
+    monkeypatch.setenv("PROXY_ONLY", "1")
+    catalog = load_server_catalog(write_catalog(tmp_path, {"servers": {
+        "files": {"command": "npx -y server-files /data", "env": {"LEVEL": 2}},
+        "search": {"command": "python", "args": ["search.py", 8080], "shared_session": False, "idle_timeout": 30},
+    }}))
+
+    files = catalog["files"]
+    assert (files.params.command, files.params.args) == ("npx", ["-y", "server-files", "/data"])
+    assert files.params.env["LEVEL"] == "2" and files.params.env["PROXY_ONLY"] == "1"
+    assert files.shared_session and files.idle_timeout == SERVER_IDLE_TIMEOUT
+
+    search = catalog["search"]
+    assert (search.params.command, search.params.args) == ("python", ["search.py", "8080"])
+    assert not search.shared_session and search.idle_timeout == 30
+
+
+@pytest.mark.parametrize("data, error", [
+    ({"server": {}}, "must contain"),
+    ({"servers": {"a/b": {"command": "x"}}}, "Invalid server name"),
+    ({"servers": {"a": {"env": {}}}}, "has no command"),
+])
+def test_invalid_catalogs_are_rejected(tmp_path, data, error):
+    with pytest.raises(ValueError, match=error):
+        load_server_catalog(write_catalog(tmp_path, data))
+
+
+def test_unreadable_catalog_is_rejected(tmp_path):
+    with pytest.raises(ValueError, match="Failed to read"):
+        load_server_catalog(str(tmp_path / "missing.json"))
@@ -0,0 +1,56 @@
+import asyncio
+
+from mcp import types
+
+from fanout import NotificationRouter
+
+
+class FakeSession:
+    def __init__(self):
+        self.last_activity = 0.0
+        self.messages = []
+
+    async def send_message(self, message, data=None):
+        self.messages.append(message)
+
+
+def resource_updated(uri):
+    return types.ServerNotification(types.ResourceUpdatedNotification(
+        method="notifications/resources/updated",
+        params=types.ResourceUpdatedNotificationParams(uri=uri)
+    ))
+
+
+def test_subscription_locks_are_released():
+    async def run():
+        calls = []
+
+        async def upstream(method, uri):
+            calls.append((method, uri))
+
+        router = NotificationRouter({}, upstream)
+        for i in range(3):
+            await router.subscribe("a", f"file:///{i}")
+            await router.subscribe("b", f"file:///{i}")
+            await router.unsubscribe("a", f"file:///{i}")
+            await router.unsubscribe("b", f"file:///{i}")
+        assert router._locks == {}
+        assert router.subscribers == {}
+        assert calls.count(("resources/subscribe", "file:///0")) == 1
+
+    asyncio.run(run())
+
+
+def test_routed_notifications_refresh_session_activity():
+    async def run():
+        async def upstream(method, uri):
+            pass
+
+        session = FakeSession()
+        router = NotificationRouter({"a": session}, upstream)
+        await router.subscribe("a", "file:///x")
+        await router.route(resource_updated("file:///x"))
+        assert len(session.messages) == 1
+        assert session.last_activity > 0
+
+    asyncio.run(run())
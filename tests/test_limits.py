@@ -0,0 +1,68 @@
+import asyncio
+
+import pytest
+
+from limits import AdmissionControl, LimitExceeded, TokenBucket
+
+
+def test_token_bucket_allows_a_burst_then_rejects_with_a_retry_hint():
+    bucket = TokenBucket(rate=10, burst=2)
+    assert bucket.take() == (True, 0.0)
+    assert bucket.take() == (True, 0.0)
+    admitted, retry_after = bucket.take()
+    assert not admitted and 0 < retry_after <= 0.1
+
+
+def test_key_rate_limit_survives_reconnects():
+    async def run():
+        admission = AdmissionControl(key_rate=1, burst=1)
+        admission.open_session("client", "s1")
+        await admission.admit("client", "s1")
+        admission.close_session("client", "s1")
+        admission.open_session("client", "s2")
+        with pytest.raises(LimitExceeded) as e:
+            await admission.admit("client", "s2")
+        assert e.value.scope == "key_rate"
+
+    asyncio.run(run())
+
+
+def test_idle_keys_are_forgotten_once_their_bucket_refilled():
+    admission = AdmissionControl(key_rate=1000, burst=1)
+    admission.open_session("client", "s1")
+    admission.keys["client"].bucket.take()
+    admission.close_session("client", "s1")
+    assert "client" in admission.keys
+    admission.keys["client"].bucket.updated -= 1
+    admission.open_session("other", "s2")
+    assert "client" not in admission.keys
+
+
+def test_session_cap_per_key():
+    admission = AdmissionControl(key_sessions=1)
+    admission.open_session("client", "s1")
+    with pytest.raises(LimitExceeded):
+        admission.open_session("client", "s2")
+    admission.close_session("client", "s1")
+    admission.open_session("client", "s2")
+
+
+def test_concurrency_slots_are_released():
+    async def run():
+        admission = AdmissionControl(session_concurrency=1, queue_timeout=1)
+        admission.open_session("client", "s1")
+        release = await admission.admit("client", "s1")
+        waiting = asyncio.ensure_future(admission.admit("client", "s1"))
+        await asyncio.sleep(0.01)
+        assert not waiting.done()
+        release()
+        (await waiting)()
+
+        admission = AdmissionControl(session_concurrency=1)
+        admission.open_session("client", "s1")
+        await admission.admit("client", "s1")
+        with pytest.raises(LimitExceeded) as e:
+            await admission.admit("client", "s1")
+        assert e.value.scope == "session_concurrency"
+
+    asyncio.run(run())
@@ -0,0 +1,76 @@
+from outbound import COALESCE, DISCONNECT, DROP_OLDEST, OutboundQueue, ReplayBuffer
+
+
+def response(id, size=10):
+    return {"jsonrpc": "2.0", "id": id, "result": "x" * size}
+
+
+def notification(text="log"):
+    return {"jsonrpc": "2.0", "method": "notifications/message", "params": {"level": "info", "data": text}}
+
+
+def progress(token, value):
+    return {"jsonrpc": "2.0", "method": "notifications/progress", "params": {"progressToken": token, "progress": value}}
+
+
+def test_notifications_are_dropped_before_responses():
+    queue = OutboundQueue(max_messages=3, policy=DROP_OLDEST)
+    assert queue.put(notification())
+    assert queue.put(response(1))
+    assert queue.put(notification())
+    assert queue.put(response(2))
+    assert queue.qsize() == 3
+    assert queue.dropped == 1
+    assert not queue.disconnected
+
+
+def test_queue_full_of_responses_disconnects():
+    for policy in (DROP_OLDEST, COALESCE):
+        queue = OutboundQueue(max_bytes=1000, policy=policy)
+        accepted = [queue.put(response(i, size=100)) for i in range(20)]
+        assert queue.disconnected
+        assert not all(accepted)
+        assert queue.bytes == 0
+        assert not queue.put(response(99))
+
+
+def test_message_limit_with_only_responses_disconnects():
+    queue = OutboundQueue(max_messages=5, policy=COALESCE)
+    for i in range(5):
+        assert queue.put(response(i))
+    assert not queue.put(response(5))
+    assert queue.disconnected
+
+
+def test_disconnect_policy_ends_the_stream():
+    queue = OutboundQueue(max_messages=1, policy=DISCONNECT)
+    assert queue.put(notification())
+    assert not queue.put(notification())
+    assert queue.disconnected
+
+
+def test_progress_notifications_are_coalesced():
+    queue = OutboundQueue(policy=COALESCE)
+    queue.put(progress("t", 1))
+    queue.put(progress("t", 2))
+    queue.put(progress("u", 1))
+    assert queue.qsize() == 2
+    assert queue.coalesced == 1
+    assert b'"progress":2' in queue.items[0].data
+
+
+def test_replay_returns_events_after_the_last_one_seen():
+    buffer = ReplayBuffer(size=3)
+    for data in (b"a", b"b", b"c"):
+        buffer.append(data)
+    assert buffer.since(1) == ([(2, b"b"), (3, b"c")], False)
+    assert buffer.since(3) == ([], False)
+
+
+def test_replay_reports_evicted_events():
+    buffer = ReplayBuffer(size=2)
+    for data in (b"a", b"b", b"c", b"d"):
+        buffer.append(data)
+    events, missed = buffer.since(1)
+    assert events == [(3, b"c"), (4, b"d")]
+    assert missed
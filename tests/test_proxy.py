@@ -0,0 +1,192 @@
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+
+from mcp import StdioServerParameters, types
+
+from limits import AdmissionControl
+from backend import PROCESS_MARKER, ReplicaSet
+from proxy import MCPProxy, SSESession
+from scheduler import LaneScheduler
+
+
+class FakeClientSession:
+    """Stands in for the MCP client session, tool calls block until released"""
+
+    def __init__(self):
+        self.release = asyncio.Event()
+        self.tool_calls = 0
+
+    async def call_tool(self, name, arguments):
+        self.tool_calls += 1
+        await self.release.wait()
+        return types.CallToolResult(content=[])
+
+    async def list_tools(self):
+        return types.ListToolsResult(tools=[])
+
+    async def send_ping(self):
+        return types.EmptyResult()
+
+
+class FakeBackend:
+    def __init__(self):
+        self.session = FakeClientSession()
+        self.process = SimpleNamespace(requests=0)
+        self.listeners = set()
+        self.client_session = self.session
+
+    async def call(self, fn, retry=False, forward_cancel=None):
+        return await fn(self.session)
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+
+def shared_proxy(**kwargs):
+    proxy = MCPProxy(shared_session=True, keepalive_interval=0, **kwargs)
+    backend = FakeBackend()
+    proxy.select_backend = lambda session, method, params: backend
+    session = SSESession("s1", params=None)
+    proxy.active_sessions[session.session_id] = session
+    return proxy, session, backend
+
+
+def request(method, params, id=1):
+    return {"jsonrpc": "2.0", "id": id, "method": method, "params": params}
+
+
+def test_tool_calls_queued_in_their_lane_leave_backend_slots_free():
+    async def run():
+        proxy, session, backend = shared_proxy(
+            admission=AdmissionControl(backend_concurrency=4),
+            scheduler=LaneScheduler({"tool": 2})
+        )
+        calls = [
+            asyncio.ensure_future(proxy.call_backend(session, "tools/call", {"name": "slow"}))
+            for _ in range(4)
+        ]
+        await asyncio.sleep(0.05)
+        assert backend.session.tool_calls == 2
+
+        resp = await asyncio.wait_for(proxy.call_backend(session, "tools/list", {}), 1)
+        assert resp["tools"] == []
+
+        backend.session.release.set()
+        await asyncio.gather(*calls)
+        assert backend.session.tool_calls == 4
+
+    asyncio.run(run())
+
+
+
+def test_null_params_are_accepted_in_shared_mode():
+    async def run():
+        proxy, session, backend = shared_proxy()
+        response = await proxy.handle_message("s1", request("tools/list", None))
+        assert json.loads(response.body)["result"] == "ok"
+        message = json.loads(await session.message_queue.get())
+        assert message["result"]["tools"] == []
+
+    asyncio.run(run())
+
+
+def dedicated_proxy(acquire, **kwargs):
+    proxy = MCPProxy(shared_session=False, keepalive_interval=0, **kwargs)
+    proxy.acquire_backend = acquire
+    session = SSESession("s1", params=None)
+    proxy.active_sessions[session.session_id] = session
+    return proxy, session
+
+
+def test_async_dispatch_acknowledges_before_the_backend_is_up():
+    async def run():
+        async def acquire(params):
+            await asyncio.sleep(0.5)
+            return FakeBackend()
+
+        proxy, session = dedicated_proxy(acquire, async_dispatch=True)
+        started = time.monotonic()
+        response = await proxy.handle_message("s1", request("tools/list", {}))
+        assert response.status_code == 202
+        assert time.monotonic() - started < 0.3
+        message = json.loads(await asyncio.wait_for(session.message_queue.get(), 2))
+        assert message["id"] == 1 and message["result"]["tools"] == []
+
+    asyncio.run(run())
+
+
+def test_failed_backend_start_is_retried_by_the_next_request():
+    async def run():
+        attempts = []
+
+        async def acquire(params):
+            attempts.append(params)
+            await asyncio.sleep(0.05)
+            if len(attempts) == 1:
+                raise RuntimeError("spawn failed")
+            return FakeBackend()
+
+        proxy, session = dedicated_proxy(acquire)
+        # The request waiting on the failing start gets its error
+        session.start_client(proxy.acquire_backend, proxy.release_backend)
+        response = await proxy.handle_message("s1", request("tools/list", {}, id=1))
+        assert "Failed to start MCP server" in json.loads(response.body)["error"]["message"]
+        # The next one starts the backend again instead of failing on the cached error
+        response = await proxy.handle_message("s1", request("tools/list", {}, id=2))
+        assert json.loads(response.body)["result"] == "ok"
+        assert len(attempts) == 2
+
+    asyncio.run(run())
+
+
+def test_ping_is_answered_while_the_tool_lane_is_full():
+    async def run():
+        proxy, session, backend = shared_proxy(scheduler=LaneScheduler({"tool": 1, "metadata": 1}))
+        call = asyncio.ensure_future(proxy.call_backend(session, "tools/call", {"name": "slow"}))
+        await asyncio.sleep(0.05)
+        response = await asyncio.wait_for(proxy.handle_message("s1", request("ping", None)), 1)
+        assert json.loads(response.body)["result"] == "ok"
+        message = json.loads(await session.message_queue.get())
+        assert message["id"] == 1 and "result" in message
+        backend.session.release.set()
+        await call
+
+    asyncio.run(run())
+
+
+def test_supervisor_watches_replicas_draining_after_a_reload():
+    async def run():
+        proxy, session, _ = shared_proxy(health_check_interval=60, drain_idle_timeout=60)
+        proxy.new_backend = lambda params: FakeBackend()
+        proxy.replicas = ReplicaSet(StdioServerParameters(command="old"), factory=proxy.new_backend)
+        await proxy.replicas.start()
+        old = proxy.replicas.replicas[0]
+
+        assert await proxy.reload(StdioServerParameters(command="new"))
+        new = proxy.replicas.replicas[0]
+        # The old replica still serves the session started before the reload
+        assert proxy.supervisor.backends() == [new, old]
+
+        await proxy.retire_session("s1")
+        await asyncio.gather(*proxy._drain_tasks)
+        assert proxy.supervisor.backends() == [new]
+
+    asyncio.run(run())
+
+
+def test_hot_standby_without_health_checks_logs_a_warning(caplog):
+    MCPProxy(shared_session=True, hot_standby=True, health_check_interval=0)
+    assert "HOT_STANDBY needs" in caplog.text
+
+
+def test_process_marker_is_only_injected_with_rss_recycling():
+    params = StdioServerParameters(command="server", env={"A": "1"})
+    plain = MCPProxy(shared_session=True).new_backend(params)._new_process()
+    assert plain.params.env == {"A": "1"}
+    marked = MCPProxy(shared_session=True, backend_max_rss=1 << 30).new_backend(params)._new_process()
+    assert marked.params.env == {"A": "1", PROCESS_MARKER: marked.id}
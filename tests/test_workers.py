@@ -0,0 +1,61 @@
+import asyncio
+import os
+
+import pytest
+
+from workers import RelayError, WorkerRelay
+
+
+async def handler(session_id, data):
+    return 200, b"{}"
+
+
+def test_owner_outside_the_socket_dir_is_rejected(tmp_path):
+    relay = WorkerRelay(str(tmp_path), handler, worker_id="1")
+    for session_id in ("/var/run/docker.x", "../../tmp/x.y", "a/b.c"):
+        assert not relay.valid(session_id)
+        with pytest.raises(ValueError):
+            asyncio.run(relay.forward(session_id, {}))
+    assert relay.valid("2.abc") and relay.valid("abc")
+
+
+def serve_peer(tmp_path, reply):
+    """Fake worker 2 answering every request with reply, or never when reply is None"""
+    async def serve(reader, writer):
+        await reader.readline()
+        if reply is None:
+            await asyncio.sleep(10)
+        writer.write(reply)
+        await writer.drain()
+        writer.close()
+    return asyncio.start_unix_server(serve, path=os.path.join(str(tmp_path), "2.sock"))
+
+
+def test_malformed_reply_raises(tmp_path):
+    async def run():
+        relay = WorkerRelay(str(tmp_path), handler, worker_id="1")
+        async with await serve_peer(tmp_path, b"garbage\n"):
+            with pytest.raises(RelayError):
+                await relay.forward("2.abc", {})
+        assert relay.failures == 1
+
+    asyncio.run(run())
+
+
+def test_hung_worker_times_out(tmp_path):
+    async def run():
+        relay = WorkerRelay(str(tmp_path), handler, worker_id="1")
+        async with await serve_peer(tmp_path, None):
+            with pytest.raises(RelayError):
+                await relay.forward("2.abc", {}, timeout=0.1)
+
+    asyncio.run(run())
+
+
+def test_reply_is_relayed(tmp_path):
+    async def run():
+        relay = WorkerRelay(str(tmp_path), handler, worker_id="1")
+        async with await serve_peer(tmp_path, b'202 {"ok": true}\n'):
+            assert await relay.forward("2.abc", {}, timeout=1) == (202, b'{"ok": true}')
+
+    asyncio.run(run())